@@ -0,0 +1,402 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+
+import fsm_gui as fsm
+
+# Syntetiske stevner for ytelsesmåling av hele kjeden: FSM-XML med flere
+# OdfBody-dokumenter i samme fil, Isonen-deltakerliste og musikk-zip med
+# små, gyldige MP3-filer. Resultatet skrives som JSON slik at kjøringer
+# kan sammenlignes over tid.
+
+GIVEN_NAMES = [
+    "Emma", "Nora", "Sofie", "Ingrid", "Olivia", "Sara", "Maja", "Ella", "Leah", "Frida",
+    "Åse", "Thea", "Ida", "Selma", "Linnea", "Julie", "Marte", "Hedda", "Tiril", "Astrid",
+    "Jakob", "Emil", "Noah", "Oskar", "Lucas", "Filip", "Aksel", "Henrik", "Sander", "Magnus",
+    "Anne-Marie", "Mari Elise", "Kaja", "Vilde", "Sigrid", "Andrea", "Mathilde", "Live", "Hanna", "Eline",
+]
+FAMILY_NAMES = [
+    "Hansen", "Johansen", "Olsen", "Larsen", "Andersen", "Pedersen", "Nilsen", "Kristiansen",
+    "Jensen", "Karlsen", "Johnsen", "Pettersen", "Eriksen", "Berg", "Haugen", "Hagen",
+    "Johannessen", "Andreassen", "Jacobsen", "Dahl", "Jørgensen", "Halvorsen", "Henriksen",
+    "Lund", "Sørensen", "Jakobsen", "Moen", "Gundersen", "Iversen", "Strand", "Solberg",
+    "Svendsen", "Eide", "Knutsen", "Martinsen", "Paulsen", "Bakken", "Kristoffersen",
+    "Mathisen", "Lie", "Amundsen", "Nguyen", "Rasmussen", "Ali", "Lunde", "Solheim",
+    "Berge", "Moe", "Nygård", "Bakke", "Kristensen", "Fredriksen", "Holm", "Lien",
+    "Hauge", "Christensen", "Andresen", "Nielsen", "Knudsen", "Evensen", "Østby", "Aasen",
+]
+CLUBS = [
+    "Oslo Skøiteklub", "Bergen Kunstløpklubb", "Trondheim Skøiteklubb", "Stavanger Kunstløpklubb",
+    "Asker Kunstløpklubb", "Bærum Kunstløpklubb", "Hamar Kunstløpklubb", "Tromsø Kunstløpklubb",
+    "Drammen Kunstløpklubb", "Lillehammer Kunstløpklubb", "Fredrikstad Kunstløpklubb", "Skien Kunstløpklubb",
+]
+EVENTS = [
+    ("WSUNDER12", False), ("WSUNDER14", False), ("WSJUNIOR", True), ("WSSENIOR", True),
+    ("MSJUNIOR", True), ("MSSENIOR", True), ("WSREKRUTT", False), ("WSNOVICE", True),
+]
+ELEMENTS = ["1A", "2S", "2T", "2Lo", "2F", "2Lz", "2A", "3S", "3T", "CCoSp", "StSq", "ChSq", "FSSp", "LSp"]
+
+# MPEG-1 Layer III, 32 kbit/s, 32 kHz, mono: 144 byte per ramme, 36 ms lyd.
+MP3_FRAME = b"\xff\xfb\x18\xc4" + b"\x00" * 140
+MP3_FRAME_SECONDS = 0.036
+
+SIZES = (50, 500, 5000)
+
+
+def noop_log(message):
+    pass
+
+
+def make_people(count, rnd):
+    people = []
+    used = set()
+    while len(people) < count:
+        given = rnd.choice(GIVEN_NAMES)
+        family = rnd.choice(FAMILY_NAMES)
+        if rnd.random() < 0.3:
+            family = f"{family} {rnd.choice(FAMILY_NAMES)}"
+        if (given, family) in used:
+            continue
+        used.add((given, family))
+        event, has_short = rnd.choice(EVENTS)
+        people.append(
+            {
+                "code": f"{1000000 + len(people)}",
+                "given": given,
+                "family": family,
+                "club": rnd.choice(CLUBS),
+                "gender": "M" if event.startswith("MS") else "F",
+                "event": event,
+                "has_short": has_short,
+            }
+        )
+    return people
+
+
+def participant_xml(person, entry_order, rnd):
+    entries = [
+        f'<EventEntry Code="ENTRY_ORDER" Pos="1" Value="{entry_order}"/>',
+        f'<EventEntry Code="MUSIC" Pos="1" Value="{person["family"]} {person["given"]} - Fri"/>',
+        f'<EventEntry Code="CLUB" Pos="1" Value="{person["club"]}"/>',
+    ]
+    for pos, element in enumerate(rnd.sample(ELEMENTS, 7), start=1):
+        entries.append(f'<EventEntry Code="ELEMENT_CODE_FREE" Pos="{pos}" Value="{element}"/>')
+    if person["has_short"]:
+        entries.append(f'<EventEntry Code="MUSIC" Pos="2" Value="{person["family"]} {person["given"]} - Kort"/>')
+        for pos, element in enumerate(rnd.sample(ELEMENTS, 5), start=1):
+            entries.append(f'<EventEntry Code="ELEMENT_CODE_SHORT" Pos="{pos}" Value="{element}"/>')
+    print_name = f'{person["family"].upper()} {person["given"]}'
+    return (
+        f'<Participant Code="{person["code"]}" GivenName="{person["given"]}" '
+        f'FamilyName="{person["family"]}" PrintName="{print_name}" Gender="{person["gender"]}" '
+        f'Organisation="{person["club"]}"><Discipline Code="FSK"><RegisteredEvent Event="{person["event"]}">'
+        + "".join(entries)
+        + "</RegisteredEvent></Discipline></Participant>"
+    )
+
+
+def write_fsm_zip(path, people, rnd, documents=4):
+    per_doc = max(1, -(-len(people) // documents))
+    docs = []
+    for start in range(0, len(people), per_doc):
+        chunk = people[start : start + per_doc]
+        body = "".join(
+            participant_xml(person, idx, rnd) for idx, person in enumerate(chunk, start=start + 1)
+        )
+        docs.append(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<OdfBody DocumentCode="FSK{start}" Version="1"><Competition>{body}</Competition></OdfBody>'
+        )
+    judges = "".join(
+        f'<Official Code="J{i}" GivenName="{rnd.choice(GIVEN_NAMES)}" FamilyName="{rnd.choice(FAMILY_NAMES)}" '
+        f'Organisation="NOR" Function="{"REF" if i == 0 else "JDG"}"/>'
+        for i in range(9)
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("DT_PARTIC_FSK.xml", "\n".join(docs))
+        zf.writestr(
+            "judges.xml",
+            f'<?xml version="1.0" encoding="UTF-8"?><OdfBody><Competition>{judges}</Competition></OdfBody>',
+        )
+
+
+def write_music_zip(path, people, rnd, seconds):
+    frames = max(2, int(seconds / MP3_FRAME_SECONDS))
+    data = MP3_FRAME * frames
+    written = 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for person in people:
+            if rnd.random() < 0.08:
+                continue
+            name = f'{person["family"]}_{person["given"]}_{person["event"]}_Fri.mp3'.replace(" ", "_")
+            zf.writestr(name, data)
+            written += 1
+    return written
+
+
+def write_isonen_excel(path, people, rnd):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Deltakere")
+    ws.append(["Fornavn", "Etternavn", "Kjønn", "Klubb", "Påmelding"])
+    listed = list(people)
+    rnd.shuffle(listed)
+    for person in listed:
+        given = person["given"]
+        family = person["family"]
+        roll = rnd.random()
+        if roll < 0.04:
+            # Skrivefeil som bare den uskarpe navnematchingen fanger.
+            given = given[:-1] + ("e" if given[-1] != "e" else "a")
+        elif roll < 0.08 and " " in family:
+            family = family.split(" ")[0]
+        status = "Avmeldt" if rnd.random() < 0.02 else "Påmeldt"
+        ws.append([given, family, "Jente" if person["gender"] == "F" else "Gutt", person["club"], status])
+    for idx in range(max(1, len(people) // 40)):
+        ws.append([f"Ekstra{idx}", rnd.choice(FAMILY_NAMES), "Jente", rnd.choice(CLUBS), "Påmeldt"])
+    wb.save(path)
+
+
+def generate_competition(folder, count, seed, mp3_seconds):
+    rnd = random.Random(seed + count)
+    folder.mkdir(parents=True, exist_ok=True)
+    people = make_people(count, rnd)
+    data_zip = folder / f"FMSData_Benchmark_{count}_2026-03-01.zip"
+    music_zip = folder / f"Musikk_Benchmark_{count}_2026-03-01.zip"
+    excel_path = folder / f"Deltakerliste_Benchmark_{count}_2026-03-01.xlsx"
+    write_fsm_zip(data_zip, people, rnd)
+    mp3_count = write_music_zip(music_zip, people, rnd, mp3_seconds)
+    write_isonen_excel(excel_path, people, rnd)
+    return {
+        "data_zip": data_zip,
+        "music_zip": music_zip,
+        "excel_path": excel_path,
+        "mp3_files": mp3_count,
+        "bytes": {
+            "data_zip": data_zip.stat().st_size,
+            "music_zip": music_zip.stat().st_size,
+            "excel": excel_path.stat().st_size,
+        },
+    }
+
+
+def measure(name, func, repeat, setup=None):
+    # Tid måles uten tracemalloc (som gjør Python-kode merkbart tregere);
+    # toppminnet måles i en egen kjøring etterpå.
+    timings = []
+    result = None
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    record = {
+        "stage": name,
+        "best_s": round(min(timings), 6),
+        "median_s": round(statistics.median(timings), 6),
+        "runs_s": [round(t, 6) for t in timings],
+        "peak_kib": round(peak / 1024, 1),
+    }
+    return result, record
+
+
+def stage_records(comp, workdir, repeat, exporters):
+    records = []
+    data_zip = comp["data_zip"]
+    music_zip = comp["music_zip"]
+    excel_path = comp["excel_path"]
+
+    def run(name, func, setup=None):
+        result, record = measure(name, func, repeat, setup)
+        records.append(record)
+        return result
+
+    with zipfile.ZipFile(data_zip) as zf:
+        xml_bytes = zf.read("DT_PARTIC_FSK.xml")
+    run("parse_competition", lambda: fsm.parse_competition(BytesIO(xml_bytes), noop_log))
+    rows = run("load_participants_from_excel", lambda: fsm.load_participants_from_excel(excel_path, noop_log))
+    zip_rows, _ = run("read_fsm_zip", lambda: fsm.read_fsm_zip(data_zip, noop_log))
+    music_files, music_durations, _ = run(
+        "read_music_zip", lambda: fsm.read_music_zip(music_zip, None, noop_log)
+    )
+    run(
+        "reconcile_participants",
+        lambda fresh: fsm.reconcile_participants(
+            fresh, zip_rows, music_files, music_durations, 0.85, noop_log
+        ),
+        setup=lambda: ([dict(row) for row in rows],),
+    )
+    result = run(
+        "scan_competition",
+        lambda: fsm.scan_competition(data_zip, music_zip, excel_path, noop_log),
+    )
+    scan_cache = fsm.ScanCache()
+    fsm.scan_competition(data_zip, music_zip, excel_path, noop_log, scan_cache=scan_cache)
+    run(
+        "scan_competition_cached",
+        lambda: fsm.scan_competition(data_zip, music_zip, excel_path, noop_log, scan_cache=scan_cache),
+    )
+
+    scanned = result["rows"]
+    start = datetime(2026, 3, 1, 9, 0)
+    current = start
+    for row in scanned:
+        seconds = row.get("MusikkSek") or 240
+        row["StartTid"] = current.strftime("%H:%M")
+        current = current + timedelta(seconds=seconds + 30)
+        row["SluttTid"] = current.strftime("%H:%M")
+    entries = run(
+        "build_startliste",
+        lambda: fsm.build_startliste(scanned, 6, 240, start, warmup_seconds=360, pause_after=30, pause_seconds=900),
+    )
+
+    if exporters:
+        out_dir = workdir / "output"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        title = data_zip.stem
+        run("generate_excel", lambda: fsm.generate_excel(scanned, str(out_dir / "liste.xlsx"), noop_log))
+        run("generate_html", lambda: fsm.generate_html(scanned, str(out_dir / "liste.html"), title, noop_log))
+        run("generate_pdf", lambda: fsm.generate_pdf(scanned, str(out_dir / "liste.pdf"), title, noop_log))
+        run(
+            "generate_startliste_excel",
+            lambda: fsm.generate_startliste_excel(entries, str(out_dir / "startliste.xlsx"), title, noop_log),
+        )
+        run(
+            "generate_startliste_pdf",
+            lambda: fsm.generate_startliste_pdf(entries, str(out_dir / "startliste.pdf"), title, noop_log),
+        )
+        run(
+            "generate_vlc_playlist",
+            lambda: fsm.generate_vlc_playlist(scanned, out_dir, title, music_zip, noop_log),
+        )
+    counts = {
+        "isonen_rows": len(rows),
+        "fsm_rows": len(zip_rows),
+        "mp3_files": comp["mp3_files"],
+        "matched_fsm": sum(1 for row in scanned if row.get("Manglende i zip") != "JA"),
+        "matched_music": sum(1 for row in scanned if row.get("MusikkFil")),
+        "startliste_entries": len(entries),
+    }
+    return records, counts
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {
+        (size["skaters"], stage["stage"]): stage["best_s"]
+        for size in baseline.get("sizes", [])
+        for stage in size.get("stages", [])
+    }
+    regressions = []
+    for size in results["sizes"]:
+        for stage in size["stages"]:
+            before = previous.get((size["skaters"], stage["stage"]))
+            if before and stage["best_s"] > before * threshold and stage["best_s"] - before > 0.005:
+                regressions.append(
+                    {
+                        "skaters": size["skaters"],
+                        "stage": stage["stage"],
+                        "baseline_s": before,
+                        "best_s": stage["best_s"],
+                        "ratio": round(stage["best_s"] / before, 2),
+                    }
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ytelsesmåling av FSM/Isonen/Musikk-kjeden.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="antall utøvere")
+    parser.add_argument("--repeat", type=int, default=3, help="kjøringer per steg")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mp3-seconds", type=float, default=2.0, help="lengde på hver syntetiske MP3")
+    parser.add_argument("--no-exporters", action="store_true", help="hopp over Excel/HTML/PDF/spilleliste")
+    parser.add_argument("--workdir", help="mappe for testdata (standard: midlertidig)")
+    parser.add_argument("--output", help="skriv JSON hit i stedet for stdout")
+    parser.add_argument("--baseline", help="tidligere JSON å sammenligne med")
+    parser.add_argument("--threshold", type=float, default=1.25, help="tregere enn dette regnes som regresjon")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.workdir:
+        root = Path(args.workdir)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="fsm_benchmark_")
+        root = Path(tmp.name)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "version": fsm.get_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "sizes": [],
+    }
+    try:
+        for count in args.sizes:
+            workdir = root / f"stevne_{count}"
+            started = time.perf_counter()
+            comp = generate_competition(workdir, count, args.seed, args.mp3_seconds)
+            generated_s = time.perf_counter() - started
+            print(f"{count} utøvere: testdata laget på {generated_s:.2f} s", file=sys.stderr)
+            stages, counts = stage_records(comp, workdir, max(1, args.repeat), not args.no_exporters)
+            for stage in stages:
+                print(
+                    f"  {stage['stage']:<28} {stage['best_s'] * 1000:10.1f} ms"
+                    f"  topp {stage['peak_kib'] / 1024:8.1f} MiB",
+                    file=sys.stderr,
+                )
+            results["sizes"].append(
+                {
+                    "skaters": count,
+                    "fixture_bytes": comp["bytes"],
+                    "counts": counts,
+                    "stages": stages,
+                }
+            )
+    finally:
+        if tmp:
+            tmp.cleanup()
+
+    exit_code = 0
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        results["regressions"] = regressions
+        for item in regressions:
+            print(
+                f"Regresjon: {item['stage']} ({item['skaters']} utøvere) "
+                f"{item['baseline_s'] * 1000:.1f} -> {item['best_s'] * 1000:.1f} ms",
+                file=sys.stderr,
+            )
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 import os
 import sys
 import zipfile
-import xml.etree.ElementTree as ET
+from xml.parsers import expat
+import codecs
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, simpledialog
@@ -9,17 +10,128 @@ from tkinter.scrolledtext import ScrolledText
 from datetime import datetime, timedelta
 import subprocess
 import tempfile
-from io import BytesIO
+import shutil
+import threading
+import queue
+import math
+import operator
+import difflib
+from io import BytesIO, StringIO
 import random
 import re
 import json
-
-
-def decode_xml_bytes(data):
-    try:
-        return data.decode("utf-8")
-    except UnicodeDecodeError:
-        return data.decode("cp1252", errors="replace")
+from html import escape as escape_html
+import bisect
+import heapq
+import sqlite3
+import pickle
+import socket
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+from array import array
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+XML_CHUNK_SIZE = 64 * 1024
+XML_DECLARATION_RE = re.compile(rb"""<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z0-9._-]+)["']""")
+XML_INVALID_TOKEN = expat.errors.codes[expat.errors.XML_ERROR_INVALID_TOKEN]
+XML_JUNK_AFTER_ROOT = expat.errors.codes[expat.errors.XML_ERROR_JUNK_AFTER_DOC_ELEMENT]
+XML_DOCUMENT_MARKER = b"<OdfBody"
+
+
+def xml_encoding(head):
+    # Tegnsett fra BOM eller XML-deklarasjonen; None betyr UTF-8 etter standarden.
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    match = XML_DECLARATION_RE.match(head.lstrip())
+    if not match:
+        return None
+    return match.group(1).decode("ascii").lower()
+
+
+def stream_xml(stream, start, end, log, encoding=None, head=b"", discard=None):
+    # Mater bytes bit for bit til expat uten å bygge et tre. Flere
+    # dokumenter etter hverandre (OdfBody) leses ved å starte en ny parser
+    # der den forrige sluttet. Et ødelagt dokument etter det første hoppes
+    # over til neste <OdfBody; discard() skal da forkaste det som er lest
+    # fra dokumentet.
+    documents = 0
+    parser = None
+    skipping = False
+    # expat holder igjen uferdige tokens fra forrige bit, så ErrorByteIndex
+    # kan peke dit. pending er forrige bit og base dens posisjon i strømmen.
+    pending = b""
+    base = 0
+    data = head or stream.read(XML_CHUNK_SIZE)
+    while data:
+        if parser is None:
+            marker = XML_DOCUMENT_MARKER if skipping else b"<"
+            begin = data.find(marker)
+            if begin == -1:
+                # Behold en hale i tilfelle markøren er delt mellom to biter.
+                tail = data[-(len(marker) - 1):] if len(marker) > 1 else b""
+                more = stream.read(XML_CHUNK_SIZE)
+                data = tail + more if more else b""
+                continue
+            skipping = False
+            data = data[begin:]
+            parser = expat.ParserCreate(encoding)
+            parser.StartElementHandler = start
+            parser.EndElementHandler = end
+            pending = b""
+            base = 0
+            documents += 1
+            if documents == 2:
+                log("XML inneholder flere dokumenter, leser alle OdfBody.")
+        try:
+            parser.Parse(data, False)
+        except expat.ExpatError as exc:
+            offset = parser.ErrorByteIndex - base
+            if exc.code == XML_JUNK_AFTER_ROOT and offset >= 0:
+                data = (pending + data)[offset:]
+                parser = None
+                continue
+            if documents < 2:
+                raise
+            log(f"Hopper over ødelagt OdfBody {documents}: {exc}")
+            if discard:
+                discard()
+            data = (pending + data)[offset + 1 if offset >= 0 else 0 :]
+            parser = None
+            skipping = True
+            continue
+        base += len(pending)
+        pending = data
+        data = stream.read(XML_CHUNK_SIZE)
+    if parser is not None:
+        try:
+            parser.Parse(b"", True)
+        except expat.ExpatError as exc:
+            if documents < 2:
+                raise
+            log(f"Hopper over ufullstendig OdfBody {documents}: {exc}")
+            if discard:
+                discard()
+    return documents
+
+
+def parse_xml_member(zf, entry, parse, log):
+    with zf.open(entry) as stream:
+        head = stream.read(XML_CHUNK_SIZE)
+        encoding = xml_encoding(head)
+        try:
+            return parse(stream, log, encoding, head)
+        except expat.ExpatError as exc:
+            # Eldre eksporter kan være cp1252 selv om de oppgir (eller ikke oppgir) UTF-8.
+            if exc.code != XML_INVALID_TOKEN or encoding not in (None, "utf-8"):
+                raise
+    log(f"{entry.filename} er ikke gyldig UTF-8, leser som cp1252.")
+    with zf.open(entry) as stream:
+        return parse(stream, log, "cp1252")
 
 
 def safe_int(value, default=0):
@@ -33,90 +145,91 @@ def is_cancelled(status):
     return "avmeld" in (status or "").strip().lower()
 
 
-def parse_competition(xml_text, log):
+def parse_competition(stream, log, encoding=None, head=b""):
     rows = []
-    roots = []
-    try:
-        roots = [ET.fromstring(xml_text)]
-    except ET.ParseError as exc:
-        if "junk after document element" in str(exc):
-            log("XML inneholder flere dokumenter, prøver å hente alle OdfBody.")
-            for match in re.finditer(r"<OdfBody\b", xml_text):
-                start = match.start()
-                end = xml_text.find("</OdfBody>", start)
-                if end != -1:
-                    chunk = xml_text[start : end + len("</OdfBody>")]
-                    try:
-                        roots.append(ET.fromstring(chunk))
-                    except ET.ParseError:
-                        continue
-        else:
-            raise
-
-    for idx_root, root in enumerate(roots, start=1):
-        log(f"Leser OdfBody {idx_root} av {len(roots)}.")
-        comp = root.find("Competition")
-        if comp is None:
-            continue
+    path = []
+    state = {}
+
+    def start(name, attrs):
+        path.append(name)
+        depth = len(path)
+        if depth == 1:
+            state["mark"] = len(rows)
+        if depth < 2 or path[1] != "Competition":
+            return
+        if depth == 2:
+            state["bodies"] = state.get("bodies", 0) + 1
+            log(f"Leser OdfBody {state['bodies']}.")
+        elif depth == 3 and name == "Participant":
+            state["participant"] = attrs
+        elif depth == 5 and name == "RegisteredEvent" and path[3] == "Discipline":
+            state["event"] = {
+                "code": (attrs.get("Event") or "").strip(),
+                "entry_order": "",
+                "music": {},
+                "clubs": {},
+                "free": [],
+                "short": [],
+            }
+        elif depth == 6 and name == "EventEntry" and "event" in state:
+            event = state["event"]
+            code = (attrs.get("Code") or "").strip()
+            pos = safe_int(attrs.get("Pos"))
+            val = (attrs.get("Value") or "").strip()
+
+            if code == "ENTRY_ORDER":
+                event["entry_order"] = val
+            elif code == "MUSIC":
+                if pos:
+                    event["music"][pos] = val
+            elif code == "CLUB":
+                if pos:
+                    event["clubs"][pos] = val
+            elif code == "ELEMENT_CODE_FREE":
+                event["free"].append((pos, val))
+            elif code == "ELEMENT_CODE_SHORT":
+                event["short"].append((pos, val))
+
+    def end(name):
+        depth = len(path)
+        path.pop()
+        if depth == 3 and name == "Participant":
+            state.pop("participant", None)
+        if depth != 5 or name != "RegisteredEvent" or "event" not in state:
+            return
+        event = state.pop("event")
+        participant = state.get("participant", {})
+        print_name = (participant.get("PrintName") or "").strip()
+        elements_free = [v for _, v in sorted(event["free"]) if v]
+        elements_short = [v for _, v in sorted(event["short"]) if v]
+
+        log(f"Leser deltager: {print_name} (Event: {event['code']})")
+        rows.append(
+            {
+                "PrintName": print_name,
+                "GivenName": (participant.get("GivenName") or "").strip(),
+                "FamilyName": (participant.get("FamilyName") or "").strip(),
+                "Gender": (participant.get("Gender") or "").strip(),
+                "Organisation": (participant.get("Organisation") or "").strip(),
+                "ParticipantCode": (participant.get("Code") or "").strip(),
+                "Event": event["code"],
+                "EntryOrder": event["entry_order"],
+                "Music1": event["music"].get(1, ""),
+                "Music2": event["music"].get(2, ""),
+                "Club1": event["clubs"].get(1, ""),
+                "Club2": event["clubs"].get(2, ""),
+                "ElementsFree": ", ".join(elements_free),
+                "ElementsShort": ", ".join(elements_short),
+            }
+        )
 
-        for participant in comp.findall("Participant"):
-            given = (participant.attrib.get("GivenName") or "").strip()
-            family = (participant.attrib.get("FamilyName") or "").strip()
-            print_name = (participant.attrib.get("PrintName") or "").strip()
-            gender = (participant.attrib.get("Gender") or "").strip()
-            org = (participant.attrib.get("Organisation") or "").strip()
-            participant_code = (participant.attrib.get("Code") or "").strip()
-
-            for discipline in participant.findall("Discipline"):
-                for reg in discipline.findall("RegisteredEvent"):
-                    event_code = (reg.attrib.get("Event") or "").strip()
-                    entry_order = ""
-                    music = {}
-                    clubs = {}
-                    elements_free = []
-                    elements_short = []
-
-                    for entry in reg.findall("EventEntry"):
-                        code = (entry.attrib.get("Code") or "").strip()
-                        pos = safe_int(entry.attrib.get("Pos"))
-                        val = (entry.attrib.get("Value") or "").strip()
-
-                        if code == "ENTRY_ORDER":
-                            entry_order = val
-                        elif code == "MUSIC":
-                            if pos:
-                                music[pos] = val
-                        elif code == "CLUB":
-                            if pos:
-                                clubs[pos] = val
-                        elif code == "ELEMENT_CODE_FREE":
-                            elements_free.append((pos, val))
-                        elif code == "ELEMENT_CODE_SHORT":
-                            elements_short.append((pos, val))
-
-                    elements_free = [v for _, v in sorted(elements_free) if v]
-                    elements_short = [v for _, v in sorted(elements_short) if v]
-
-                    log(f"Leser deltager: {print_name} (Event: {event_code})")
-                    rows.append(
-                        {
-                            "PrintName": print_name,
-                            "GivenName": given,
-                            "FamilyName": family,
-                            "Gender": gender,
-                            "Organisation": org,
-                            "ParticipantCode": participant_code,
-                            "Event": event_code,
-                            "EntryOrder": entry_order,
-                            "Music1": music.get(1, ""),
-                            "Music2": music.get(2, ""),
-                            "Club1": clubs.get(1, ""),
-                            "Club2": clubs.get(2, ""),
-                            "ElementsFree": ", ".join(elements_free),
-                            "ElementsShort": ", ".join(elements_short),
-                        }
-                    )
+    def discard():
+        del rows[state.get("mark", len(rows)) :]
+        path.clear()
+        state.pop("participant", None)
+        state.pop("event", None)
 
+    stream_xml(stream, start, end, log, encoding, head, discard)
     return rows
 
 
@@ -154,6 +267,22 @@ def build_name_key(given, family, strict=True):
     return (given_primary, family_norm)
 
 
+def apply_fsm_match(row, zip_row):
+    row["ParticipantCode"] = zip_row.get("ParticipantCode", "")
+    row["Event"] = zip_row.get("Event", "")
+    row["EntryOrder"] = zip_row.get("EntryOrder", "")
+    row["Music1"] = zip_row.get("Music1", "")
+    row["Music2"] = zip_row.get("Music2", "")
+    row["Club1"] = zip_row.get("Club1", "")
+    row["Club2"] = zip_row.get("Club2", "")
+    row["ElementsFree"] = zip_row.get("ElementsFree", "")
+    row["ElementsShort"] = zip_row.get("ElementsShort", "")
+    zip_print = zip_row.get("PrintName") or f"{zip_row.get('GivenName', '')} {zip_row.get('FamilyName', '')}".strip()
+    row["NavnFraFsm"] = zip_print
+    row["Manglende i zip"] = ""
+    return zip_print
+
+
 def sanitize_filename(value):
     cleaned = re.sub(r"[^A-Za-z0-9._-]+", "_", (value or "").strip())
     return cleaned.strip("._") or "fil"
@@ -209,6 +338,18 @@ def name_matches_filename(given, family, filename):
     return family_tokens[0] in hay
 
 
+def assign_music(row, matched, music_durations):
+    row["Musikk"] = "ok" if matched else "mangler"
+    row["MusikkFil"] = matched or ""
+    musikk_sec = music_durations.get(matched) if matched else None
+    if matched and musikk_sec is None:
+        row["MusikkTid"] = "Klarer ikke å hente tid"
+        row["MusikkSek"] = ""
+    else:
+        row["MusikkTid"] = format_duration(musikk_sec)
+        row["MusikkSek"] = int(round(musikk_sec)) if musikk_sec else ""
+
+
 def format_duration(seconds):
     if seconds is None:
         return ""
@@ -250,6 +391,25 @@ def parse_duration_mmss(value):
     return None
 
 
+def assign_row_times(rows, start_time, interval):
+    # Start- og sluttid per rad ut fra første start og tid per utøver;
+    # pauser bruker sin egen lengde.
+    start_dt = parse_time_hhmm(start_time)
+    interval_seconds = parse_duration_mmss(interval)
+    if not rows or not start_dt or not interval_seconds:
+        return False
+    current_dt = start_dt
+    for row in rows:
+        row["StartTid"] = current_dt.strftime("%H:%M:%S")
+        if row.get("IsPause"):
+            pause_seconds = row.get("PauseSek") or 0
+            current_dt = current_dt + timedelta(seconds=pause_seconds)
+        else:
+            current_dt = current_dt + timedelta(seconds=interval_seconds)
+        row["SluttTid"] = current_dt.strftime("%H:%M:%S")
+    return True
+
+
 def parse_date_ddmmyy(value):
     try:
         return datetime.strptime(value.strip(), "%d.%m.%y").date()
@@ -367,18 +527,40 @@ def load_participants_from_excel(excel_path, log):
     return out
 
 
-def parse_officials(xml_text, log):
-    try:
-        root = ET.fromstring(xml_text)
-    except ET.ParseError:
-        return 0
-    comp = root.find("Competition")
-    if comp is None:
+def parse_officials(stream, log, encoding=None, head=b""):
+    officials = []
+    path = []
+    state = {}
+
+    def start(name, attrs):
+        path.append(name)
+        if len(path) == 1:
+            state["mark"] = len(officials)
+        if len(path) != 3 or name != "Official" or path[1] != "Competition":
+            return
+        given = (attrs.get("GivenName") or "").strip()
+        family = (attrs.get("FamilyName") or "").strip()
+        officials.append(
+            {
+                "name": (attrs.get("PrintName") or "").strip() or f"{given} {family}".strip(),
+                "role": (attrs.get("Function") or "").strip(),
+                "nation": (attrs.get("Organisation") or "").strip(),
+            }
+        )
+
+    def end(name):
+        path.pop()
+
+    def discard():
+        del officials[state.get("mark", len(officials)) :]
+        path.clear()
+
+    stream_xml(stream, start, end, log, encoding, head, discard)
+    if not officials:
         log("Ingen officials funnet i judges-filen.")
-        return 0
-    officials = comp.findall("Official")
+        return officials
     log(f"Fant {len(officials)} officials i judges-filen.")
-    return len(officials)
+    return officials
 
 
 def generate_excel(rows, out_path, log):
@@ -435,69 +617,138 @@ def generate_excel(rows, out_path, log):
     return True
 
 
-def generate_html(rows, out_path, title, log):
-    headers = [
-        "PrintName",
-        "Organisation",
-        "ParticipantCode",
-        "Event",
-        "Påmelding",
-        "StartTid",
-        "SluttTid",
-        "Musikk",
-        "MusikkTid",
-        "Club1",
-        "Club2",
-        "ElementsFree",
-        "ElementsShort",
-    ]
-
-    def esc(s):
-        return (
-            str(s)
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-        )
+HTML_HEADERS = [
+    "PrintName",
+    "Organisation",
+    "ParticipantCode",
+    "Event",
+    "Påmelding",
+    "StartTid",
+    "SluttTid",
+    "Musikk",
+    "MusikkTid",
+    "Club1",
+    "Club2",
+    "ElementsFree",
+    "ElementsShort",
+]
+
+HTML_STYLE = """
+    body { font-family: Arial, sans-serif; margin: 24px; }
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border: 1px solid #ccc; padding: 6px 8px; text-align: left; }
+    th { background: #f4f4f4; }
+    tr.x { background: #f8d7da; color: #7a0b0b; }
+"""
 
-    rows_html = []
-    for row in rows:
-        row_style = ""
-        if is_cancelled(row.get("Påmelding", "")):
-            row_style = ' style="background:#f8d7da;color:#7a0b0b;"'
-        cells = "".join(f"<td>{esc(row.get(h, ''))}</td>" for h in headers)
-        rows_html.append(f"<tr{row_style}>{cells}</tr>")
+HTML_COMPACT_STYLE = """
+    body { margin: 12px; }
+    #q { width: 100%; max-width: 420px; padding: 8px; font-size: 16px; box-sizing: border-box; }
+    #box { height: 78vh; overflow: auto; border: 1px solid #ccc; margin-top: 8px; -webkit-overflow-scrolling: touch; }
+    #box table { table-layout: fixed; min-width: 1300px; }
+    #box th { position: sticky; top: 0; z-index: 1; }
+    #box td, #box th { white-space: nowrap; overflow: hidden; text-overflow: ellipsis; height: 18px; }
+"""
 
-    html = f"""<!doctype html>
-<html lang="no">
-<head>
-  <meta charset="utf-8">
-  <title>{esc(title)}</title>
-  <style>
-    body {{ font-family: Arial, sans-serif; margin: 24px; }}
-    table {{ border-collapse: collapse; width: 100%; }}
-    th, td {{ border: 1px solid #ccc; padding: 6px 8px; text-align: left; }}
-    th {{ background: #f4f4f4; }}
-  </style>
-</head>
-<body>
-  <h2>{esc(title)}</h2>
-  <table>
-    <thead>
-      <tr>
-        {''.join(f'<th>{esc(h)}</th>' for h in headers)}
-      </tr>
-    </thead>
-    <tbody>
-      {''.join(rows_html)}
-    </tbody>
-  </table>
-</body>
-</html>
+# Tegner bare radene som er synlige i rullefeltet, og filtrerer på all
+# tekst i raden. Radhøyden måles fra første tegnede rad.
+HTML_COMPACT_SCRIPT = """
+(function () {
+  var d = JSON.parse(document.getElementById("data").textContent);
+  var rows = d.r, cancelled = {}, view = [], text = null, rowH = 31, queued = false, timer = 0;
+  var box = document.getElementById("box"), body = document.getElementById("rows");
+  var count = document.getElementById("count"), q = document.getElementById("q");
+  d.c.forEach(function (i) { cancelled[i] = true; });
+  for (var i = 0; i < rows.length; i++) view.push(i);
+  function esc(s) {
+    return String(s).replace(/[&<>"']/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; });
+  }
+  function render() {
+    queued = false;
+    var first = Math.max(0, Math.floor(box.scrollTop / rowH) - 10);
+    var last = Math.min(view.length, first + Math.ceil(box.clientHeight / rowH) + 20);
+    var out = ['<tr style="height:' + first * rowH + 'px"></tr>'];
+    for (var k = first; k < last; k++) {
+      var idx = view[k];
+      out.push("<tr" + (cancelled[idx] ? ' class="x"' : "") + "><td>" + rows[idx].map(esc).join("</td><td>") + "</td></tr>");
+    }
+    out.push('<tr style="height:' + (view.length - last) * rowH + 'px"></tr>');
+    body.innerHTML = out.join("");
+    count.textContent = view.length + " av " + rows.length;
+    var probe = body.rows[1];
+    if (probe && last > first && Math.abs(probe.offsetHeight - rowH) > 1) {
+      rowH = probe.offsetHeight;
+      render();
+    }
+  }
+  function schedule() {
+    if (!queued) { queued = true; requestAnimationFrame(render); }
+  }
+  function filter() {
+    var words = q.value.toLowerCase().split(/\\s+/).filter(Boolean);
+    if (!text) text = rows.map(function (r) { return r.join(" ").toLowerCase(); });
+    view = [];
+    for (var i = 0; i < rows.length; i++) {
+      if (words.every(function (w) { return text[i].indexOf(w) !== -1; })) view.push(i);
+    }
+    box.scrollTop = 0;
+    render();
+  }
+  box.addEventListener("scroll", schedule);
+  window.addEventListener("resize", schedule);
+  q.addEventListener("input", function () { clearTimeout(timer); timer = setTimeout(filter, 120); });
+  render();
+})();
 """
 
+
+def generate_html(rows, out_path, title, log, compact=False):
+    # Skriver radene etter hvert som de lages. Kompakt variant legger dataene
+    # som JSON og lar nettleseren tegne bare synlige rader, med søkefelt.
+    headers = HTML_HEADERS
+    if compact:
+        headers = [h for h in HTML_HEADERS if any(row.get(h, "") not in ("", None) for row in rows)]
+    title_html = escape_html(str(title), quote=True)
     try:
-        Path(out_path).write_text(html, encoding="utf-8")
+        with open(out_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write('<!doctype html>\n<html lang="no">\n<head>\n  <meta charset="utf-8">\n')
+            f.write('  <meta name="viewport" content="width=device-width, initial-scale=1">\n')
+            f.write(f"  <title>{title_html}</title>\n  <style>{HTML_STYLE}")
+            if compact:
+                f.write(HTML_COMPACT_STYLE)
+            f.write(f"  </style>\n</head>\n<body>\n  <h2>{title_html}</h2>\n")
+            if compact:
+                f.write(
+                    '  <input id="q" type="search" placeholder="Søk etter navn, klubb, klasse ..." '
+                    'aria-label="Søk">\n  <span id="count"></span>\n'
+                )
+                f.write('  <div id="box">\n  <table>\n')
+            else:
+                f.write("  <table>\n")
+            f.write("    <thead><tr>")
+            for h in headers:
+                f.write(f"<th>{escape_html(h, quote=True)}</th>")
+            f.write("</tr></thead>\n")
+            if compact:
+                f.write('    <tbody id="rows"></tbody>\n  </table>\n  </div>\n')
+                f.write('  <script id="data" type="application/json">{"r":[')
+                cancelled = []
+                for idx, row in enumerate(rows):
+                    if is_cancelled(row.get("Påmelding", "")):
+                        cancelled.append(idx)
+                    values = [str(row.get(h, "")) for h in headers]
+                    chunk = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+                    f.write(("," if idx else "") + chunk.replace("</", "<\\/"))
+                f.write(f'],"c":{json.dumps(cancelled)}}}</script>\n')
+                f.write(f"  <script>{HTML_COMPACT_SCRIPT}</script>\n")
+            else:
+                f.write("    <tbody>\n")
+                for row in rows:
+                    row_class = ' class="x"' if is_cancelled(row.get("Påmelding", "")) else ""
+                    cells = "".join(f"<td>{escape_html(str(row.get(h, '')), quote=True)}</td>" for h in headers)
+                    f.write(f"      <tr{row_class}>{cells}</tr>\n")
+                f.write("    </tbody>\n  </table>\n")
+            f.write("</body>\n</html>\n")
     except PermissionError:
         log(f"Kunne ikke skrive HTML (filen er trolig åpen): {out_path}")
         return False
@@ -508,15 +759,102 @@ def generate_html(rows, out_path, title, log):
     return True
 
 
+PDF_CHUNK_ROWS = 150
+
+pdf_cache = {}
+pdf_cache_lock = threading.Lock()
+
+
+def pdf_resources():
+    # Fontregistrering og stiler lages én gang per prosess.
+    with pdf_cache_lock:
+        if not pdf_cache:
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            font_name = "Helvetica"
+            bold_font_name = "Helvetica-Bold"
+            try:
+                calibri_path = Path("C:/Windows/Fonts/calibri.ttf")
+                if calibri_path.exists():
+                    pdfmetrics.registerFont(TTFont("Calibri", str(calibri_path)))
+                    font_name = "Calibri"
+                    calibri_bold_path = calibri_path.with_name("calibrib.ttf")
+                    if calibri_bold_path.exists():
+                        pdfmetrics.registerFont(TTFont("Calibri-Bold", str(calibri_bold_path)))
+                        bold_font_name = "Calibri-Bold"
+            except Exception:
+                font_name = "Helvetica"
+                bold_font_name = "Helvetica-Bold"
+            styles = getSampleStyleSheet()
+            pdf_cache.update(
+                {
+                    "font_name": font_name,
+                    "bold_font_name": bold_font_name,
+                    "styles": styles,
+                    "start_body": ParagraphStyle("BodyCell", fontName=font_name, fontSize=10, leading=11),
+                    "start_group": ParagraphStyle(
+                        "GroupCell", fontName=bold_font_name, fontSize=10, leading=11
+                    ),
+                    "start_title": ParagraphStyle(
+                        "StartTitle", parent=styles["Title"], fontName=font_name, fontSize=16, leading=18
+                    ),
+                    "start_generated": ParagraphStyle("Gen", fontName=font_name, fontSize=9),
+                }
+            )
+        return pdf_cache
+
+
+def pdf_text_cell(text, width, font_name, font_size, style):
+    # Paragraph bare når teksten må brytes; ren tekst er mye billigere å legge ut.
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import Paragraph
+
+    text = "" if text is None else str(text)
+    if stringWidth(text, font_name, font_size) <= width:
+        return text
+    return Paragraph(escape_html(text, quote=False), style)
+
+
+def pdf_chunked_table(header, body, col_widths, header_style, body_style, row_styles):
+    # Lange tabeller deles i biter, ellers legger reportlab ut alle gjenværende
+    # rader på nytt for hver side. Overskriften er en egen tabell som også
+    # tegnes øverst på senere sider via pdf_page_header.
+    from reportlab.platypus import LongTable, TableStyle
+
+    head = LongTable([header], colWidths=col_widths)
+    head.setStyle(TableStyle(header_style))
+    flowables = [head]
+    for start in range(0, len(body), PDF_CHUNK_ROWS):
+        chunk = body[start : start + PDF_CHUNK_ROWS]
+        cmds = list(body_style)
+        for offset in range(len(chunk)):
+            for cmd in row_styles.get(start + offset, ()):
+                cmds.append((cmd[0], (0, offset), (-1, offset)) + tuple(cmd[1:]))
+        table = LongTable(chunk, colWidths=col_widths)
+        table.setStyle(TableStyle(cmds))
+        flowables.append(table)
+    return head, flowables
+
+
+def pdf_page_header(head):
+    def draw(canvas, doc):
+        # Rammen har 6 pt polstring og tabeller sentreres i den.
+        avail = doc.width - 12
+        width, _ = head.wrapOn(canvas, avail, doc.topMargin)
+        head.drawOn(canvas, doc.leftMargin + 6 + (avail - width) / 2, doc.pagesize[1] - doc.topMargin - 6)
+
+    return draw
+
+
 def generate_pdf(rows, out_path, title, log):
     try:
         from reportlab.lib.pagesizes import A4, landscape
         from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.pdfbase.pdfmetrics import stringWidth
         from reportlab.platypus import (
             SimpleDocTemplate,
-            Table,
-            TableStyle,
             Paragraph,
             Spacer,
             Image,
@@ -536,12 +874,15 @@ def generate_pdf(rows, out_path, title, log):
         "MusikkTid",
         "ElementsFree",
     ]
-    data = [headers]
-    for row in rows:
-        data.append([row.get(h, "") for h in headers])
+    body = [[row.get(h, "") for h in headers] for row in rows]
+    # Samme bredder som reportlab ville regnet ut selv, men én gang for hele tabellen.
+    col_widths = [
+        max(stringWidth(line, "Helvetica", 8) for value in column for line in str(value).split("\n")) + 12
+        for column in zip(headers, *body)
+    ]
 
     doc = SimpleDocTemplate(out_path, pagesize=landscape(A4))
-    styles = getSampleStyleSheet()
+    styles = pdf_resources()["styles"]
     story = [
         Paragraph("Loddefjord IL Kunstløp", styles["Title"]),
         Spacer(1, 6),
@@ -559,23 +900,25 @@ def generate_pdf(rows, out_path, title, log):
     story.append(Paragraph(title, styles["Heading2"]))
     story.append(Spacer(1, 12))
 
-    table = Table(data, repeatRows=1)
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    body_style = [
         ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
         ("FONTSIZE", (0, 0), (-1, -1), 8),
         ("VALIGN", (0, 0), (-1, -1), "TOP"),
     ]
-    for idx, row in enumerate(rows, start=1):
+    header_style = [("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey)] + body_style
+    row_styles = {}
+    for idx, row in enumerate(rows):
         if is_cancelled(row.get("Påmelding", "")):
-            style_cmds.append(("BACKGROUND", (0, idx), (-1, idx), colors.HexColor("#F8D7DA")))
-            style_cmds.append(("TEXTCOLOR", (0, idx), (-1, idx), colors.HexColor("#7A0B0B")))
-    table.setStyle(TableStyle(style_cmds))
-    story.append(table)
+            row_styles[idx] = [
+                ("BACKGROUND", colors.HexColor("#F8D7DA")),
+                ("TEXTCOLOR", colors.HexColor("#7A0B0B")),
+            ]
+    head, tables = pdf_chunked_table(headers, body, col_widths, header_style, body_style, row_styles)
+    story.extend(tables)
     story.append(Spacer(1, 6))
     story.append(Paragraph(format_generated_ts(), styles["Normal"]))
     try:
-        doc.build(story)
+        doc.build(story, onLaterPages=pdf_page_header(head))
     except PermissionError:
         log(f"Kunne ikke skrive PDF (filen er trolig åpen): {out_path}")
         return False
@@ -620,6 +963,8 @@ def build_startliste(
             "nr": "",
             "navn": f"Oppvarmingsgruppe {group_num}",
             "klubb": "",
+            "gruppe": group_num,
+            "event": "",
         }
         entries.append(group_entry)
 
@@ -636,6 +981,8 @@ def build_startliste(
                     "nr": index + offset,
                     "navn": f"{row.get('GivenName', '')} {row.get('FamilyName', '')}".strip(),
                     "klubb": row.get("Organisation", ""),
+                    "gruppe": group_num,
+                    "event": row.get("Event", ""),
                 }
             )
             current_dt = runner_end
@@ -650,6 +997,9 @@ def build_startliste(
                         "nr": "",
                         "navn": pause_label,
                         "klubb": "",
+                        "gruppe": group_num,
+                        "event": "",
+                        "pause": True,
                     }
                 )
                 current_dt = pause_end
@@ -659,32 +1009,55 @@ def build_startliste(
     return entries
 
 
-def generate_startliste_excel(entries, out_path, title, log):
-    try:
-        import openpyxl
-        from openpyxl.utils import get_column_letter
-        from openpyxl.styles import Font, PatternFill
-    except Exception:
-        log("Mangler openpyxl. Installer med: pip install openpyxl")
-        return False
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Startliste"
-
+def split_startliste(entries):
+    # Deler en ferdig beregnet startliste i seksjoner per oppvarmingsgruppe
+    # og per klasse. Klasselistene tar med gruppeoverskriften foran
+    # utøverne slik at oppvarmingstiden står på oppslaget.
+    groups = {}
+    events = {}
+    current_group = None
+    last_header = {}
+    for entry in entries:
+        groups.setdefault(entry.get("gruppe"), []).append(entry)
+        if entry["is_group"]:
+            if not entry.get("pause"):
+                current_group = entry
+            continue
+        event = entry.get("event") or "Uten klasse"
+        section = events.setdefault(event, [])
+        if current_group is not None and last_header.get(event) is not current_group:
+            section.append(current_group)
+            last_header[event] = current_group
+        section.append(entry)
+    sections = [(f"Oppvarmingsgruppe {num}", items) for num, items in groups.items()]
+    sections.extend((event, items) for event, items in events.items())
+    return sections
+
+
+def startliste_sheet_title(label, used):
+    base = re.sub(r"[\[\]:*?/\\]", "", label).strip()[:31] or "Ark"
+    name = base
+    counter = 2
+    while name.lower() in used:
+        suffix = f" ({counter})"
+        name = base[: 31 - len(suffix)] + suffix
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+def write_startliste_sheet(ws, entries, title, styles):
+    from openpyxl.utils import get_column_letter
+
+    header_font, header_fill, group_font, group_fill = styles
     ws.append([title])
     ws.append([])
     headers = ["Nr.", "Start", "", "Slutt", "Navn", "Klubb"]
     ws.append(headers)
 
-    header_font = Font(bold=True)
     for cell in ws[3]:
         cell.font = header_font
 
-    header_fill = PatternFill(start_color="ADADAD", end_color="ADADAD", fill_type="solid")
-    group_fill = PatternFill(start_color="D0D0D0", end_color="D0D0D0", fill_type="solid")
-    group_font = Font(bold=True)
-
     for entry in entries:
         ws.append([entry["nr"], entry["start"], "-", entry["end"], entry["navn"], entry["klubb"]])
         if entry["is_group"]:
@@ -705,6 +1078,30 @@ def generate_startliste_excel(entries, out_path, title, log):
     ws.append([])
     ws.append([generated_ts])
 
+
+def generate_startliste_excel(entries, out_path, title, log, sections=None):
+    try:
+        import openpyxl
+        from openpyxl.styles import Font, PatternFill
+    except Exception:
+        log("Mangler openpyxl. Installer med: pip install openpyxl")
+        return False
+
+    styles = (
+        Font(bold=True),
+        PatternFill(start_color="ADADAD", end_color="ADADAD", fill_type="solid"),
+        Font(bold=True),
+        PatternFill(start_color="D0D0D0", end_color="D0D0D0", fill_type="solid"),
+    )
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Startliste"
+    write_startliste_sheet(ws, entries, title, styles)
+    used = {"startliste"}
+    for label, section_entries in sections or []:
+        sheet = wb.create_sheet(startliste_sheet_title(label, used))
+        write_startliste_sheet(sheet, section_entries, f"{title} - {label}", styles)
+
     try:
         wb.save(out_path)
     except PermissionError:
@@ -722,80 +1119,66 @@ def generate_startliste_pdf(entries, out_path, title, log):
     try:
         from reportlab.lib.pagesizes import A4
         from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
     except Exception:
         log("Mangler reportlab. Installer med: pip install reportlab")
         return False
 
-    font_name = "Helvetica"
-    try:
-        calibri_path = Path("C:/Windows/Fonts/calibri.ttf")
-        if calibri_path.exists():
-            pdfmetrics.registerFont(TTFont("Calibri", str(calibri_path)))
-            font_name = "Calibri"
-    except Exception:
-        font_name = "Helvetica"
-
-    data = [["Nr.", "Start", "", "Slutt", "Navn", "Klubb"]]
-    body_style = ParagraphStyle(
-        "BodyCell",
-        fontName=font_name,
-        fontSize=10,
-        leading=11,
-    )
-    for entry in entries:
-        name_cell = Paragraph(entry["navn"], body_style)
-        club_cell = Paragraph(entry["klubb"], body_style)
-        data.append([entry["nr"], entry["start"], "-", entry["end"], name_cell, club_cell])
+    resources = pdf_resources()
+    font_name = resources["font_name"]
+    body_style = resources["start_body"]
+    col_widths = [28, 64, 10, 64, 230, 127]
+    body = []
+    row_styles = {}
+    for idx, entry in enumerate(entries):
+        cell_font = font_name
+        cell_style = body_style
+        if entry["is_group"]:
+            # Hele grupperaden i fet skrift, også navn som må brytes.
+            cell_font = resources["bold_font_name"]
+            cell_style = resources["start_group"]
+            row_styles[idx] = [
+                ("BACKGROUND", colors.HexColor("#D0D0D0")),
+                ("FONTNAME", cell_font),
+            ]
+        name_cell = pdf_text_cell(entry["navn"], col_widths[4] - 12, cell_font, 10, cell_style)
+        club_cell = pdf_text_cell(entry["klubb"], col_widths[5] - 12, cell_font, 10, cell_style)
+        body.append([entry["nr"], entry["start"], "-", entry["end"], name_cell, club_cell])
 
     doc = SimpleDocTemplate(out_path, pagesize=A4, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        "StartTitle",
-        parent=styles["Title"],
-        fontName=font_name,
-        fontSize=16,
-        leading=18,
-    )
     generated_ts = format_generated_ts()
-    story = [Paragraph(title, title_style), Spacer(1, 8)]
+    story = [Paragraph(title, resources["start_title"]), Spacer(1, 8)]
 
-    col_widths = [28, 64, 10, 64, 230, 127]
-    table = Table(data, repeatRows=1, colWidths=col_widths)
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#ADADAD")),
-        ("FONTNAME", (0, 0), (-1, 0), font_name),
-        ("FONTNAME", (0, 1), (-1, -1), font_name),
-        ("FONTSIZE", (0, 0), (-1, 0), 11),
-        ("FONTSIZE", (0, 1), (-1, -1), 10),
-        ("ALIGN", (0, 0), (3, -1), "CENTER"),
+    shared_style = [
         ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
         ("TOPPADDING", (0, 0), (-1, -1), 1),
         ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+        ("LINEBEFORE", (0, 0), (0, -1), 0.5, colors.black),
+        ("LINEAFTER", (-1, 0), (-1, -1), 0.5, colors.black),
+    ]
+    header_style = shared_style + [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#ADADAD")),
+        ("FONTNAME", (0, 0), (-1, 0), font_name),
+        ("FONTSIZE", (0, 0), (-1, 0), 11),
+        ("ALIGN", (0, 0), (3, 0), "CENTER"),
         ("LINEABOVE", (0, 0), (-1, 0), 0.5, colors.black),
         ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.black),
+    ]
+    row_style = shared_style + [
+        ("FONTNAME", (0, 0), (-1, -1), font_name),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+        ("ALIGN", (0, 0), (3, -1), "CENTER"),
         ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.black),
-        ("LINEBEFORE", (0, 0), (0, -1), 0.5, colors.black),
-        ("LINEAFTER", (-1, 0), (-1, -1), 0.5, colors.black),
     ]
-    row_idx = 1
-    for entry in entries:
-        if entry["is_group"]:
-            style_cmds.append(
-                ("BACKGROUND", (0, row_idx), (-1, row_idx), colors.HexColor("#D0D0D0"))
-            )
-            style_cmds.append(("FONTNAME", (0, row_idx), (-1, row_idx), "Helvetica-Bold"))
-        row_idx += 1
-    table.setStyle(TableStyle(style_cmds))
-    story.append(table)
+    head, tables = pdf_chunked_table(
+        ["Nr.", "Start", "", "Slutt", "Navn", "Klubb"], body, col_widths, header_style, row_style, row_styles
+    )
+    story.extend(tables)
     story.append(Spacer(1, 6))
-    story.append(Paragraph(generated_ts, ParagraphStyle("Gen", fontName=font_name, fontSize=9)))
+    story.append(Paragraph(generated_ts, resources["start_generated"]))
 
     try:
-        doc.build(story)
+        doc.build(story, onLaterPages=pdf_page_header(head))
     except PermissionError:
         log(f"Kunne ikke skrive PDF (filen er trolig åpen): {out_path}")
         return False
@@ -807,6 +1190,40 @@ def generate_startliste_pdf(entries, out_path, title, log):
     return True
 
 
+def generate_startliste_pdfs(sections, out_dir, title, log, max_workers=4):
+    # Én PDF per seksjon i et begrenset antall tråder. Hver seksjon samler
+    # egne loggmeldinger, som skrives ut i seksjonsrekkefølge i kallerens
+    # tråd. En seksjon som feiler stopper ikke de andre.
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if not sections:
+        return 0
+
+    def build(number, label, section_entries):
+        messages = []
+        path = out_dir / f"{number:02d}_{sanitize_filename(label)}.pdf"
+        try:
+            ok = generate_startliste_pdf(section_entries, str(path), f"{title} - {label}", messages.append)
+        except Exception as exc:
+            messages.append(f"Kunne ikke lage PDF for {label}: {exc}")
+            ok = False
+        return ok, messages
+
+    written = 0
+    workers = max(1, min(max_workers, len(sections)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(build, number, label, section_entries)
+            for number, (label, section_entries) in enumerate(sections, start=1)
+        ]
+        for future in futures:
+            ok, messages = future.result()
+            for message in messages:
+                log(message)
+            written += 1 if ok else 0
+    return written
+
+
 def generate_vlc_playlist(rows, out_dir, base_name, music_zip, log):
     if not music_zip:
         log("Ingen musikk-zip funnet, kan ikke lage spilleliste.")
@@ -835,6 +1252,8 @@ def generate_vlc_playlist(rows, out_dir, base_name, music_zip, log):
                 song = Path(fname).stem
                 title = f"{performer} - {song}".strip(" -")
                 extinf = duration if duration != "" else -1
+                # Ingen lydnivåjustering her: VLC sin gain er en global
+                # innstilling og ville gjelde resten av spillelisten.
                 lines.append(f"#EXTINF:{extinf},{title}")
                 lines.append(str(dest_path.resolve()))
     except Exception as exc:
@@ -846,92 +1265,2573 @@ def generate_vlc_playlist(rows, out_dir, base_name, music_zip, log):
     return True
 
 
-class App:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("FSM Data Dekoder")
-        self.root.minsize(900, 620)
-        self.menubar = tk.Menu(self.root)
-        self.root.config(menu=self.menubar)
-        self.menu_startliste = tk.Menu(self.menubar, tearoff=0)
-        self.menu_musikk = tk.Menu(self.menubar, tearoff=0)
-        self.menu_rapporter = tk.Menu(self.menubar, tearoff=0)
-        self.menu_rekkefolge = tk.Menu(self.menubar, tearoff=0)
-        self.menu_hjelp = tk.Menu(self.menubar, tearoff=0)
-        self.menubar.add_cascade(label="Startliste", menu=self.menu_startliste)
-        self.menubar.add_cascade(label="Musikk", menu=self.menu_musikk)
-        self.menubar.add_cascade(label="Rapporter", menu=self.menu_rapporter)
-        self.menubar.add_cascade(label="Rekkefølge", menu=self.menu_rekkefolge)
-        self.menubar.add_cascade(label="Hjelp", menu=self.menu_hjelp)
-        self.menu_startliste.add_command(label="Startliste...", command=self.open_startliste_window, state="disabled")
-        self.menu_musikk.add_command(
-            label="Lag spilleliste", command=self.generate_playlist_only, state="disabled"
-        )
-        self.menu_rapporter.add_command(label="Lag filer", command=self.generate_files, state="disabled")
-        self.menu_rekkefolge.add_command(label="Lagre rekkefølge", command=self.save_order, state="disabled")
-        self.menu_rekkefolge.add_command(label="Last rekkefølge", command=self.load_order, state="disabled")
-        self.menu_hjelp.add_command(label="Om", command=self.show_about)
-        style = ttk.Style()
+def make_pause_row(label, seconds):
+    return {
+        "StartTid": "",
+        "SluttTid": "",
+        "NavnFraIsonen": label,
+        "NavnFraFsm": label,
+        "Organisation": "",
+        "Påmelding": "",
+        "MusikkFil": "",
+        "MusikkTid": "",
+        "PrintName": label,
+        "GivenName": "",
+        "FamilyName": "",
+        "Gender": "",
+        "ParticipantCode": "",
+        "Event": "",
+        "EntryOrder": "",
+        "Music1": "",
+        "Music2": "",
+        "Club1": "",
+        "Club2": "",
+        "ElementsFree": [],
+        "ElementsShort": [],
+        "Musikk": "",
+        "MusikkSek": "",
+        "Manglende i zip": "",
+        "IsPause": True,
+        "PauseSek": seconds,
+    }
+
+
+def order_row_key(row):
+    code = (row.get("ParticipantCode") or "").strip()
+    if code:
+        return f"code:{code}"
+    given = (row.get("GivenName") or "").strip()
+    family = (row.get("FamilyName") or "").strip()
+    event = (row.get("Event") or "").strip()
+    return f"name:{given}|{family}|{event}"
+
+
+def restore_order(rows, order, key_func=order_row_key):
+    # Bygger ny rekkefølge fra en lagret liste i O(n). Rader med samme
+    # nøkkel plasseres i opprinnelig rekkefølge.
+    buckets = {}
+    for row in rows:
+        if row.get("IsPause"):
+            continue
+        buckets.setdefault(key_func(row), deque()).append(row)
+    new_rows = []
+    missing_keys = []
+    for item in order:
+        if isinstance(item, dict) and item.get("type") == "pause":
+            label = (item.get("label") or "Pause").strip()
+            new_rows.append(make_pause_row(label, item.get("seconds") or 0))
+            continue
+        if isinstance(item, dict) and item.get("type") == "row":
+            key = item.get("key")
+        else:
+            key = item
+        bucket = buckets.get(key)
+        if bucket:
+            new_rows.append(bucket.popleft())
+        else:
+            missing_keys.append(key)
+    placed = set(map(id, new_rows))
+    unplaced = [row for row in rows if not row.get("IsPause") and id(row) not in placed]
+    new_rows.extend(unplaced)
+    return new_rows, missing_keys, unplaced
+
+
+class Diagnostics:
+    # Lette tidtakere og tellere for å se hvor tiden går. Målinger som skjer
+    # inne i en kjøring (f.eks. ett skann) samles per tråd, slik at siste
+    # fordeling kan vises selv om skannet går i bakgrunnen.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}
+        self.counters = {}
+        self.last_runs = {}
+
+    @contextmanager
+    def run(self, name, record=None):
+        if record is None:
+            record = {"name": name, "started": datetime.now(), "total": 0.0, "stages": [], "counters": {}}
+        outer = getattr(self.local, "run", None)
+        self.local.run = record
+        started = time.perf_counter()
         try:
-            style.theme_use("vista")
-        except tk.TclError:
-            style.theme_use("clam")
-        style.configure("Title.TLabel", font=("Segoe UI", 14, "bold"))
-        style.configure("Subtitle.TLabel", font=("Segoe UI", 9))
-        style.configure("Clock.TLabel", font=("Consolas", 56, "bold"))
-        self.rows = []
-        self.zip_path = None
-        self.music_zip = None
-        self.music_cache_dir = None
-        self.audio_backend = None
-        self.audio_ready = False
-        self.current_track = ""
-        self.is_paused = False
-        self.current_duration = 0
-        self.play_pause_text = tk.StringVar(value="Spill")
-        self.external_playback = False
-        self.use_external_player_var = tk.BooleanVar(value=True)
-        self.startliste_window = None
+            yield record
+        finally:
+            record["total"] += time.perf_counter() - started
+            self.local.run = outer
+            with self.lock:
+                self.last_runs[name] = record
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stat = self.stats.setdefault(name, [0, 0.0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            stat[3] = seconds
+        run = getattr(self.local, "run", None)
+        if run is not None:
+            run["stages"].append((name, seconds))
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        run = getattr(self.local, "run", None)
+        if run is not None:
+            run["counters"][name] = run["counters"].get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {name: list(stat) for name, stat in self.stats.items()},
+                dict(self.counters),
+                {name: dict(run) for name, run in self.last_runs.items()},
+            )
 
-        base_dir = Path(__file__).resolve().parent
-        self.folder_var = tk.StringVar(value=str(base_dir))
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.counters = {}
+            self.last_runs = {}
 
-        container = ttk.Frame(root, padding=10)
-        container.pack(fill="both", expand=True)
 
-        header = ttk.Frame(container)
-        header.pack(fill="x", pady=(0, 8))
-        header_left = ttk.Frame(header)
-        header_left.pack(side="left")
-        # title removed
-        self.clock_var = tk.StringVar(value="00:00:00")
-        self.clock_label = ttk.Label(
-            header, textvariable=self.clock_var, style="Clock.TLabel", anchor="center"
-        )
-        self.clock_label.pack(side="left", fill="x", expand=True)
+diagnostics = Diagnostics()
 
-        folder_frame = ttk.Labelframe(container, text="Kilde")
-        folder_frame.pack(fill="x", pady=6)
-        ttk.Label(folder_frame, text="Mappe med zip:").pack(side="left", padx=(8, 4))
-        ttk.Entry(folder_frame, textvariable=self.folder_var, width=60).pack(
-            side="left", padx=6
-        )
-        ttk.Button(folder_frame, text="Velg mappe", command=self.choose_folder).pack(
-            side="left"
-        )
-        ttk.Button(folder_frame, text="Skann filer", command=self.read_zip).pack(
-            side="left", padx=(8, 0)
-        )
-        self.ind_excel = tk.Label(
-            folder_frame,
-            text="isonen/deltakerliste",
-            bg="#cccccc",
-            fg="#000000",
-            padx=6,
-            pady=2,
-        )
-        self.ind_music = tk.Label(
-            folder_frame,
+
+class LatencyTrace:
+    # Tid fra brukerhandling til lyd, delt opp i steg.
+    def __init__(self, source):
+        self.source = source
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class LatencyHistogram:
+    # Fordeling av tid til lyd i økten, med sum per steg for snitt.
+    BUCKETS_MS = (50, 100, 200, 500, 1000, 2000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.samples = []
+        self.phase_totals = {}
+        self.last = None
+
+    def add(self, trace, total):
+        ms = total * 1000
+        self.counts[bisect.bisect_right(self.BUCKETS_MS, ms)] += 1
+        self.samples.append(ms)
+        for name, seconds in trace.phases:
+            self.phase_totals[name] = self.phase_totals.get(name, 0.0) + seconds
+        self.last = (trace.source, ms, list(trace.phases))
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    def bucket_labels(self):
+        edges = self.BUCKETS_MS
+        labels = [f"< {edges[0]} ms"]
+        labels.extend(f"{lo}-{hi} ms" for lo, hi in zip(edges, edges[1:]))
+        labels.append(f">= {edges[-1]} ms")
+        return labels
+
+
+def profile_capture(out_dir, label, func, log):
+    # Kjører func under cProfile og tracemalloc og skriver .prof (for
+    # snakeviz/pstats) og et lesbart sammendrag til out_dir.
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = Path(out_dir) / f"profil_{sanitize_filename(label)}_{stamp}"
+    profiler = cProfile.Profile()
+    own_tracing = not tracemalloc.is_tracing()
+    if own_tracing:
+        tracemalloc.start(10)
+    tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if own_tracing:
+            tracemalloc.stop()
+        text = StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(40)
+        text.write(f"\nToppminne: {peak / 1048576:.1f} MiB\n\nStørste allokeringer:\n")
+        for stat in snapshot.statistics("lineno")[:25]:
+            text.write(f"{stat}\n")
+        try:
+            base.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(base.with_suffix(".prof")))
+            base.with_suffix(".txt").write_text(text.getvalue(), encoding="utf-8")
+            log(f"Profil lagret: {base.with_suffix('.txt')}")
+        except OSError as exc:
+            log(f"Kunne ikke lagre profil: {exc}")
+
+
+def music_cache_key(info):
+    return f"{info.CRC:08x}:{info.file_size}"
+
+
+class MusicInfoCache:
+    # Varighet og lydnivå per MP3, nøklet på CRC og størrelse fra zip-katalogen
+    # slik at samme fil ikke analyseres på nytt i neste skann eller neste zip.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == 1:
+                self.entries = data.get("entries") or {}
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.entries.get(key) or {})
+
+    def update(self, key, **values):
+        with self.lock:
+            self.entries.setdefault(key, {}).update(values)
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": 1, "entries": self.entries}
+            self.dirty = False
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_name(self.path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+
+def analyze_loudness(music_zip, filename, ffmpeg, rate=22050, timeout=300):
+    # Dekoder via ffmpeg til 16-bit mono i biter og beregner portstyrt
+    # lydnivå (400 ms blokker, 75 % overlapp, -70/-10 dB porter som i
+    # BS.1770, men uten K-filter) og topp-nivå. Hele sporet ligger aldri i minnet.
+    cmd = [
+        ffmpeg,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        "pipe:0",
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-ar",
+        str(rate),
+        "pipe:1",
+    ]
+    creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        creationflags=creationflags,
+    )
+
+    def feed():
+        try:
+            with zipfile.ZipFile(music_zip, "r") as mz, mz.open(filename) as src:
+                shutil.copyfileobj(src, proc.stdin, 65536)
+        except Exception:
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    timed_out = threading.Event()
+
+    def expire():
+        # Et ffmpeg som henger avsluttes; lesingen under får da EOF.
+        timed_out.set()
+        proc.kill()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    watchdog = threading.Timer(timeout, expire)
+    watchdog.daemon = True
+    watchdog.start()
+    sub_len = rate // 10
+    sub_bytes = sub_len * 2
+    sub_blocks = []
+    peak = 0
+    pending = b""
+    finished = False
+    try:
+        while True:
+            chunk = proc.stdout.read(sub_bytes * 32)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % sub_bytes
+            samples = array("h")
+            samples.frombytes(pending[:usable])
+            pending = pending[usable:]
+            if sys.byteorder != "little":
+                samples.byteswap()
+            if samples:
+                peak = max(peak, max(samples), -min(samples))
+            for start in range(0, len(samples), sub_len):
+                block = samples[start : start + sub_len]
+                sub_blocks.append(sum(map(operator.mul, block, block)) / (sub_len * 1073741824.0))
+        finished = True
+    finally:
+        watchdog.cancel()
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        feeder.join(timeout=1)
+    if timed_out.is_set() or len(sub_blocks) < 4:
+        return None
+    blocks = [sum(sub_blocks[i : i + 4]) / 4 for i in range(len(sub_blocks) - 3)]
+
+    def block_loudness(ms):
+        return -0.691 + 10 * math.log10(ms) if ms > 0 else -math.inf
+
+    gated = [ms for ms in blocks if block_loudness(ms) > -70]
+    if not gated:
+        return None
+    relative_gate = block_loudness(sum(gated) / len(gated)) - 10
+    gated = [ms for ms in gated if block_loudness(ms) > relative_gate]
+    lufs = block_loudness(sum(gated) / len(gated))
+    peak_db = 20 * math.log10(peak / 32768.0) if peak else -math.inf
+    return {"lufs": round(lufs, 2), "peak": round(peak_db, 2)}
+
+
+def loudness_gain_db(lufs, peak, target=-16.0, max_peak=-1.0):
+    if lufs is None:
+        return None
+    gain = target - lufs
+    if peak is not None:
+        gain = min(gain, max_peak - peak)
+    return round(gain, 1)
+
+
+def analyze_music_zip(music_zip, entries, cache, log):
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        log("Fant ikke ffmpeg. Hopper over analyse av lydnivå.")
+        return 0
+    analyzed = 0
+    for filename, key in entries:
+        if "lufs" in cache.get(key):
+            continue
+        try:
+            result = analyze_loudness(music_zip, filename, ffmpeg)
+        except Exception as exc:
+            log(f"Kunne ikke analysere lydnivå: {filename} ({exc})")
+            continue
+        if not result:
+            continue
+        cache.update(key, **result)
+        analyzed += 1
+        log(f"Lydnivå {filename}: {result['lufs']:.1f} LUFS, topp {result['peak']:.1f} dBFS")
+    cache.save()
+    return analyzed
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.postings = {}
+        self.doc_grams = {}
+        self.initials = {}
+
+    @staticmethod
+    def grams(text):
+        norm = f"  {normalize_text(text)} "
+        return {norm[i : i + 3] for i in range(len(norm) - 2)} if norm.strip() else set()
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_grams:
+            self.remove(doc_id)
+        grams = self.grams(text)
+        self.doc_grams[doc_id] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(doc_id)
+        for initial in self.word_initials(grams):
+            self.initials.setdefault(initial, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        grams = self.doc_grams.pop(doc_id, ())
+        for gram in grams:
+            docs = self.postings.get(gram)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self.postings[gram]
+        for initial in self.word_initials(grams):
+            docs = self.initials.get(initial)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self.initials[initial]
+
+    @staticmethod
+    def word_initials(grams):
+        # Trigrammer som starter med mellomrom markerer ordstart; " o" holder
+        # for å finne alle ord som begynner på "o".
+        return {gram[:2] for gram in grams if gram[0] == " " and gram[1] != " "}
+
+    def search(self, text, min_score=0.0, limit=None):
+        # Dice-likhet over trigrammer; bare dokumenter som deler minst ett
+        # trigram med spørringen blir vurdert.
+        query = self.grams(text)
+        if not query:
+            return []
+        shared = {}
+        for gram in query:
+            for doc_id in self.postings.get(gram, ()):
+                shared[doc_id] = shared.get(doc_id, 0) + 1
+        hits = []
+        for doc_id, count in shared.items():
+            score = 2.0 * count / (len(query) + len(self.doc_grams[doc_id]))
+            if score >= min_score:
+                hits.append((score, doc_id))
+        hits.sort(key=lambda hit: -hit[0])
+        return hits[:limit] if limit else hits
+
+    def containing(self, text):
+        # Dokumenter som har alle trigrammene i teksten, det vil si kandidater
+        # for delstrengsøk. Starter med den minste postingslisten.
+        norm = normalize_text(text)
+        grams = {norm[i : i + 3] for i in range(len(norm) - 2)}
+        docs = None
+        for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+            postings = self.postings.get(gram, set())
+            docs = set(postings) if docs is None else docs & postings
+            if not docs:
+                break
+        return docs or set()
+
+    def word_prefix(self, text):
+        # Dokumenter med et ord som begynner på teksten (ett eller to tegn).
+        norm = normalize_text(text)
+        if len(norm) == 1:
+            return set(self.initials.get(" " + norm, ()))
+        return set(self.postings.get(" " + norm[:2], ()))
+
+
+def row_search_text(row):
+    return normalize_text(
+        " ".join(
+            (
+                row.get("NavnFraIsonen", ""),
+                row.get("NavnFraFsm", ""),
+                row.get("Organisation", ""),
+                row.get("MusikkFil", ""),
+            )
+        )
+    )
+
+
+def _decode_id3_text(payload):
+    if not payload:
+        return ""
+    encoding = payload[0]
+    body = payload[1:]
+    try:
+        if encoding == 1:
+            text = body.decode("utf-16")
+        elif encoding == 2:
+            text = body.decode("utf-16-be")
+        elif encoding == 3:
+            text = body.decode("utf-8")
+        else:
+            text = body.decode("latin-1")
+    except UnicodeDecodeError:
+        text = body.decode("latin-1", errors="replace")
+    return text.replace("\x00", " ").strip()
+
+
+def read_id3_tags(fileobj, max_bytes=65536):
+    # Leser bare ID3v2-hodet i starten av filen (tittel og artist).
+    header = fileobj.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        return {}
+    major = header[3]
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    data = fileobj.read(min(size, max_bytes))
+    if major == 2:
+        id_len, size_len, names = 3, 3, {"TT2": "title", "TP1": "artist"}
+    else:
+        id_len, size_len, names = 4, 4, {"TIT2": "title", "TPE1": "artist"}
+    frame_header = id_len + size_len + (0 if major == 2 else 2)
+    tags = {}
+    pos = 0
+    while pos + frame_header <= len(data) and len(tags) < len(names):
+        frame_id = data[pos : pos + id_len]
+        if not frame_id.strip(b"\x00"):
+            break
+        raw_size = data[pos + id_len : pos + id_len + size_len]
+        if major == 4:
+            frame_size = (raw_size[0] << 21) | (raw_size[1] << 14) | (raw_size[2] << 7) | raw_size[3]
+        else:
+            frame_size = int.from_bytes(raw_size, "big")
+        start = pos + frame_header
+        name = names.get(frame_id.decode("latin-1"))
+        if name:
+            tags[name] = _decode_id3_text(data[start : start + frame_size])
+        pos = start + frame_size
+    return tags
+
+
+def match_music_by_titles(rows, music_files, used_files, file_tags, min_score=0.7, suggest_score=0.45):
+    # Reserve-matching for rader uten MP3: FSM-musikktitler (Music1/Music2)
+    # mot filnavn og ID3-tittel/artist. Beste par tildeles først. Svakere
+    # treff (fra suggest_score) tildeles ikke, men returneres som forslag
+    # til manuell kontroll.
+    index = TrigramIndex()
+    for fname in music_files:
+        if fname in used_files:
+            continue
+        tags = file_tags.get(fname) or {}
+        index.add(fname, f"{Path(fname).stem} {tags.get('title', '')} {tags.get('artist', '')}")
+    if not index.doc_grams:
+        return []
+    candidates = []
+    for row_idx, row in enumerate(rows):
+        if row.get("IsPause") or row.get("MusikkFil"):
+            continue
+        titles = [row.get("Music1") or "", row.get("Music2") or ""]
+        query = " ".join(t for t in titles if t).strip()
+        if not query:
+            continue
+        for score, fname in index.search(query, min_score=suggest_score, limit=3):
+            candidates.append((score, row_idx, fname))
+    candidates.sort(key=lambda c: -c[0])
+    taken_rows = set()
+    matches = []
+    suggestions = []
+    for score, row_idx, fname in candidates:
+        if row_idx in taken_rows or fname in used_files:
+            continue
+        taken_rows.add(row_idx)
+        if score < min_score:
+            suggestions.append((rows[row_idx], fname, score))
+            continue
+        used_files.add(fname)
+        matches.append((rows[row_idx], fname, score))
+    return matches, suggestions
+
+
+def person_name(row):
+    return normalize_text(f"{row.get('GivenName', '')} {row.get('FamilyName', '')}")
+
+
+def name_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    score = difflib.SequenceMatcher(None, a, b).ratio()
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    if (
+        len(shorter) >= 2
+        and set(shorter) <= set(longer)
+        and shorter[0] == longer[0]
+        and shorter[-1] == longer[-1]
+    ):
+        # Dobbelt etternavn eller mellomnavn i bare én av kildene. Fornavn og
+        # siste etternavn må stemme, ellers er "Anna Hansen" lik "Anna Hansen Berg".
+        score = max(score, 0.95)
+    return score
+
+
+def same_club(row, zip_row):
+    club = normalize_text(row.get("Organisation"))
+    if not club:
+        return False
+    others = (zip_row.get("Organisation"), zip_row.get("Club1"), zip_row.get("Club2"))
+    return any(club == normalize_text(other) for other in others if other)
+
+
+def fuzzy_match_people(rows, candidates, threshold=0.85):
+    # Kandidater hentes fra trigram-indeksen og rangeres på navnelikhet;
+    # lik score avgjøres av klubb. Beste par tildeles først.
+    index = TrigramIndex()
+    names = {}
+    for key, zip_row in candidates.items():
+        names[key] = person_name(zip_row)
+        index.add(key, names[key])
+    pairs = []
+    for row_idx, row in enumerate(rows):
+        name = person_name(row)
+        if not name:
+            continue
+        for _, key in index.search(name, min_score=0.3, limit=8):
+            score = name_similarity(name, names[key])
+            if score < threshold:
+                continue
+            club = same_club(row, candidates[key])
+            pairs.append((round(score, 2), club, row_idx, key))
+    pairs.sort(key=lambda p: (-p[0], not p[1]))
+    taken_rows = set()
+    taken_keys = set()
+    matches = []
+    for score, club, row_idx, key in pairs:
+        if row_idx in taken_rows or key in taken_keys:
+            continue
+        taken_rows.add(row_idx)
+        taken_keys.add(key)
+        matches.append((rows[row_idx], key, score, club))
+    return matches
+
+
+def extract_music_member(music_zip, filename, cache_dir):
+    # Trygg å kalle fra bakgrunnstråd: skriver til midlertidig fil og
+    # bytter inn ferdig fil, så avspilleren aldri ser en halv fil.
+    out_path = Path(cache_dir) / sanitize_filename(filename)
+    with zipfile.ZipFile(music_zip, "r") as mz:
+        info = mz.getinfo(filename)
+        if out_path.exists() and out_path.stat().st_size == info.file_size:
+            return out_path
+        fd, tmp_name = tempfile.mkstemp(dir=str(cache_dir), suffix=".part")
+        try:
+            with mz.open(info) as src, os.fdopen(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_name, out_path)
+        except BaseException:
+            try:
+                os.remove(tmp_name)
+            except OSError:
+                pass
+            raise
+    return out_path
+
+
+SORT_FIELDS = {
+    "startnummer": (),
+    "starttid": ("StartTid",),
+    "sluttid": ("SluttTid",),
+    "navn_isonen": ("NavnFraIsonen",),
+    "navn_fsm": ("NavnFraFsm",),
+    "klubb": ("Organisation",),
+    "påmelding": ("Påmelding",),
+    "musikknavn": ("MusikkFil", "IsPause"),
+    "musikktid": ("MusikkTid",),
+    "fornavn": ("GivenName", "FamilyName"),
+    "etternavn": ("FamilyName", "GivenName"),
+}
+
+
+def column_sort_key(column, values):
+    if column in ("starttid", "sluttid"):
+        raw = (values[0] or "").strip()
+        parsed = parse_time_hhmm(raw)
+        return (parsed is None, parsed or datetime.max, raw)
+    if column == "musikktid":
+        seconds = parse_duration_mmss((values[0] or "").strip())
+        return (seconds is None, seconds or 0)
+    if column == "musikknavn":
+        # Utøvere som mangler musikk samles først.
+        missing = not values[0] and not values[1]
+        return (not missing, normalize_text(values[0]))
+    return tuple(normalize_text(value) for value in values)
+
+
+class SortKeyCache:
+    # Sorteringsnøkler per rad og kolonne. En nøkkel brukes om igjen så
+    # lenge feltene den bygger på er uendret, så bare endrede rader må
+    # tolke navn og tider på nytt.
+    def __init__(self):
+        self.entries = {}
+
+    def key(self, row, column):
+        raw = tuple(row.get(field) for field in SORT_FIELDS[column])
+        slot = self.entries.setdefault(id(row), {})
+        cached = slot.get(column)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        key = column_sort_key(column, raw)
+        slot[column] = (raw, key)
+        return key
+
+    def permutation(self, rows, order):
+        # order er [(kolonne, synkende)], viktigste først. Stabil sortering
+        # fra minst viktige nøkkel gir flernøkkelsortering med egen retning
+        # per kolonne; like rader beholder dagens rekkefølge.
+        perm = list(range(len(rows)))
+        for column, descending in reversed(order):
+            if column == "startnummer":
+                keys = range(len(rows))
+            else:
+                keys = [self.key(row, column) for row in rows]
+            perm.sort(key=keys.__getitem__, reverse=descending)
+        if len(self.entries) > 2 * len(rows) + 64:
+            live = {id(row) for row in rows}
+            self.entries = {row_id: slot for row_id, slot in self.entries.items() if row_id in live}
+        return array("I", perm)
+
+
+def invert_permutation(perm):
+    inverse = array("I", [0]) * len(perm)
+    for new_idx, old_idx in enumerate(perm):
+        inverse[old_idx] = new_idx
+    return inverse
+
+
+def apply_order_op(rows, op):
+    # Returnerer (invers operasjon, første endrede indeks).
+    kind = op[0]
+    if kind == "swap":
+        _, i, j = op
+        rows[i], rows[j] = rows[j], rows[i]
+        return op, min(i, j)
+    if kind == "insert":
+        _, idx, row = op
+        rows.insert(idx, row)
+        return ("remove", idx, row), idx
+    if kind == "remove":
+        _, idx, row = op
+        removed = rows.pop(idx)
+        return ("insert", idx, removed), idx
+    if kind == "permute":
+        perm = op[1]
+        old_rows = rows[:]
+        rows[:] = [old_rows[i] for i in perm]
+        first = next((k for k, i in enumerate(perm) if k != i), len(rows))
+        return ("permute", invert_permutation(perm)), first
+    if kind == "replace":
+        new_rows = op[1]
+        old_rows = rows[:]
+        rows[:] = new_rows
+        first = 0
+        limit = min(len(old_rows), len(new_rows))
+        while first < limit and old_rows[first] is new_rows[first]:
+            first += 1
+        return ("replace", old_rows), first
+    raise ValueError(f"Ukjent operasjon: {kind}")
+
+
+class OrderHistory:
+    def __init__(self, limit=200):
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = deque(maxlen=limit)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def record(self, inverse):
+        self.undo_stack.append(inverse)
+        self.redo_stack.clear()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self, rows):
+        if not self.undo_stack:
+            return None, None
+        op = self.undo_stack.pop()
+        inverse, first = apply_order_op(rows, op)
+        self.redo_stack.append(inverse)
+        return op, first
+
+    def redo(self, rows):
+        if not self.redo_stack:
+            return None, None
+        op = self.redo_stack.pop()
+        inverse, first = apply_order_op(rows, op)
+        self.undo_stack.append(inverse)
+        return op, first
+
+
+def build_order(rows, key_func=order_row_key):
+    order = []
+    for row in rows:
+        if row.get("IsPause"):
+            label = row.get("NavnFraIsonen") or row.get("NavnFraFsm") or "Pause"
+            order.append(
+                {
+                    "type": "pause",
+                    "label": label,
+                    "seconds": row.get("PauseSek") or 0,
+                    "start": row.get("StartTid", ""),
+                    "end": row.get("SluttTid", ""),
+                }
+            )
+        else:
+            order.append({"type": "row", "key": key_func(row)})
+    return order
+
+
+def journal_entry(op, key_func=order_row_key):
+    kind = op[0]
+    if kind == "swap":
+        return {"op": "swap", "i": op[1], "j": op[2]}
+    if kind in ("insert", "remove"):
+        row = op[2]
+        entry = {"op": kind, "i": op[1]}
+        if row.get("IsPause"):
+            entry["pause"] = {
+                "label": row.get("NavnFraIsonen") or "Pause",
+                "seconds": row.get("PauseSek") or 0,
+            }
+        else:
+            entry["key"] = key_func(row)
+        return entry
+    if kind == "permute":
+        return {"op": "permute", "perm": op[1].tolist()}
+    return None
+
+
+def replay_journal(rows, entries, key_func=order_row_key, spare=None):
+    # Spiller av journalen på en liste som allerede har snapshot-rekkefølgen.
+    # Stopper ved første linje som ikke passer med radene. `spare` er rader
+    # snapshotet hadde slettet (nøkkel -> deque); en angret sletting etter
+    # snapshotet henter raden derfra.
+    removed = {}
+    spare = spare if spare is not None else {}
+    applied = 0
+    for entry in entries:
+        kind = entry.get("op")
+        idx = entry.get("i")
+        if kind == "swap":
+            j = entry.get("j")
+            if not (
+                isinstance(idx, int)
+                and isinstance(j, int)
+                and 0 <= idx < len(rows)
+                and 0 <= j < len(rows)
+            ):
+                break
+            apply_order_op(rows, ("swap", idx, j))
+        elif kind == "remove":
+            if not (isinstance(idx, int) and 0 <= idx < len(rows)):
+                break
+            row = rows[idx]
+            if "pause" in entry:
+                if not row.get("IsPause"):
+                    break
+            elif row.get("IsPause") or key_func(row) != entry.get("key"):
+                break
+            apply_order_op(rows, ("remove", idx, row))
+            if not row.get("IsPause"):
+                removed.setdefault(entry.get("key"), deque()).append(row)
+        elif kind == "insert":
+            if not (isinstance(idx, int) and 0 <= idx <= len(rows)):
+                break
+            if "pause" in entry:
+                pause = entry["pause"]
+                row = make_pause_row(pause.get("label") or "Pause", pause.get("seconds") or 0)
+            else:
+                key = entry.get("key")
+                pool = removed.get(key)
+                if pool:
+                    row = pool.pop()
+                elif spare.get(key):
+                    row = spare[key].popleft()
+                else:
+                    break
+            apply_order_op(rows, ("insert", idx, row))
+        elif kind == "permute":
+            perm = entry.get("perm") or []
+            if sorted(perm) != list(range(len(rows))):
+                break
+            apply_order_op(rows, ("permute", array("I", perm)))
+        else:
+            break
+        applied += 1
+    return applied
+
+
+def restore_journal(rows, snapshot, entries, key_func=order_row_key):
+    # Gjenoppretter snapshot-rekkefølgen og spiller av journalen. Returnerer
+    # (rader, manglende nøkler, rader lagt sist, antall avspilte linjer).
+    new_rows, missing_keys, unplaced = restore_order(rows, snapshot.get("order") or [], key_func)
+    removed = snapshot.get("removed") or {}
+    if isinstance(removed, list):
+        removed = Counter(removed)
+    elif isinstance(removed, dict):
+        removed = {key: count for key, count in removed.items() if isinstance(count, int)}
+    else:
+        removed = {}
+    # Slettede deltakere telles per forekomst, så én av to med samme nøkkel
+    # kan være slettet. De holdes til side i tilfelle journalen angrer
+    # slettingen.
+    spare = {}
+    dropped = set()
+    for row in unplaced:
+        key = key_func(row)
+        if removed.get(key, 0) > 0:
+            removed[key] -= 1
+            spare.setdefault(key, deque()).append(row)
+            dropped.add(id(row))
+    new_rows = [row for row in new_rows if id(row) not in dropped]
+    unplaced = [row for row in unplaced if id(row) not in dropped]
+    applied = replay_journal(new_rows, entries, key_func, spare)
+    return new_rows, missing_keys, unplaced, applied
+
+
+class OrderJournal:
+    def __init__(self, snapshot_path, journal_path, fsync_every=20):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path)
+        self.fsync_every = fsync_every
+        self.handle = None
+        self.unsynced = 0
+        self.entries_since_snapshot = 0
+        self.snapshot_time = 0.0
+        self.generation = 0
+
+    def load(self):
+        snapshot = None
+        entries = []
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            snapshot = None
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Siste linje kan være halvskrevet etter krasj.
+                        break
+        except OSError:
+            pass
+        # Hver linje bærer generasjonen til snapshotet den bygger på. Linjer
+        # fra en eldre generasjon finnes bare hvis vi krasjet etter at nytt
+        # snapshot var skrevet, men før journalen ble tømt; de ligger
+        # allerede i snapshotet og hoppes over.
+        generation = snapshot.get("generation") if isinstance(snapshot, dict) else None
+        if isinstance(generation, int):
+            self.generation = generation
+            entries = [entry for entry in entries if entry.get("g") == generation]
+        return snapshot, entries
+
+    def write_snapshot(self, rows, key_func=order_row_key, removed=None):
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        generation = self.generation + 1
+        data = {
+            "version": 3,
+            "generation": generation,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "order": build_order(rows, key_func),
+        }
+        if removed:
+            data["removed"] = {key: count for key, count in sorted(removed.items()) if count > 0}
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.generation = generation
+        if self.handle:
+            self.handle.close()
+        self.handle = open(self.journal_path, "w", encoding="utf-8")
+        self.unsynced = 0
+        self.entries_since_snapshot = 0
+        self.snapshot_time = time.monotonic()
+
+    def append(self, entry):
+        if not self.handle:
+            self.handle = open(self.journal_path, "a", encoding="utf-8")
+        entry = dict(entry, g=self.generation)
+        self.handle.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.handle.flush()
+        self.unsynced += 1
+        self.entries_since_snapshot += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self.handle and self.unsynced:
+            os.fsync(self.handle.fileno())
+            self.unsynced = 0
+
+    def needs_snapshot(self, max_entries=200, max_age=300):
+        if not self.entries_since_snapshot:
+            return False
+        if self.entries_since_snapshot >= max_entries:
+            return True
+        return time.monotonic() - self.snapshot_time >= max_age
+
+    def close(self):
+        if self.handle:
+            self.sync()
+            self.handle.close()
+            self.handle = None
+
+
+class ScanError(Exception):
+    pass
+
+
+def find_competition_files(folder, log):
+    if not folder.exists():
+        raise ScanError("Mappen finnes ikke.")
+
+    zips = sorted(folder.glob("*.zip"))
+    if not zips:
+        raise ScanError("Fant ingen zip-filer i mappen.")
+
+    data_zips = [
+        z
+        for z in zips
+        if z.name.lower().startswith("fmsdata") or z.name.lower().startswith("fsmdata")
+    ]
+    music_zips = [z for z in zips if z.name.lower().startswith("musikk")]
+    excel_files = sorted(folder.glob("Deltakerliste*.xlsx"))
+
+    if not data_zips:
+        raise ScanError("Fant ingen FMSData*.zip i mappen.")
+    if not music_zips:
+        raise ScanError("Fant ingen Musikk*.zip i mappen.")
+    if not excel_files:
+        raise ScanError("Fant ingen Deltakerliste*.xlsx i mappen.")
+
+    if len(data_zips) > 1:
+        log(f"Fant flere FMSData-zip. Bruker: {data_zips[0].name}")
+    if len(excel_files) > 1:
+        log(f"Fant flere deltakerlister. Bruker: {excel_files[0].name}")
+    if len(music_zips) > 1:
+        log(f"Fant flere musikk-zip. Bruker: {music_zips[0].name}")
+    return data_zips[0], music_zips[0], excel_files[0]
+
+
+def is_input_file(name):
+    lower = name.lower()
+    if lower.startswith("~$"):
+        return False
+    if lower.endswith(".zip"):
+        return lower.startswith(("fmsdata", "fsmdata", "musikk"))
+    return lower.endswith(".xlsx") and lower.startswith("deltakerliste")
+
+
+class FolderWatcher:
+    # Polling uten native avhengigheter. En fil regnes som ferdig skrevet
+    # når størrelse og endringstid har stått stille i settle_polls runder
+    # og den kan åpnes som zip (xlsx er også zip).
+    def __init__(self, settle_polls=2):
+        self.settle_polls = settle_polls
+        self.folder = None
+        self.known = {}
+        self.pending = {}
+
+    def snapshot(self):
+        found = {}
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return found
+        for entry in entries:
+            if not entry.is_file() or not is_input_file(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            found[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def prime(self, folder):
+        self.folder = Path(folder)
+        self.known = self.snapshot()
+        self.pending = {}
+
+    def poll(self):
+        ready = []
+        current = self.snapshot()
+        for path in list(self.pending):
+            if path not in current:
+                del self.pending[path]
+        for path, sig in current.items():
+            if self.known.get(path) == sig:
+                self.pending.pop(path, None)
+                continue
+            previous = self.pending.get(path)
+            stable = previous[1] + 1 if previous and previous[0] == sig else 0
+            if stable < self.settle_polls:
+                self.pending[path] = (sig, stable)
+                continue
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    zf.infolist()
+            except (zipfile.BadZipFile, OSError):
+                self.pending[path] = (sig, stable)
+                continue
+            del self.pending[path]
+            self.known[path] = sig
+            ready.append(path)
+        for path in list(self.known):
+            if path not in current:
+                del self.known[path]
+        return ready
+
+
+class ScanCache:
+    # Holder siste tolkede Excel og XML per zip-medlem i minnet, slik at et
+    # nytt skann bare leser det som faktisk er endret. Tolkede XML-rader
+    # lagres også på disk (pickle, nøklet på CRC og størrelse), så uendrede
+    # FSM-data lastes raskt også etter omstart. Filene ryddes som LRU
+    # (endringstid oppdateres ved lesing), høyst max_files stykker.
+    version = 2
+
+    def __init__(self, cache_dir=None, max_files=400):
+        self.excel = {}
+        self.fsm_members = {}
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_files = max_files
+
+    @staticmethod
+    def file_signature(path):
+        stat = Path(path).stat()
+        return (str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size)
+
+    def excel_rows(self, excel_path, log):
+        try:
+            sig = self.file_signature(excel_path)
+        except OSError:
+            return load_participants_from_excel(excel_path, log)
+        cached = self.excel.get(sig[0])
+        if cached and cached[0] == sig:
+            log(f"Excel uendret, gjenbruker: {Path(excel_path).name} ({len(cached[1])} rader)")
+            return [dict(row) for row in cached[1]]
+        rows = load_participants_from_excel(excel_path, log)
+        self.excel[sig[0]] = (sig, [dict(row) for row in rows])
+        return rows
+
+    def member_path(self, entry):
+        return self.cache_dir / f"{entry.CRC:08x}_{entry.file_size}.pkl"
+
+    def member_rows(self, zip_path, entry):
+        sig = (entry.CRC, entry.file_size)
+        cached = self.fsm_members.get((str(zip_path), entry.filename))
+        if cached and cached[0] == sig:
+            return cached[1]
+        if not self.cache_dir:
+            return None
+        path = self.member_path(entry)
+        try:
+            with open(path, "rb") as f:
+                version, key, fields, values = pickle.load(f)
+            if version != self.version or tuple(key) != sig:
+                return None
+            rows = [dict(zip(fields, row)) for row in values]
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+            return None
+        diagnostics.count("XML-filer fra diskbuffer")
+        self.fsm_members[(str(zip_path), entry.filename)] = (sig, rows)
+        return rows
+
+    def store_member_rows(self, zip_path, entry, rows):
+        sig = (entry.CRC, entry.file_size)
+        self.fsm_members[(str(zip_path), entry.filename)] = (sig, rows)
+        if not self.cache_dir:
+            return
+        # Feltnavn én gang og verdier som tupler gir en liten fil som lastes raskt.
+        fields = tuple(rows[0]) if rows else ()
+        values = [tuple(row.get(field, "") for field in fields) for row in rows]
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.member_path(entry)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump((self.version, sig, fields, values), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self.prune()
+
+    def prune(self):
+        try:
+            files = []
+            for item in os.scandir(self.cache_dir):
+                if item.name.endswith(".pkl"):
+                    files.append((item.stat().st_mtime_ns, item.path))
+        except OSError:
+            return
+        if len(files) <= self.max_files:
+            return
+        files.sort()
+        for _, path in files[: len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+STORE_VERSION = 2
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS competitions (
+    id INTEGER PRIMARY KEY,
+    data_zip TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    music_files TEXT NOT NULL,
+    music_keys TEXT NOT NULL,
+    scanned_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    competition_id INTEGER NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    participant_code TEXT NOT NULL,
+    given_key TEXT NOT NULL,
+    family_key TEXT NOT NULL,
+    name_isonen TEXT NOT NULL,
+    name_fsm TEXT NOT NULL,
+    club TEXT NOT NULL,
+    event TEXT NOT NULL,
+    missing_in_fsm INTEGER NOT NULL,
+    music_status TEXT NOT NULL,
+    music_file TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (competition_id, position)
+);
+CREATE INDEX IF NOT EXISTS participants_name ON participants(family_key, given_key);
+CREATE INDEX IF NOT EXISTS participants_code ON participants(participant_code);
+CREATE TABLE IF NOT EXISTS music (
+    competition_id INTEGER NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    music_key TEXT NOT NULL,
+    duration REAL,
+    lufs REAL,
+    peak REAL,
+    PRIMARY KEY (competition_id, filename)
+);
+CREATE INDEX IF NOT EXISTS music_by_key ON music(music_key);
+CREATE TABLE IF NOT EXISTS officials (
+    competition_id INTEGER NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    nation TEXT NOT NULL,
+    PRIMARY KEY (competition_id, position)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    competition_id INTEGER NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+    saved_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    entries TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_competition ON orders(competition_id, saved_at);
+"""
+
+
+def input_signature(data_zip, music_zip, excel_path, fuzzy_threshold):
+    # Endres når en av inndatafilene eller matcheoppsettet endres.
+    files = []
+    for path in (data_zip, music_zip, excel_path):
+        try:
+            files.append(list(ScanCache.file_signature(path)))
+        except OSError:
+            files.append([str(path), 0, 0])
+    return json.dumps([STORE_VERSION, round(fuzzy_threshold, 3), files])
+
+
+class CompetitionStore:
+    # Lokalt SQLite-lager (WAL) med tolkede deltakere, matcheresultater,
+    # musikkdata og lagrede rekkefølger per stevne. Brukes fra både UI- og
+    # bakgrunnstråd, derfor én forbindelse bak en lås.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(STORE_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={STORE_VERSION}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def competition_id(self, data_zip):
+        found = self.conn.execute(
+            "SELECT id FROM competitions WHERE data_zip = ?", (str(Path(data_zip).resolve()),)
+        ).fetchone()
+        return found[0] if found else None
+
+    def load_competition(self, data_zip, signature):
+        with self.lock:
+            found = self.conn.execute(
+                "SELECT id, signature, music_files, music_keys FROM competitions WHERE data_zip = ?",
+                (str(Path(data_zip).resolve()),),
+            ).fetchone()
+            if not found or found[1] != signature:
+                return None
+            rows = [
+                json.loads(data)
+                for (data,) in self.conn.execute(
+                    "SELECT data FROM participants WHERE competition_id = ? ORDER BY position",
+                    (found[0],),
+                )
+            ]
+            officials = [
+                {"name": name, "role": role, "nation": nation}
+                for name, role, nation in self.conn.execute(
+                    "SELECT name, role, nation FROM officials WHERE competition_id = ? ORDER BY position",
+                    (found[0],),
+                )
+            ]
+        if not rows:
+            return None
+        return {
+            "rows": rows,
+            "officials": officials,
+            "music_files": json.loads(found[2]),
+            "music_keys": json.loads(found[3]),
+        }
+
+    def save_competition(self, data_zip, signature, result, music_info=None):
+        data_zip = Path(data_zip)
+        participants = []
+        for position, row in enumerate(result["rows"]):
+            given_key, family_key = build_name_key(
+                row.get("GivenName"), row.get("FamilyName"), strict=False
+            )
+            participants.append(
+                (
+                    position,
+                    (row.get("ParticipantCode") or "").strip(),
+                    given_key,
+                    family_key,
+                    row.get("NavnFraIsonen") or "",
+                    row.get("NavnFraFsm") or "",
+                    row.get("Organisation") or "",
+                    row.get("Event") or "",
+                    1 if row.get("Manglende i zip") == "JA" else 0,
+                    str(row.get("Musikk") or ""),
+                    row.get("MusikkFil") or "",
+                    json.dumps(row, ensure_ascii=False, default=str),
+                )
+            )
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO competitions (data_zip, name, signature, music_files, music_keys, scanned_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(data_zip) DO UPDATE SET
+                    name = excluded.name,
+                    signature = excluded.signature,
+                    music_files = excluded.music_files,
+                    music_keys = excluded.music_keys,
+                    scanned_at = excluded.scanned_at
+                """,
+                (
+                    str(data_zip.resolve()),
+                    data_zip.stem,
+                    signature,
+                    json.dumps(result["music_files"], ensure_ascii=False),
+                    json.dumps(result["music_keys"], ensure_ascii=False),
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+            comp_id = self.competition_id(data_zip)
+            self.conn.execute("DELETE FROM participants WHERE competition_id = ?", (comp_id,))
+            self.conn.executemany(
+                "INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(comp_id,) + values for values in participants],
+            )
+            self.conn.execute("DELETE FROM officials WHERE competition_id = ?", (comp_id,))
+            self.conn.executemany(
+                "INSERT INTO officials VALUES (?, ?, ?, ?, ?)",
+                [
+                    (comp_id, position, item.get("name", ""), item.get("role", ""), item.get("nation", ""))
+                    for position, item in enumerate(result.get("officials") or [])
+                ],
+            )
+            self.write_music(comp_id, result["music_keys"], music_info)
+
+    def save_music(self, data_zip, music_keys, music_info):
+        with self.lock, self.conn:
+            comp_id = self.competition_id(data_zip)
+            if comp_id is not None:
+                self.write_music(comp_id, music_keys, music_info)
+
+    def write_music(self, comp_id, music_keys, music_info):
+        self.conn.execute("DELETE FROM music WHERE competition_id = ?", (comp_id,))
+        music_rows = []
+        for filename, key in music_keys.items():
+            info = music_info.get(key) if music_info else {}
+            music_rows.append(
+                (comp_id, filename, key, info.get("duration"), info.get("lufs"), info.get("peak"))
+            )
+        self.conn.executemany("INSERT INTO music VALUES (?, ?, ?, ?, ?, ?)", music_rows)
+
+    def save_order(self, data_zip, order, source):
+        with self.lock, self.conn:
+            comp_id = self.competition_id(data_zip)
+            if comp_id is None:
+                return False
+            self.conn.execute(
+                "INSERT INTO orders (competition_id, saved_at, source, entries) VALUES (?, ?, ?, ?)",
+                (
+                    comp_id,
+                    datetime.now().isoformat(timespec="seconds"),
+                    str(source),
+                    json.dumps(order, ensure_ascii=False),
+                ),
+            )
+        return True
+
+    def participant_history(self, row, exclude_zip=None):
+        # Alle stevner der samme utøver finnes, via ParticipantCode eller navnenøkkel.
+        code = (row.get("ParticipantCode") or "").strip()
+        given_key, family_key = build_name_key(
+            row.get("GivenName"), row.get("FamilyName"), strict=False
+        )
+        exclude = str(Path(exclude_zip).resolve()) if exclude_zip else ""
+        with self.lock:
+            return self.conn.execute(
+                """
+                SELECT c.name, c.scanned_at, p.event, p.club, p.music_file, m.duration, m.lufs
+                FROM participants p
+                JOIN competitions c ON c.id = p.competition_id
+                LEFT JOIN music m ON m.competition_id = p.competition_id AND m.filename = p.music_file
+                WHERE ((? != '' AND p.participant_code = ?)
+                       OR (p.family_key = ? AND p.given_key = ?))
+                  AND c.data_zip != ?
+                ORDER BY c.scanned_at DESC
+                """,
+                (code, code, family_key, given_key, exclude),
+            ).fetchall()
+
+
+def read_fsm_zip(zip_path, log, scan_cache=None):
+    # Returnerer (deltakerrader, officials). judges-filen lagres i bufferet
+    # som sin liste med officials.
+    log(f"Leser zip: {zip_path.name}")
+    zip_rows = []
+    officials = []
+    reused = 0
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        xml_entries = [e for e in zf.infolist() if e.filename.lower().endswith(".xml")]
+        if not xml_entries:
+            raise ScanError("Fant ingen xml-filer i zip.")
+
+        for entry in xml_entries:
+            is_judges = "judges" in entry.filename.lower()
+            cached = scan_cache.member_rows(zip_path, entry) if scan_cache else None
+            if cached is not None:
+                if is_judges:
+                    officials.extend(dict(row) for row in cached)
+                    log(f"Fant {len(cached)} officials i judges-filen (uendret).")
+                else:
+                    zip_rows.extend(dict(row) for row in cached)
+                reused += 1
+                diagnostics.count("XML-filer gjenbrukt")
+                continue
+            diagnostics.count("XML-filer lest")
+            log(f"Leser fil: {entry.filename}")
+            if is_judges:
+                try:
+                    member_rows = parse_xml_member(zf, entry, parse_officials, log)
+                except expat.ExpatError as exc:
+                    log(f"Kunne ikke lese {entry.filename}: {exc}")
+                    continue
+                officials.extend(member_rows)
+            else:
+                member_rows = parse_xml_member(zf, entry, parse_competition, log)
+                zip_rows.extend(member_rows)
+            if scan_cache:
+                scan_cache.store_member_rows(zip_path, entry, [dict(row) for row in member_rows])
+    if reused:
+        log(f"Gjenbrukte {reused} av {len(xml_entries)} uendrede XML-filer.")
+    return zip_rows, officials
+
+
+def read_music_zip(music_zip, music_info, log):
+    music_files = []
+    music_durations = {}
+    music_keys = {}
+    log(f"Leser musikk-zip: {music_zip.name}")
+    try:
+        with zipfile.ZipFile(music_zip, "r") as mz:
+            for entry in mz.infolist():
+                if entry.filename.lower().endswith(".mp3"):
+                    music_files.append(entry.filename)
+                    key = music_cache_key(entry)
+                    music_keys[entry.filename] = key
+                    cached = music_info.get(key) if music_info else {}
+                    if "duration" in cached:
+                        music_durations[entry.filename] = cached["duration"]
+                        continue
+                    diagnostics.count("MP3 varighet lest")
+                    try:
+                        from mutagen.mp3 import MP3
+
+                        data = mz.read(entry)
+                        audio = MP3(BytesIO(data))
+                        music_durations[entry.filename] = audio.info.length
+                    except Exception:
+                        music_durations[entry.filename] = None
+                    if music_info:
+                        music_info.update(key, duration=music_durations[entry.filename])
+        if music_info:
+            music_info.save()
+    except Exception as exc:
+        log(f"Kunne ikke lese musikk-zip: {music_zip} ({exc})")
+    return music_files, music_durations, music_keys
+
+
+def match_music_file(row, music_files, used_files):
+    given = row.get("GivenName")
+    family = row.get("FamilyName")
+    given_tokens = tokenize_name(given)
+    family_tokens = tokenize_name(family)
+    if not family_tokens:
+        return ""
+
+    def family_match(fname):
+        hay = normalize_text(fname)
+        return all(token in hay for token in family_tokens) or family_tokens[0] in hay
+
+    def given_match(fname):
+        if not given_tokens:
+            return False
+        hay = normalize_text(fname)
+        return given_tokens[0] in hay
+
+    # Pass 1: require both family + given (if given exists), prefer unused.
+    if given_tokens:
+        for fname in music_files:
+            if fname in used_files:
+                continue
+            if family_match(fname) and given_match(fname):
+                used_files.add(fname)
+                return fname
+
+    # Pass 2: family-only fallback, prefer unused.
+    for fname in music_files:
+        if fname in used_files:
+            continue
+        if family_match(fname):
+            used_files.add(fname)
+            return fname
+    return ""
+
+
+def match_music_by_tags(
+    rows, music_zip, music_files, used_files, music_durations, music_keys, music_info, log
+):
+    pending = [
+        row
+        for row in rows
+        if not row.get("MusikkFil") and (row.get("Music1") or row.get("Music2"))
+    ]
+    if not pending:
+        return
+    file_tags = {}
+    try:
+        with zipfile.ZipFile(music_zip, "r") as mz:
+            for fname in music_files:
+                if fname in used_files:
+                    continue
+                key = music_keys.get(fname)
+                cached = music_info.get(key) if (music_info and key) else {}
+                if "id3" in cached:
+                    file_tags[fname] = cached["id3"]
+                    continue
+                try:
+                    with mz.open(fname) as f:
+                        tags = read_id3_tags(f)
+                except Exception:
+                    tags = {}
+                file_tags[fname] = tags
+                if music_info and key:
+                    music_info.update(key, id3=tags)
+    except Exception as exc:
+        log(f"Kunne ikke lese ID3-tagger: {exc}")
+        return
+    if music_info:
+        music_info.save()
+    matches, suggestions = match_music_by_titles(pending, music_files, used_files, file_tags)
+    for row, fname, score in matches:
+        assign_music(row, fname, music_durations)
+        log(
+            f"Musikk via tittel ({score:.2f}): "
+            f"{row.get('NavnFraIsonen') or row.get('PrintName', '')} -> {fname}"
+        )
+    for row, fname, score in suggestions:
+        log(
+            f"Mulig musikk via tittel ({score:.2f}), ikke tildelt: "
+            f"{row.get('NavnFraIsonen') or row.get('PrintName', '')} -> {fname}"
+        )
+
+
+def reconcile_participants(rows, zip_rows, music_files, music_durations, fuzzy_threshold, log):
+    zip_people_strict = {}
+    zip_people_loose = {}
+    for row in zip_rows:
+        strict_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=True)
+        loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
+        if strict_key[0] or strict_key[1]:
+            zip_people_strict.setdefault(strict_key, row)
+        if loose_key[0] or loose_key[1]:
+            zip_people_loose.setdefault(loose_key, []).append(strict_key)
+
+    used_music_files = set()
+    used_zip_keys = set()
+    used_loose_keys = set()
+    unmatched_rows = []
+    for row in rows:
+        strict_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=True)
+        loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
+        zip_row = None
+        match_type = ""
+        if strict_key in zip_people_strict and strict_key not in used_zip_keys:
+            zip_row = zip_people_strict.get(strict_key)
+            used_zip_keys.add(strict_key)
+            match_type = "eksakt"
+        else:
+            for candidate_key in zip_people_loose.get(loose_key, []):
+                if candidate_key in used_zip_keys:
+                    continue
+                zip_row = zip_people_strict.get(candidate_key)
+                if zip_row:
+                    used_zip_keys.add(candidate_key)
+                    match_type = "loose"
+                    break
+        if zip_row:
+            zip_print = apply_fsm_match(row, zip_row)
+            if loose_key[0] or loose_key[1]:
+                used_loose_keys.add(loose_key)
+            if match_type == "loose":
+                log(f"Matcher (loose): {row.get('NavnFraIsonen', '')} -> {zip_print}")
+            else:
+                log(f"Matcher: {row.get('NavnFraIsonen', '')} -> {zip_print}")
+        else:
+            row["Manglende i zip"] = "JA"
+            row["NavnFraFsm"] = ""
+            unmatched_rows.append(row)
+
+        if music_files:
+            matched = match_music_file(row, music_files, used_music_files)
+            assign_music(row, matched, music_durations)
+        else:
+            row["Musikk"] = "mangler"
+            row["MusikkFil"] = ""
+            row["MusikkTid"] = ""
+            row["MusikkSek"] = ""
+
+    if unmatched_rows:
+        remaining = {
+            key: zip_row
+            for key, zip_row in zip_people_strict.items()
+            if key not in used_zip_keys
+        }
+        for row, key, score, club_match in fuzzy_match_people(
+            unmatched_rows, remaining, fuzzy_threshold
+        ):
+            used_zip_keys.add(key)
+            zip_print = apply_fsm_match(row, remaining[key])
+            club_note = ", samme klubb" if club_match else ""
+            log(
+                f"Matcher (fuzzy {score:.2f}{club_note}): "
+                f"{row.get('NavnFraIsonen', '')} -> {zip_print}"
+            )
+        for row in unmatched_rows:
+            if row.get("Manglende i zip") == "JA":
+                log(f"Mangler i FSM: {row.get('NavnFraIsonen', '')}")
+
+    for key, row in zip_people_strict.items():
+        if key in used_zip_keys:
+            continue
+        loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
+        if loose_key in used_loose_keys:
+            continue
+        zip_given = (row.get("GivenName") or "").strip()
+        zip_family = (row.get("FamilyName") or "").strip()
+        zip_print = row.get("PrintName") or f"{zip_given} {zip_family}".strip()
+        log(f"Ekstra i FSM (ny rad): {zip_print}")
+        rows.append(
+            {
+                "PrintName": zip_print,
+                "NavnFraIsonen": "",
+                "NavnFraFsm": zip_print,
+                "GivenName": zip_given,
+                "FamilyName": zip_family,
+                "Gender": row.get("Gender", ""),
+                "Organisation": row.get("Organisation", ""),
+                "ParticipantCode": row.get("ParticipantCode", ""),
+                "Event": row.get("Event", ""),
+                "EntryOrder": row.get("EntryOrder", ""),
+                "Påmelding": "",
+                "Music1": row.get("Music1", ""),
+                "Music2": row.get("Music2", ""),
+                "Club1": row.get("Club1", ""),
+                "Club2": row.get("Club2", ""),
+                "ElementsFree": row.get("ElementsFree", ""),
+                "ElementsShort": row.get("ElementsShort", ""),
+                "Manglende i zip": "",
+                "Musikk": "mangler",
+                "MusikkFil": "",
+                "MusikkTid": "",
+                "MusikkSek": "",
+                "StartTid": "",
+                "SluttTid": "",
+            }
+        )
+    return used_music_files
+
+
+def scan_competition(
+    data_zip,
+    music_zip,
+    excel_path,
+    log,
+    music_info=None,
+    fuzzy_threshold=0.85,
+    scan_cache=None,
+):
+    with diagnostics.stage("Excel (Isonen)"):
+        if scan_cache:
+            rows = scan_cache.excel_rows(excel_path, log)
+        else:
+            rows = load_participants_from_excel(excel_path, log)
+    if not rows:
+        raise ScanError("Fant ingen deltakere i excel-filen.")
+    with diagnostics.stage("FSM-XML"):
+        zip_rows, officials = read_fsm_zip(data_zip, log, scan_cache)
+    with diagnostics.stage("MP3-katalog"):
+        music_files, music_durations, music_keys = read_music_zip(music_zip, music_info, log)
+    with diagnostics.stage("Navnematching"):
+        used_music_files = reconcile_participants(
+            rows, zip_rows, music_files, music_durations, fuzzy_threshold, log
+        )
+    diagnostics.count("Deltakere (Isonen)", len(rows))
+    diagnostics.count("Deltakere (FSM)", len(zip_rows))
+    diagnostics.count("MP3-filer", len(music_files))
+    if music_files:
+        with diagnostics.stage("ID3-matching"):
+            match_music_by_tags(
+                rows,
+                music_zip,
+                music_files,
+                used_music_files,
+                music_durations,
+                music_keys,
+                music_info,
+                log,
+            )
+        log("MP3-filer i musikk-zip:")
+        for fname in sorted(music_files):
+            log(f"- {fname}")
+    return {
+        "rows": rows,
+        "officials": officials,
+        "music_files": music_files,
+        "music_keys": music_keys,
+    }
+
+
+def extract_dates(text):
+    dates = set()
+    for y, m, d in re.findall(r"(\d{4})-(\d{2})-(\d{2})", text):
+        dates.add(f"{y}-{m}-{d}")
+    for y, m, d in re.findall(r"(?<!\d)(20\d{2})(\d{2})(\d{2})(?!\d)", text):
+        dates.add(f"{y}-{m}-{d}")
+    for d, m, y in re.findall(r"(?<!\d)(\d{1,2})[._](\d{1,2})[._](\d{2,4})(?!\d)", text):
+        year = y if len(y) == 4 else f"20{y}"
+        dates.add(f"{year}-{int(m):02d}-{int(d):02d}")
+    return dates
+
+
+def competition_signature(path, prefixes):
+    stem = path.stem.lower()
+    for prefix in prefixes:
+        if stem.startswith(prefix):
+            stem = stem[len(prefix) :]
+            break
+    dates = extract_dates(stem)
+    tokens = {t for t in normalize_text(stem).split() if not t.isdigit()}
+    return dates, tokens
+
+
+def pair_score(sig_a, sig_b):
+    return 10 * len(sig_a[0] & sig_b[0]) + len(sig_a[1] & sig_b[1])
+
+
+def discover_competition_sets(root):
+    # Finner alle FMSData-zip under root og parer hver med musikk-zip og
+    # deltakerliste i samme mappe etter dato og navn i filnavnet.
+    data_prefixes = ("fmsdata", "fsmdata")
+    sets = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d.lower() != "output")
+        folder = Path(dirpath)
+        lower = {name: name.lower() for name in filenames}
+        data = sorted(
+            folder / n
+            for n, l in lower.items()
+            if l.endswith(".zip") and l.startswith(data_prefixes)
+        )
+        if not data:
+            continue
+        music = sorted(folder / n for n, l in lower.items() if l.endswith(".zip") and l.startswith("musikk"))
+        excel = sorted(
+            folder / n for n, l in lower.items() if l.endswith(".xlsx") and l.startswith("deltakerliste")
+        )
+        music_sigs = {p: competition_signature(p, ("musikk",)) for p in music}
+        excel_sigs = {p: competition_signature(p, ("deltakerliste",)) for p in excel}
+        used = set()
+        for data_zip in data:
+            sig = competition_signature(data_zip, data_prefixes)
+
+            def best(candidates):
+                free = [p for p in candidates if p not in used] or list(candidates)
+                if not free:
+                    return None
+                choice = max(free, key=lambda p: pair_score(sig, candidates[p]))
+                used.add(choice)
+                return choice
+
+            rel = folder.relative_to(root)
+            rel_name = "_".join(rel.parts)
+            name = sanitize_filename(f"{rel_name}_{data_zip.stem}" if rel_name else data_zip.stem)
+            sets.append(
+                {
+                    "name": name,
+                    "folder": folder,
+                    "data_zip": data_zip,
+                    "music_zip": best(music_sigs),
+                    "excel": best(excel_sigs),
+                }
+            )
+    return sets
+
+
+def process_competition_set(comp, out_root, outputs, music_info, fuzzy_threshold, times, log):
+    name = comp["name"]
+
+    def comp_log(msg):
+        log(f"[{name}] {msg}")
+
+    started = time.perf_counter()
+    summary = {
+        "name": name,
+        "folder": str(comp["folder"]),
+        "status": "ok",
+        "participants": 0,
+        "missing_fsm": 0,
+        "missing_music": 0,
+        "seconds": 0.0,
+        "output": "",
+    }
+    try:
+        if not comp["music_zip"]:
+            raise ScanError("Fant ingen Musikk*.zip i mappen.")
+        if not comp["excel"]:
+            raise ScanError("Fant ingen Deltakerliste*.xlsx i mappen.")
+        result = scan_competition(
+            comp["data_zip"],
+            comp["music_zip"],
+            comp["excel"],
+            comp_log,
+            music_info=music_info,
+            fuzzy_threshold=fuzzy_threshold,
+        )
+        rows = result["rows"]
+        if not assign_row_times(rows, *times):
+            comp_log("Ugyldig starttid eller tid per utøver; tider er ikke beregnet.")
+        out_dir = Path(out_root) / name
+        out_dir.mkdir(parents=True, exist_ok=True)
+        base_name = comp["data_zip"].stem
+        if "excel" in outputs:
+            generate_excel(rows, str(out_dir / f"{base_name}.xlsx"), comp_log)
+        if "html" in outputs:
+            generate_html(
+                rows,
+                str(out_dir / f"{base_name}.html"),
+                base_name,
+                comp_log,
+                compact="html_compact" in outputs,
+            )
+        if "pdf" in outputs:
+            generate_pdf(rows, str(out_dir / f"{base_name}.pdf"), base_name, comp_log)
+        summary["participants"] = len(rows)
+        summary["missing_fsm"] = sum(1 for r in rows if r.get("Manglende i zip") == "JA")
+        summary["missing_music"] = sum(1 for r in rows if not r.get("MusikkFil"))
+        summary["output"] = str(out_dir)
+    except ScanError as exc:
+        summary["status"] = f"feil: {exc}"
+        comp_log(f"Feil: {exc}")
+    except Exception as exc:
+        summary["status"] = f"feil: {exc}"
+        comp_log(f"Uventet feil: {exc}")
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def write_batch_report(summaries, out_root):
+    out_root = Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime("%Y-%m-%d_%H.%M")
+    json_path = out_root / f"batchrapport_{ts}.json"
+    text_path = out_root / f"batchrapport_{ts}.txt"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(summaries, f, ensure_ascii=False, indent=2)
+    lines = [
+        f"Batchrapport {datetime.now().strftime('%d.%m.%Y %H:%M')}",
+        "",
+        f"{'Stevne':40} {'Utøvere':>8} {'Mangler FSM':>12} {'Mangler musikk':>15} {'Sek':>7}  Status",
+    ]
+    for item in summaries:
+        lines.append(
+            f"{item['name'][:40]:40} {item['participants']:>8} {item['missing_fsm']:>12} "
+            f"{item['missing_music']:>15} {item['seconds']:>7.1f}  {item['status']}"
+        )
+    text_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return text_path
+
+
+def run_batch(root, outputs, log, times, max_workers=4, music_info=None, fuzzy_threshold=0.85):
+    root = Path(root)
+    sets = discover_competition_sets(root)
+    if not sets:
+        log("Fant ingen stevner (FMSData*.zip) under valgt mappe.")
+        return [], None
+    workers = max(1, min(max_workers, len(sets)))
+    log(f"Fant {len(sets)} stevner. Behandler med inntil {workers} parallelt.")
+    out_root = root / "output" / "batch"
+    summaries = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                process_competition_set, comp, out_root, outputs, music_info, fuzzy_threshold, times, log
+            ): comp
+            for comp in sets
+        }
+        for future in as_completed(futures):
+            comp = futures[future]
+            try:
+                summary = future.result()
+            except Exception as exc:
+                # process_competition_set fanger det meste selv; dette er
+                # siste skanse så ett stevne ikke stopper resten.
+                summary = {
+                    "name": comp["name"],
+                    "folder": str(comp["folder"]),
+                    "status": f"feil: {exc}",
+                    "participants": 0,
+                    "missing_fsm": 0,
+                    "missing_music": 0,
+                    "seconds": 0.0,
+                    "output": "",
+                }
+            summaries.append(summary)
+            log(f"Ferdig: {summary['name']} ({summary['status']}, {summary['seconds']:.1f} s)")
+    summaries.sort(key=lambda item: item["name"])
+    report_path = write_batch_report(summaries, out_root)
+    log(f"Batchrapport skrevet: {report_path}")
+    return summaries, report_path
+
+
+LIVE_PAGE = """<!doctype html>
+<html lang="no">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <title>Startliste</title>
+  <style>
+    body { margin: 0; font-family: Arial, sans-serif; background: #111; color: #eee; }
+    header { display: flex; justify-content: space-between; align-items: center; padding: 12px 20px; background: #000; }
+    #clock { font-size: 64px; font-weight: bold; font-variant-numeric: tabular-nums; text-align: right; }
+    #status { font-size: 13px; color: #888; text-align: right; }
+    #now, #next { font-size: 26px; margin: 4px 0; }
+    #now b { color: #5fdc7a; }
+    #next b { color: #f0c040; }
+    table { width: 100%; border-collapse: collapse; font-size: 20px; }
+    th, td { padding: 6px 10px; border-bottom: 1px solid #333; text-align: left; }
+    th { color: #aaa; font-weight: normal; }
+    tr.pause td { color: #9ab; font-style: italic; }
+    tr.now td { background: #1f5f2f; }
+    tr.next td { background: #5f5020; }
+  </style>
+</head>
+<body>
+  <header>
+    <div><div id="now"></div><div id="next"></div></div>
+    <div><div id="clock">--:--:--</div><div id="status">Kobler til ...</div></div>
+  </header>
+  <table>
+    <thead><tr><th>Nr.</th><th>Start</th><th>Slutt</th><th>Navn</th><th>Klubb</th><th>Klasse</th></tr></thead>
+    <tbody id="rows"></tbody>
+  </table>
+  <script>
+  (function () {
+    var rows = {}, order = [], els = {}, now = null, next = null, offset = 0;
+    var body = document.getElementById("rows"), clock = document.getElementById("clock");
+    var status = document.getElementById("status");
+    function paint(key) {
+      var r = rows[key], tr = els[key];
+      if (!r) return;
+      if (!tr) {
+        tr = els[key] = document.createElement("tr");
+        for (var i = 0; i < 6; i++) tr.appendChild(document.createElement("td"));
+      }
+      var vals = r[6] ? ["", r[1], r[2], r[3], "", ""] : r.slice(0, 6);
+      for (var j = 0; j < 6; j++) tr.cells[j].textContent = vals[j];
+      tr.className = (r[6] ? "pause" : "") + (key === now ? " now" : key === next ? " next" : "");
+    }
+    function banner(id, label, key) {
+      var el = document.getElementById(id), b = document.createElement("b");
+      b.textContent = label;
+      el.textContent = "";
+      el.appendChild(b);
+      el.appendChild(document.createTextNode(" " + (rows[key] ? rows[key][3] : "-")));
+    }
+    function apply(d, full) {
+      if (full) { rows = {}; els = {}; body.textContent = ""; }
+      (d.removed || []).forEach(function (k) {
+        delete rows[k];
+        if (els[k]) { body.removeChild(els[k]); delete els[k]; }
+      });
+      var changed = d.rows || {}, touched = [now, next];
+      Object.keys(changed).forEach(function (k) { rows[k] = changed[k]; touched.push(k); });
+      if ("now" in d) now = d.now;
+      if ("next" in d) next = d.next;
+      if ("title" in d) document.title = d.title || "Startliste";
+      if (d.time) offset = d.time - Date.now();
+      touched.push(now, next);
+      touched.forEach(function (k) { if (k) paint(k); });
+      if (d.order) {
+        order = d.order;
+        order.forEach(function (k) { if (els[k]) body.appendChild(els[k]); });
+      }
+      banner("now", "Nå:", now);
+      banner("next", "Neste:", next);
+    }
+    function pad(n) { return (n < 10 ? "0" : "") + n; }
+    function tick() {
+      var t = new Date(Date.now() + offset);
+      clock.textContent = pad(t.getHours()) + ":" + pad(t.getMinutes()) + ":" + pad(t.getSeconds());
+      setTimeout(tick, 1005 - ((Date.now() + offset) % 1000));
+    }
+    var source = new EventSource("events");
+    source.addEventListener("snapshot", function (e) { apply(JSON.parse(e.data), true); });
+    source.addEventListener("diff", function (e) { apply(JSON.parse(e.data), false); });
+    source.addEventListener("clock", function (e) { offset = JSON.parse(e.data).time - Date.now(); });
+    source.onopen = function () { status.textContent = "Tilkoblet"; };
+    source.onerror = function () { status.textContent = "Mistet forbindelsen, prøver igjen ..."; };
+    tick();
+  })();
+  </script>
+</body>
+</html>
+"""
+
+
+def format_sse(event, data, event_id=None):
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {text}\n\n".encode("utf-8")
+
+
+class LiveBoard:
+    # Siste publiserte startliste og status. Skjermene får et fullt bilde ved
+    # tilkobling og deretter bare endringene (SSE). Ved gjentilkobling med
+    # Last-Event-ID sendes endringene de gikk glipp av, hvis de fortsatt finnes.
+    def __init__(self, history=256, client_queue=500):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.order = []
+        self.rows = {}
+        self.status = {}
+        self.diffs = deque(maxlen=history)
+        self.clients = set()
+        self.client_queue = client_queue
+
+    def snapshot_message(self):
+        data = {"order": self.order, "rows": self.rows, "time": int(time.time() * 1000)}
+        data.update(self.status)
+        return format_sse("snapshot", data, self.version)
+
+    def publish(self, order, rows, status):
+        with self.lock:
+            diff = {}
+            if order != self.order:
+                diff["order"] = order
+            changed = {key: value for key, value in rows.items() if self.rows.get(key) != value}
+            if changed:
+                diff["rows"] = changed
+            removed = [key for key in self.rows if key not in rows]
+            if removed:
+                diff["removed"] = removed
+            for name, value in status.items():
+                if self.status.get(name) != value:
+                    diff[name] = value
+            if not diff:
+                return False
+            self.version += 1
+            self.order = order
+            self.rows = rows
+            self.status = dict(status)
+            message = format_sse("diff", diff, self.version)
+            self.diffs.append((self.version, message))
+            for client in list(self.clients):
+                self.send(client, message)
+        return True
+
+    def send(self, client, message):
+        try:
+            client.put_nowait(message)
+        except queue.Full:
+            # Skjermen henger etter. De eldste meldingene kastes, og et fullt
+            # bilde erstatter endringene den gikk glipp av. Bare publiseringen
+            # legger i køen (under self.lock), så det er plass etterpå.
+            while True:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    break
+            client.put_nowait(self.snapshot_message() if message is not None else None)
+
+    def subscribe(self, last_id=None):
+        client = queue.Queue(maxsize=self.client_queue)
+        with self.lock:
+            self.clients.add(client)
+            oldest = self.diffs[0][0] if self.diffs else self.version + 1
+            if last_id is not None and oldest - 1 <= last_id <= self.version:
+                for version, message in self.diffs:
+                    if version > last_id:
+                        client.put_nowait(message)
+            else:
+                client.put_nowait(self.snapshot_message())
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def close(self):
+        with self.lock:
+            for client in list(self.clients):
+                self.send(client, None)
+            self.clients.clear()
+
+
+class LiveRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/index.html"):
+            self.send_body(LIVE_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+        elif path == "/events":
+            self.stream_events()
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self):
+        board = self.server.board
+        last_id = self.headers.get("Last-Event-ID")
+        client = board.subscribe(safe_int(last_id) if last_id else None)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            while True:
+                try:
+                    message = client.get(timeout=15)
+                except queue.Empty:
+                    message = format_sse("clock", {"time": int(time.time() * 1000)})
+                if message is None:
+                    break
+                self.wfile.write(message)
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            board.unsubscribe(client)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveServer:
+    def __init__(self, board, port=8765):
+        self.board = board
+        self.httpd = ThreadingHTTPServer(("0.0.0.0", port), LiveRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.board = board
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def stop(self):
+        self.board.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def local_ip_address():
+    # UDP-connect sender ingenting, men velger nettverkskortet mot LAN.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("10.255.255.255", 1))
+            return sock.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+class VirtualTable:
+    # Viser bare radene som får plass i vinduet. Treeview-en har et fast sett
+    # elementer som fylles fra entries (verdier, tags) ved rulling, så
+    # tusenvis av rader koster like lite som én skjermside.
+    def __init__(self, tree, scrollbar, entries):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.entries = entries
+        self.top = 0
+        self.visible = max(1, safe_int(tree.cget("height"), 10))
+        self.selected = None
+        self.marked = set()
+        self.items = []
+        self.shown = []
+        scrollbar.configure(command=self.on_scroll)
+        tree.bind("<Configure>", self.on_configure)
+        tree.bind("<<TreeviewSelect>>", self.on_select)
+        tree.bind("<MouseWheel>", self.on_wheel)
+        tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        tree.bind("<Button-5>", lambda event: self.scroll(3))
+        tree.bind("<Up>", lambda event: self.move_selection(-1))
+        tree.bind("<Down>", lambda event: self.move_selection(1))
+        tree.bind("<Prior>", lambda event: self.move_selection(-self.visible))
+        tree.bind("<Next>", lambda event: self.move_selection(self.visible))
+        tree.bind("<Home>", lambda event: self.move_selection(-len(self.entries)))
+        tree.bind("<End>", lambda event: self.move_selection(len(self.entries)))
+
+    def render(self):
+        count = len(self.entries)
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.top = max(0, min(self.top, count - self.visible))
+        want = min(self.visible, count - self.top)
+        while len(self.items) > want:
+            self.tree.delete(self.items.pop())
+            self.shown.pop()
+        while len(self.items) < want:
+            self.items.append(self.tree.insert("", "end"))
+            self.shown.append(None)
+        for pos, item in enumerate(self.items):
+            entry = self.entries[self.top + pos]
+            if self.top + pos in self.marked:
+                entry = (entry[0], entry[1] + ("search_hit",))
+            if self.shown[pos] != entry:
+                self.tree.item(item, values=entry[0], tags=entry[1])
+                self.shown[pos] = entry
+        pos = None if self.selected is None else self.selected - self.top
+        if pos is not None and 0 <= pos < want:
+            item = self.items[pos]
+            if self.tree.selection() != (item,):
+                self.tree.selection_set(item)
+            self.tree.focus(item)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        if count:
+            self.scrollbar.set(self.top / count, (self.top + want) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def index_of(self, item):
+        try:
+            return self.top + self.items.index(item)
+        except ValueError:
+            return None
+
+    def see(self, idx):
+        if idx < self.top:
+            self.top = idx
+        elif idx >= self.top + self.visible:
+            self.top = idx - self.visible + 1
+
+    def select(self, idx):
+        self.selected = idx
+        self.see(idx)
+        self.render()
+
+    def scroll(self, units):
+        self.top += units
+        self.render()
+        return "break"
+
+    def move_selection(self, delta):
+        if self.entries:
+            base = self.selected if self.selected is not None else self.top - (1 if delta > 0 else 0)
+            self.select(max(0, min(base + delta, len(self.entries) - 1)))
+        return "break"
+
+    def on_select(self, event):
+        selected = self.tree.selection()
+        if selected:
+            idx = self.index_of(selected[0])
+            if idx is not None:
+                self.selected = idx
+
+    def on_scroll(self, *args):
+        if args and args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.entries) + 0.5)
+            self.render()
+        elif args and args[0] == "scroll":
+            units = safe_int(args[1])
+            self.scroll(units * self.visible if args[2] == "pages" else units)
+
+    def on_wheel(self, event):
+        steps = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        return self.scroll(-steps * 3)
+
+    def on_configure(self, event):
+        # Radhøyden hentes fra en synlig rad; overskriften tar omtrent én rad.
+        bbox = self.tree.bbox(self.items[0]) if self.items else ""
+        if bbox:
+            first, height = bbox[1], bbox[3]
+        else:
+            height = safe_int(ttk.Style().lookup("Treeview", "rowheight"), 20) or 20
+            first = height
+        visible = max(1, (event.height - first) // max(1, height))
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+
+TEXT_INPUT_CLASSES = {"Entry", "TEntry", "Spinbox", "TSpinbox", "TCombobox", "Text"}
+
+
+def is_text_input(widget):
+    # Tekstfelt har egen angre-funksjon; der skal Ctrl+Z/Ctrl+Y ikke flytte rader.
+    try:
+        return widget.winfo_class() in TEXT_INPUT_CLASSES
+    except (AttributeError, tk.TclError):
+        return False
+
+
+class App:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("FSM Data Dekoder")
+        self.root.minsize(900, 620)
+        self.live_board = LiveBoard()
+        self.live_server = None
+        self.live_job = None
+        self.live_var = tk.BooleanVar(value=False)
+        self.menubar = tk.Menu(self.root)
+        self.root.config(menu=self.menubar)
+        self.menu_startliste = tk.Menu(self.menubar, tearoff=0)
+        self.menu_musikk = tk.Menu(self.menubar, tearoff=0)
+        self.menu_rapporter = tk.Menu(self.menubar, tearoff=0)
+        self.menu_rekkefolge = tk.Menu(self.menubar, tearoff=0)
+        self.menu_hjelp = tk.Menu(self.menubar, tearoff=0)
+        self.menubar.add_cascade(label="Startliste", menu=self.menu_startliste)
+        self.menubar.add_cascade(label="Musikk", menu=self.menu_musikk)
+        self.menubar.add_cascade(label="Rapporter", menu=self.menu_rapporter)
+        self.menubar.add_cascade(label="Rekkefølge", menu=self.menu_rekkefolge)
+        self.menubar.add_cascade(label="Hjelp", menu=self.menu_hjelp)
+        self.menu_startliste.add_command(label="Startliste...", command=self.open_startliste_window, state="disabled")
+        self.menu_startliste.add_checkbutton(
+            label="Live-visning i nettleser", variable=self.live_var, command=self.on_live_toggle
+        )
+        self.menu_musikk.add_command(
+            label="Lag spilleliste", command=self.generate_playlist_only, state="disabled"
+        )
+        self.menu_rapporter.add_command(label="Lag filer", command=self.generate_files, state="disabled")
+        self.menu_rekkefolge.add_command(label="Lagre rekkefølge", command=self.save_order, state="disabled")
+        self.menu_rekkefolge.add_command(label="Last rekkefølge", command=self.load_order, state="disabled")
+        self.menu_rekkefolge.add_separator()
+        self.menu_rekkefolge.add_command(
+            label="Angre", command=self.undo_edit, accelerator="Ctrl+Z", state="disabled"
+        )
+        self.menu_rekkefolge.add_command(
+            label="Gjør om", command=self.redo_edit, accelerator="Ctrl+Y", state="disabled"
+        )
+        self.menu_hjelp.add_command(label="Diagnostikk", command=self.show_diagnostics)
+        self.menu_hjelp.add_command(label="Om", command=self.show_about)
+        style = ttk.Style()
+        try:
+            style.theme_use("vista")
+        except tk.TclError:
+            style.theme_use("clam")
+        style.configure("Title.TLabel", font=("Segoe UI", 14, "bold"))
+        style.configure("Subtitle.TLabel", font=("Segoe UI", 9))
+        style.configure("Clock.TLabel", font=("Consolas", 56, "bold"))
+        self.rows = []
+        self.history = OrderHistory()
+        self.table_values = []
+        self.sort_keys = SortKeyCache()
+        self.sort_order = []
+        self.heading_texts = {}
+        self.search_index = TrigramIndex()
+        self.search_texts = {}
+        self.search_rows = {}
+        self.search_positions = {}
+        self.search_hits = []
+        self.search_var = tk.StringVar(value="")
+        self.search_status_var = tk.StringVar(value="")
+        self.journal = None
+        self.journal_sync_job = None
+        self.scanned_keys = Counter()
+        self.scan_cache = ScanCache(Path.home() / ".fms_gui" / "fsm_cache")
+        self.store_error = None
+        try:
+            self.store = CompetitionStore(Path.home() / ".fms_gui" / "stevner.sqlite3")
+        except (OSError, sqlite3.Error) as exc:
+            self.store = None
+            self.store_error = exc
+        self.scan_running = False
+        self.watcher = FolderWatcher()
+        self.profile_next_var = tk.BooleanVar(value=False)
+        self.diagnostics_window = None
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_job = None
+        self.watch_interval_ms = 3000
+        self.watch_pending = set()
+        self.zip_path = None
+        self.music_zip = None
+        self.excel_path = None
+        self.officials = []
+        self.music_cache_dir = None
+        self.audio_backend = None
+        self.audio_ready = False
+        self.audio_init_lock = threading.Lock()
+        self.play_trace = None
+        self.play_latency = LatencyHistogram()
+        self.current_track = ""
+        self.is_paused = False
+        self.current_duration = 0
+        self.player_state = "stopped"
+        self.player_tick_job = None
+        self.player_shown = None
+        self.music_end_event = None
+        self.play_offset = 0.0
+        self.play_started = 0.0
+        self.last_positions = {}
+        self.music_cache_paths = {}
+        self.music_keys = {}
+        self.music_info = MusicInfoCache(
+            Path(tempfile.gettempdir()) / "fms_gui_music_cache" / "music_info.json"
+        )
+        self.current_row = None
+        self.queue_hint = None
+        self.advance_job = None
+        self.advance_anchor = None
+        self.advance_target = None
+        self.advance_remaining = 0
+        self.auto_advance_var = tk.BooleanVar(value=False)
+        self.countdown_var = tk.StringVar(value="10")
+        self.play_pause_text = tk.StringVar(value="Spill")
+        self.external_playback = False
+        self.use_external_player_var = tk.BooleanVar(value=True)
+        self.startliste_window = None
+
+        base_dir = Path(__file__).resolve().parent
+        self.folder_var = tk.StringVar(value=str(base_dir))
+        self.fuzzy_threshold_var = tk.StringVar(value="0.85")
+
+        container = ttk.Frame(root, padding=10)
+        container.pack(fill="both", expand=True)
+
+        header = ttk.Frame(container)
+        header.pack(fill="x", pady=(0, 8))
+        header_left = ttk.Frame(header)
+        header_left.pack(side="left")
+        # title removed
+        self.clock_var = tk.StringVar(value="00:00:00")
+        self.clock_label = ttk.Label(
+            header, textvariable=self.clock_var, style="Clock.TLabel", anchor="center"
+        )
+        self.clock_label.pack(side="left", fill="x", expand=True)
+
+        folder_frame = ttk.Labelframe(container, text="Kilde")
+        folder_frame.pack(fill="x", pady=6)
+        ttk.Label(folder_frame, text="Mappe med zip:").pack(side="left", padx=(8, 4))
+        ttk.Entry(folder_frame, textvariable=self.folder_var, width=60).pack(
+            side="left", padx=6
+        )
+        ttk.Button(folder_frame, text="Velg mappe", command=self.choose_folder).pack(
+            side="left"
+        )
+        ttk.Button(folder_frame, text="Skann filer", command=self.read_zip).pack(
+            side="left", padx=(8, 0)
+        )
+        ttk.Checkbutton(
+            folder_frame,
+            text="Overvåk mappe",
+            variable=self.watch_var,
+            command=self.on_watch_toggle,
+        ).pack(side="left", padx=(8, 0))
+        ttk.Label(folder_frame, text="Navnelikhet:").pack(side="left", padx=(12, 4))
+        ttk.Entry(folder_frame, textvariable=self.fuzzy_threshold_var, width=5).pack(
+            side="left"
+        )
+        self.ind_excel = tk.Label(
+            folder_frame,
+            text="isonen/deltakerliste",
+            bg="#cccccc",
+            fg="#000000",
+            padx=6,
+            pady=2,
+        )
+        self.ind_music = tk.Label(
+            folder_frame,
             text="musikkzip",
             bg="#cccccc",
             fg="#000000",
@@ -980,6 +3880,9 @@ class App:
         self.tree.heading("påmelding", text="Påmelding")
         self.tree.heading("musikknavn", text="MP3-fil")
         self.tree.heading("musikktid", text="MusikkTid")
+        for col in columns:
+            self.heading_texts[col] = self.tree.heading(col, "text")
+            self.tree.heading(col, command=lambda c=col: self.sort_by_column(c))
         self.tree.column("startnummer", width=90, anchor="center")
         self.tree.column("starttid", width=90, anchor="center")
         self.tree.column("sluttid", width=90, anchor="center")
@@ -992,6 +3895,7 @@ class App:
         self.tree.configure(selectmode="browse")
         self.tree.tag_configure("missing_music", foreground="#b00020")
         self.tree.tag_configure("pause_row", background="#e0e0e0")
+        self.tree.tag_configure("search_hit", background="#fff1a8")
         self.tree.bind("<Double-1>", self.on_tree_double_click)
         self.tree.bind("<Delete>", self.on_delete_key)
         controls_frame = ttk.Frame(table_frame)
@@ -1028,8 +3932,18 @@ class App:
         self.btn_add_pause.pack(fill="x", padx=6, pady=2)
         self.btn_delete_selected.pack(fill="x", padx=6, pady=(2, 6))
         # rekkefølge flyttet til meny
-        yscroll = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=yscroll.set)
+        yscroll = ttk.Scrollbar(table_frame, orient="vertical")
+        self.table = VirtualTable(self.tree, yscroll, self.table_values)
+        search_frame = ttk.Frame(table_frame)
+        search_frame.pack(side="top", fill="x", padx=6, pady=(6, 0))
+        ttk.Label(search_frame, text="Søk:").pack(side="left")
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side="left", padx=6)
+        search_entry.bind("<Return>", lambda event: self.goto_search_hit(1))
+        search_entry.bind("<Shift-Return>", lambda event: self.goto_search_hit(-1))
+        search_entry.bind("<Escape>", lambda event: self.search_var.set(""))
+        ttk.Label(search_frame, textvariable=self.search_status_var).pack(side="left")
+        self.search_var.trace_add("write", lambda *_: self.on_search_change())
         self.tree.pack(side="left", fill="both", expand=True, padx=6, pady=6)
         controls_frame.pack(side="right", fill="y", pady=6)
         yscroll.pack(side="right", fill="y", pady=6)
@@ -1052,14 +3966,29 @@ class App:
             state="disabled",
             width=8,
         )
+        self.btn_player_resume = ttk.Button(
+            player_left,
+            text="Fortsett fra sist",
+            command=self.resume_selected,
+            state="disabled",
+        )
         self.btn_player_play_pause.pack(side="left", padx=(0, 6))
         self.btn_player_stop.pack(side="left")
+        self.btn_player_resume.pack(side="left", padx=(6, 0))
         ttk.Checkbutton(
             player_left,
             text="Bruk ekstern spiller",
             variable=self.use_external_player_var,
             command=self.on_use_external_player_toggle,
         ).pack(side="left", padx=(8, 0))
+        ttk.Checkbutton(
+            player_left,
+            text="Auto neste",
+            variable=self.auto_advance_var,
+            command=self.on_auto_advance_toggle,
+        ).pack(side="left", padx=(8, 0))
+        ttk.Label(player_left, text="Nedtelling (s):").pack(side="left", padx=(6, 2))
+        ttk.Entry(player_left, textvariable=self.countdown_var, width=4).pack(side="left")
 
         player_mid = ttk.Frame(player_frame)
         player_mid.pack(side="left", fill="x", expand=True, padx=6, pady=6)
@@ -1068,12 +3997,15 @@ class App:
         ttk.Label(player_mid, textvariable=self.player_track_var).pack(anchor="w")
         self.player_progress = ttk.Progressbar(player_mid, mode="determinate")
         self.player_progress.pack(fill="x", pady=4)
+        self.player_progress.bind("<Button-1>", self.on_progress_click)
         ttk.Label(player_mid, textvariable=self.player_time_var).pack(anchor="w")
 
         log_frame = ttk.Labelframe(container, text="Logg")
         log_frame.pack(fill="x", pady=6)
         self.log_widget = ScrolledText(log_frame, height=6, wrap="word")
         self.log_widget.pack(fill="both", expand=True, padx=6, pady=6)
+        if self.store_error:
+            self.log(f"Kunne ikke åpne lokalt lager: {self.store_error}")
 
         today_str = datetime.now().strftime("%d.%m.%y")
         self.start_date_var = tk.StringVar(value=today_str)
@@ -1086,32 +4018,122 @@ class App:
         self.pause_duration_var = tk.StringVar(value="")
         self.pause_label_var = tk.StringVar(value="Vanningspause")
         self.playlist_var = tk.BooleanVar(value=False)
+        self.split_startliste_var = tk.BooleanVar(value=False)
 
         self.var_pdf = tk.BooleanVar(value=False)
         self.var_excel = tk.BooleanVar(value=True)
         self.var_html = tk.BooleanVar(value=True)
+        self.var_html_compact = tk.BooleanVar(value=False)
         self.menu_rapporter.add_checkbutton(label="PDF", variable=self.var_pdf, state="disabled")
         self.menu_rapporter.add_checkbutton(label="Excel", variable=self.var_excel, state="disabled")
         self.menu_rapporter.add_checkbutton(label="HTML", variable=self.var_html, state="disabled")
+        self.menu_rapporter.add_checkbutton(
+            label="HTML med søk (kompakt)", variable=self.var_html_compact, state="disabled"
+        )
+        self.menu_rapporter.add_separator()
+        self.menu_rapporter.add_command(label="Batch (alle undermapper)...", command=self.run_batch_dialog)
+        self.menu_rapporter.add_command(
+            label="Tidligere stevner for valgt utøver", command=self.show_participant_history
+        )
 
         self.set_output_controls(enabled=False)
         self.set_table_controls(enabled=False)
-        self.update_player_ui()
+        self.render_player_progress(0)
         self.update_clock()
         self.start_time_var.trace_add("write", self.on_time_settings_change)
         self.interval_var.trace_add("write", self.on_time_settings_change)
+        self.root.bind("<Control-z>", self.on_undo_key)
+        self.root.bind("<Control-y>", self.on_redo_key)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        if not self.use_external_player_var.get():
+            self.preinit_audio()
 
     def log(self, msg):
         self.log_widget.insert("end", msg + "\n")
         self.log_widget.see("end")
         self.root.update_idletasks()
 
+    def run_in_background(self, work, on_done=None, on_error=None):
+        # work(log) kjører i egen tråd; logglinjer og resultat leveres
+        # tilbake i Tk-tråden.
+        messages = queue.Queue()
+        result = {}
+
+        def runner():
+            try:
+                result["value"] = work(messages.put)
+            except Exception as exc:
+                result["error"] = exc
+            finally:
+                messages.put(None)
+
+        def pump():
+            while True:
+                try:
+                    msg = messages.get_nowait()
+                except queue.Empty:
+                    self.root.after(150, pump)
+                    return
+                if msg is None:
+                    if "error" in result:
+                        if on_error:
+                            on_error(result["error"])
+                        else:
+                            self.log(f"Feil i bakgrunnsjobb: {result['error']}")
+                    elif on_done:
+                        on_done(result.get("value"))
+                    return
+                self.log(msg)
+
+        threading.Thread(target=runner, daemon=True).start()
+        self.root.after(150, pump)
+
+    def start_loudness_analysis(self):
+        if not self.music_zip or not self.music_keys:
+            return
+        music_zip = self.music_zip
+        pending = [
+            (fname, key)
+            for fname, key in self.music_keys.items()
+            if "lufs" not in self.music_info.get(key)
+        ]
+        if not pending:
+            return
+        self.log(f"Analyserer lydnivå for {len(pending)} MP3-filer i bakgrunnen.")
+
+        def done(analyzed):
+            if music_zip != self.music_zip:
+                return
+            self.apply_music_gains()
+            if analyzed:
+                self.log(
+                    f"Lydnivå ferdig analysert ({analyzed} filer). "
+                    "Justeringen brukes bare i den innebygde spilleren."
+                )
+                if self.store and self.zip_path:
+                    try:
+                        self.store.save_music(self.zip_path, self.music_keys, self.music_info)
+                    except sqlite3.Error as exc:
+                        self.log(f"Kunne ikke lagre lydnivå i lokalt lager: {exc}")
+
+        self.run_in_background(
+            lambda log: analyze_music_zip(music_zip, pending, self.music_info, log), done
+        )
+
+    def apply_music_gains(self):
+        for row in self.rows:
+            key = self.music_keys.get(row.get("MusikkFil") or "")
+            info = self.music_info.get(key) if key else {}
+            gain = loudness_gain_db(info.get("lufs"), info.get("peak"))
+            row["MusikkGainDb"] = gain if gain is not None else ""
+
     def set_output_controls(self, enabled):
         state = "normal" if enabled else "disabled"
         self.menu_rapporter.entryconfig(0, state=state)
         self.menu_rapporter.entryconfig(1, state=state)
         self.menu_rapporter.entryconfig(2, state=state)
         self.menu_rapporter.entryconfig(3, state=state)
+        self.menu_rapporter.entryconfig(4, state=state)
         self.menu_startliste.entryconfig(0, state=state)
         self.menu_musikk.entryconfig(0, state=state)
         if self.music_zip:
@@ -1131,8 +4153,18 @@ class App:
         self.btn_delete_selected.config(state=state)
         self.btn_player_play_pause.config(state=state)
         self.btn_player_stop.config(state=state)
+        self.btn_player_resume.config(state=state)
         self.menu_rekkefolge.entryconfig(0, state=state)
         self.menu_rekkefolge.entryconfig(1, state=state)
+        self.update_undo_controls()
+
+    def update_undo_controls(self):
+        self.menu_rekkefolge.entryconfig(
+            3, state="normal" if self.history.can_undo() else "disabled"
+        )
+        self.menu_rekkefolge.entryconfig(
+            4, state="normal" if self.history.can_redo() else "disabled"
+        )
 
     def open_startliste_window(self):
         if self.startliste_window and self.startliste_window.winfo_exists():
@@ -1208,6 +4240,13 @@ class App:
             row=row, column=5, sticky="w"
         )
 
+        row += 1
+        ttk.Checkbutton(
+            frame,
+            text="Egne lister per klasse og oppvarmingsgruppe",
+            variable=self.split_startliste_var,
+        ).grid(row=row, column=0, columnspan=4, sticky="w", pady=(6, 4))
+
         btn_frame = ttk.Frame(frame)
         btn_frame.grid(row=row, column=4, columnspan=2, sticky="e", pady=(6, 4))
         ttk.Button(
@@ -1216,225 +4255,256 @@ class App:
             command=self.generate_startliste,
         ).pack(side="right")
 
+    def on_live_toggle(self):
+        if not self.live_var.get():
+            if self.live_server:
+                self.live_server.stop()
+                self.live_server = None
+                self.log("Live-visning stoppet.")
+            return
+        try:
+            self.live_server = LiveServer(self.live_board)
+        except OSError as exc:
+            self.live_var.set(False)
+            messagebox.showerror("Feil", f"Kunne ikke starte live-visning: {exc}")
+            return
+        self.publish_live()
+        self.log(f"Live-visning: http://{local_ip_address()}:{self.live_server.port}/")
+
+    def schedule_live_publish(self):
+        # Samler raske endringer (flytting, tider, avspilling) til én utsendelse.
+        if self.live_server and self.live_job is None:
+            self.live_job = self.root.after(150, self.publish_live)
+
+    def live_key(self, row, seen):
+        # Radnøkkelen kan gjentas (samme navn uten ParticipantCode, eller
+        # samme utøver i flere klasser); n-te forekomst får løpenummer.
+        if row.get("IsPause"):
+            return f"p{id(row)}"
+        key = self.row_key(row)
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        return f"{key}#{count}" if count else key
+
+    def publish_live(self):
+        self.live_job = None
+        if not self.live_server:
+            return
+        order = []
+        rows = {}
+        keys = {}
+        seen = {}
+        display_idx = 1
+        for row in self.rows:
+            key = self.live_key(row, seen)
+            keys[id(row)] = key
+            order.append(key)
+            is_pause = bool(row.get("IsPause"))
+            rows[key] = [
+                "" if is_pause else display_idx,
+                row.get("StartTid", ""),
+                row.get("SluttTid", ""),
+                row.get("NavnFraIsonen") or row.get("PrintName", ""),
+                row.get("Organisation", ""),
+                row.get("Event", ""),
+                1 if is_pause else 0,
+            ]
+            if not is_pause:
+                display_idx += 1
+        current = self.current_row if self.player_state in ("playing", "paused") else None
+        upcoming = self.next_queue_row(current) if current is not None else None
+        if upcoming is None and current is None:
+            idx = self.selected_index()
+            upcoming = self.rows[idx] if idx is not None and idx < len(self.rows) else None
+        location = self.location_var.get().strip()
+        self.live_board.publish(
+            order,
+            rows,
+            {
+                "now": keys.get(id(current)) if current is not None else None,
+                "next": keys.get(id(upcoming)) if upcoming is not None else None,
+                "title": f"Startliste {location}".strip(),
+            },
+        )
+
     def choose_folder(self):
         path = filedialog.askdirectory(initialdir=self.folder_var.get())
         if path:
             self.folder_var.set(path)
 
-    def read_zip(self):
-        self.log_widget.delete("1.0", "end")
+    def reset_scan_state(self):
+        self.close_journal()
         self.rows = []
+        self.history.clear()
+        self.update_undo_controls()
         self.zip_path = None
         self.ind_data.config(bg="#cccccc")
         self.ind_music.config(bg="#cccccc")
         self.ind_excel.config(bg="#cccccc")
         self.music_cache_dir = None
+        self.music_cache_paths = {}
+        self.music_keys = {}
 
-        folder = Path(self.folder_var.get())
-        if not folder.exists():
-            messagebox.showerror("Feil", "Mappen finnes ikke.")
-            return
-
-        zips = sorted(folder.glob("*.zip"))
-        if not zips:
-            messagebox.showerror("Feil", "Fant ingen zip-filer i mappen.")
-            return
-
-        data_zips = [
-            z
-            for z in zips
-            if z.name.lower().startswith("fmsdata") or z.name.lower().startswith("fsmdata")
-        ]
-        music_zips = [z for z in zips if z.name.lower().startswith("musikk")]
-        excel_files = [p for p in folder.glob("Deltakerliste*.xlsx")]
-
-        if not data_zips:
-            messagebox.showerror("Feil", "Fant ingen FMSData*.zip i mappen.")
-            return
-        if not music_zips:
-            messagebox.showerror("Feil", "Fant ingen Musikk*.zip i mappen.")
-            return
-        if not excel_files:
-            messagebox.showerror("Feil", "Fant ingen Deltakerliste*.xlsx i mappen.")
-            return
+    def prepare_scan(self):
+        try:
+            data_zip, music_zip, excel_path = find_competition_files(
+                Path(self.folder_var.get()), self.log
+            )
+        except ScanError as exc:
+            self.reset_scan_state()
+            messagebox.showerror("Feil", str(exc))
+            self.set_output_controls(enabled=False)
+            return None
 
-        self.zip_path = data_zips[0]
-        if len(data_zips) > 1:
-            self.log(f"Fant flere FMSData-zip. Bruker: {self.zip_path.name}")
+        rescan = bool(self.rows) and data_zip == self.zip_path
+        if rescan:
+            self.log("Skanner på nytt; leser bare endrede filer og beholder rekkefølge og pauser.")
+        else:
+            self.reset_scan_state()
+        self.zip_path = data_zip
         self.ind_data.config(bg="#3fbf5f")
-
-        excel_path = excel_files[0]
-        if len(excel_files) > 1:
-            self.log(f"Fant flere deltakerlister. Bruker: {excel_path.name}")
         self.ind_excel.config(bg="#3fbf5f")
-        self.rows = load_participants_from_excel(excel_path, self.log)
-        if not self.rows:
-            messagebox.showerror("Feil", "Fant ingen deltakere i excel-filen.")
-            self.set_output_controls(enabled=False)
-            return
-
-        self.log(f"Leser zip: {self.zip_path.name}")
-        zip_rows = []
-        with zipfile.ZipFile(self.zip_path, "r") as zf:
-            xml_entries = [e for e in zf.infolist() if e.filename.lower().endswith(".xml")]
-            if not xml_entries:
-                messagebox.showerror("Feil", "Fant ingen xml-filer i zip.")
-                return
-
-            for entry in xml_entries:
-                self.log(f"Leser fil: {entry.filename}")
-                data = zf.read(entry)
-                xml_text = decode_xml_bytes(data)
-                if "judges" in entry.filename.lower():
-                    parse_officials(xml_text, self.log)
-                else:
-                    zip_rows.extend(parse_competition(xml_text, self.log))
-
-        music_zip = music_zips[0]
-        if len(music_zips) > 1:
-            self.log(f"Fant flere musikk-zip. Bruker: {music_zip.name}")
         self.ind_music.config(bg="#3fbf5f")
+        if music_zip != self.music_zip:
+            self.music_cache_dir = None
+            self.music_cache_paths = {}
         self.music_zip = music_zip
+        self.excel_path = excel_path
+        return data_zip, music_zip, excel_path, rescan
+
+    def prepare_watch_scan(self, ready):
+        # Automatisk innlesing fletter bare inn i stevnet som allerede er
+        # lastet. Andre filer i mappen og feil logges, uten å nullstille
+        # rekkefølge, pauser eller journal.
+        if not self.rows or not self.zip_path:
+            self.log("Automatisk innlesing hoppet over: ingen stevne er lastet. Bruk Skann filer.")
+            return None
+        loaded = {self.zip_path, self.music_zip, self.excel_path}
+        for path in sorted(set(ready) - loaded):
+            self.log(f"Automatisk innlesing: {path.name} hører ikke til lastet stevne, hoppet over.")
+        if not set(ready) & loaded:
+            return None
+        missing = [path.name for path in loaded if path and not path.exists()]
+        if missing:
+            self.log(f"Automatisk innlesing hoppet over: finner ikke {', '.join(missing)}.")
+            return None
+        self.log("Skanner på nytt; leser bare endrede filer og beholder rekkefølge og pauser.")
+        return self.zip_path, self.music_zip, self.excel_path, True
+
+    def scan_options(self):
+        return {
+            "music_info": self.music_info,
+            "fuzzy_threshold": self.get_fuzzy_threshold(),
+            "scan_cache": self.scan_cache,
+        }
+
+    def scan_or_reopen(self, data_zip, music_zip, excel_path, log, options):
+        store = self.store
+        if not store:
+            return scan_competition(data_zip, music_zip, excel_path, log, **options)
+        signature = input_signature(data_zip, music_zip, excel_path, options["fuzzy_threshold"])
+        try:
+            with diagnostics.stage("Lokalt lager (les)"):
+                result = store.load_competition(data_zip, signature)
+        except (sqlite3.Error, ValueError) as exc:
+            log(f"Kunne ikke lese fra lokalt lager: {exc}")
+            result = None
+        if result:
+            log(f"Uendret siden forrige skann, åpnet fra lokalt lager ({len(result['rows'])} deltakere).")
+            return result
+        result = scan_competition(data_zip, music_zip, excel_path, log, **options)
+        try:
+            with diagnostics.stage("Lokalt lager (skriv)"):
+                store.save_competition(data_zip, signature, result, options["music_info"])
+        except sqlite3.Error as exc:
+            log(f"Kunne ikke lagre i lokalt lager: {exc}")
+        return result
+
+    def take_profile_request(self):
+        if not self.profile_next_var.get():
+            return None
+        self.profile_next_var.set(False)
+        folder = self.zip_path.parent if self.zip_path else Path(self.folder_var.get())
+        return folder / "output"
+
+    def run_profiled(self, label, func):
+        profile_dir = self.take_profile_request()
+        if profile_dir:
+            return profile_capture(profile_dir, label, func, self.log)
+        return func()
+
+    def on_scan_error(self, exc, rescan):
+        messagebox.showerror("Feil", str(exc))
+        if not rescan:
+            self.set_output_controls(enabled=False)
 
-        music_files = []
-        music_durations = {}
-        if music_zip:
-            self.log(f"Leser musikk-zip: {music_zip.name}")
+    def read_zip(self):
+        if self.scan_running:
+            messagebox.showinfo("Info", "Et skann pågår allerede i bakgrunnen.")
+            return
+        self.log_widget.delete("1.0", "end")
+        prepared = self.prepare_scan()
+        if not prepared:
+            return
+        data_zip, music_zip, excel_path, rescan = prepared
+        options = self.scan_options()
+        with diagnostics.run("Skann"):
             try:
-                with zipfile.ZipFile(music_zip, "r") as mz:
-                    for entry in mz.infolist():
-                        if entry.filename.lower().endswith(".mp3"):
-                            music_files.append(entry.filename)
-                            try:
-                                from mutagen.mp3 import MP3
-
-                                data = mz.read(entry)
-                                audio = MP3(BytesIO(data))
-                                music_durations[entry.filename] = audio.info.length
-                            except Exception:
-                                music_durations[entry.filename] = None
-            except Exception as exc:
-                self.log(f"Kunne ikke lese musikk-zip: {music_zip} ({exc})")
-        else:
-            self.log("Fant ingen musikk-zip (navn med 'MUSIKK').")
-
-        zip_people_strict = {}
-        zip_people_loose = {}
-        for row in zip_rows:
-            strict_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=True)
-            loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
-            if strict_key[0] or strict_key[1]:
-                zip_people_strict.setdefault(strict_key, row)
-            if loose_key[0] or loose_key[1]:
-                zip_people_loose.setdefault(loose_key, []).append(strict_key)
+                result = self.run_profiled(
+                    "skann",
+                    lambda: self.scan_or_reopen(data_zip, music_zip, excel_path, self.log, options),
+                )
+            except ScanError as exc:
+                self.on_scan_error(exc, rescan)
+                return
+            self.apply_scan_result(result, rescan)
 
-        excel_keys = set()
-        used_music_files = set()
-        used_zip_keys = set()
-        used_loose_keys = set()
-        for row in self.rows:
-            strict_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=True)
-            loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
-            excel_keys.add(strict_key)
-            zip_row = None
-            match_type = ""
-            if strict_key in zip_people_strict and strict_key not in used_zip_keys:
-                zip_row = zip_people_strict.get(strict_key)
-                used_zip_keys.add(strict_key)
-                match_type = "eksakt"
-            else:
-                for candidate_key in zip_people_loose.get(loose_key, []):
-                    if candidate_key in used_zip_keys:
-                        continue
-                    zip_row = zip_people_strict.get(candidate_key)
-                    if zip_row:
-                        used_zip_keys.add(candidate_key)
-                        match_type = "loose"
-                        break
-            if zip_row:
-                row["ParticipantCode"] = zip_row.get("ParticipantCode", "")
-                row["Event"] = zip_row.get("Event", "")
-                row["EntryOrder"] = zip_row.get("EntryOrder", "")
-                row["Music1"] = zip_row.get("Music1", "")
-                row["Music2"] = zip_row.get("Music2", "")
-                row["Club1"] = zip_row.get("Club1", "")
-                row["Club2"] = zip_row.get("Club2", "")
-                row["ElementsFree"] = zip_row.get("ElementsFree", "")
-                row["ElementsShort"] = zip_row.get("ElementsShort", "")
-                zip_print = zip_row.get("PrintName") or f"{zip_row.get('GivenName', '')} {zip_row.get('FamilyName', '')}".strip()
-                row["NavnFraFsm"] = zip_print
-                row["Manglende i zip"] = ""
-                if loose_key[0] or loose_key[1]:
-                    used_loose_keys.add(loose_key)
-                if match_type == "loose":
-                    self.log(f"Matcher (loose): {row.get('NavnFraIsonen', '')} -> {zip_print}")
-                else:
-                    self.log(f"Matcher: {row.get('NavnFraIsonen', '')} -> {zip_print}")
-            else:
-                row["Manglende i zip"] = "JA"
-                row["NavnFraFsm"] = ""
-                self.log(f"Mangler i FSM: {row.get('NavnFraIsonen', '')}")
-
-            if music_files:
-                matched = self.match_music_file(row, music_files, used_music_files)
-                row["Musikk"] = "ok" if matched else "mangler"
-                row["MusikkFil"] = matched or ""
-                musikk_sec = music_durations.get(matched) if matched else None
-                if matched and musikk_sec is None:
-                    row["MusikkTid"] = "Klarer ikke å hente tid"
-                    row["MusikkSek"] = ""
-                else:
-                    row["MusikkTid"] = format_duration(musikk_sec)
-                    row["MusikkSek"] = int(round(musikk_sec)) if musikk_sec else ""
+    def start_background_scan(self, ready):
+        if self.scan_running:
+            self.watch_pending.update(ready)
+            return
+        prepared = self.prepare_watch_scan(ready)
+        if not prepared:
+            return
+        data_zip, music_zip, excel_path, rescan = prepared
+        options = self.scan_options()
+        profile_dir = self.take_profile_request()
+        self.scan_running = True
+        run_record = {"name": "Skann", "started": datetime.now(), "total": 0.0, "stages": [], "counters": {}}
+
+        def work(log):
+            def scan():
+                return self.scan_or_reopen(data_zip, music_zip, excel_path, log, options)
+
+            with diagnostics.run("Skann", run_record):
+                if profile_dir:
+                    return profile_capture(profile_dir, "skann", scan, log)
+                return scan()
+
+        def done(result):
+            self.scan_running = False
+            with diagnostics.run("Skann", run_record):
+                self.apply_scan_result(result, rescan)
+            self.log("Automatisk innlesing ferdig.")
+            self.run_pending_watch_scan()
+
+        def failed(exc):
+            self.scan_running = False
+            if isinstance(exc, ScanError):
+                self.log(f"Automatisk innlesing feilet: {exc}")
             else:
-                row["Musikk"] = "mangler"
-                row["MusikkFil"] = ""
-                row["MusikkTid"] = ""
-                row["MusikkSek"] = ""
+                self.log(f"Feil i bakgrunnsjobb: {exc}")
+            self.run_pending_watch_scan()
 
-        for key, row in zip_people_strict.items():
-            if key in used_zip_keys:
-                continue
-            loose_key = build_name_key(row.get("GivenName"), row.get("FamilyName"), strict=False)
-            if loose_key in used_loose_keys:
-                continue
-            zip_given = (row.get("GivenName") or "").strip()
-            zip_family = (row.get("FamilyName") or "").strip()
-            zip_print = row.get("PrintName") or f"{zip_given} {zip_family}".strip()
-            self.log(f"Ekstra i FSM (ny rad): {zip_print}")
-            self.rows.append(
-                {
-                    "PrintName": zip_print,
-                    "NavnFraIsonen": "",
-                    "NavnFraFsm": zip_print,
-                    "GivenName": zip_given,
-                    "FamilyName": zip_family,
-                    "Gender": row.get("Gender", ""),
-                    "Organisation": row.get("Organisation", ""),
-                    "ParticipantCode": row.get("ParticipantCode", ""),
-                    "Event": row.get("Event", ""),
-                    "EntryOrder": row.get("EntryOrder", ""),
-                    "Påmelding": "",
-                    "Music1": row.get("Music1", ""),
-                    "Music2": row.get("Music2", ""),
-                    "Club1": row.get("Club1", ""),
-                    "Club2": row.get("Club2", ""),
-                    "ElementsFree": row.get("ElementsFree", ""),
-                    "ElementsShort": row.get("ElementsShort", ""),
-                    "Manglende i zip": "",
-                    "Musikk": "mangler",
-                    "MusikkFil": "",
-                    "MusikkTid": "",
-                    "MusikkSek": "",
-                    "StartTid": "",
-                    "SluttTid": "",
-                }
-            )
+        self.run_in_background(work, done, failed)
 
-        if music_files:
-            self.log("MP3-filer i musikk-zip:")
-            for fname in sorted(music_files):
-                self.log(f"- {fname}")
+    def apply_scan_result(self, result, rescan):
+        self.music_keys = result["music_keys"]
+        self.officials = result["officials"]
+        if rescan:
+            self.merge_rescan(result["rows"])
+            return
+        self.rows = result["rows"]
 
         if not self.rows:
             messagebox.showwarning("Info", "Fant ingen deltakere i xml.")
@@ -1446,39 +4516,354 @@ class App:
         self.set_output_controls(enabled=True)
         self.set_table_controls(enabled=True)
         self.refresh_table()
+        self.apply_music_gains()
+        self.start_loudness_analysis()
+        self.open_journal()
+
+    def on_watch_toggle(self):
+        if self.watch_job is not None:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        if not self.watch_var.get():
+            self.log("Mappeovervåking av.")
+            return
+        self.watcher.prime(Path(self.folder_var.get()))
+        self.log(f"Overvåker mappe: {self.folder_var.get()}")
+        self.watch_job = self.root.after(self.watch_interval_ms, self.poll_watch_folder)
+
+    def poll_watch_folder(self):
+        self.watch_job = None
+        if not self.watch_var.get():
+            return
+        folder = Path(self.folder_var.get())
+        if folder != self.watcher.folder:
+            self.watcher.prime(folder)
+        ready = self.watcher.poll()
+        if ready:
+            for path in ready:
+                self.log(f"Ny eller oppdatert fil: {path.name}. Leser inn automatisk.")
+            self.start_background_scan(ready)
+        self.watch_job = self.root.after(self.watch_interval_ms, self.poll_watch_folder)
+
+    def run_pending_watch_scan(self):
+        if self.watch_pending:
+            ready = list(self.watch_pending)
+            self.watch_pending.clear()
+            self.start_background_scan(ready)
+
+    def merge_rescan(self, new_rows):
+        # Nye rader legges inn i gjeldende rekkefølge; pauser beholdes og
+        # deltakere som er slettet manuelt kommer ikke tilbake.
+        current_keys = Counter(self.row_key(row) for row in self.rows if not row.get("IsPause"))
+        deleted = self.scanned_keys - current_keys
+        current_key = self.row_key(self.current_row) if self.current_row else None
+        order = build_order(self.rows, self.row_key)
+        scanned = []
+        for row in reversed(new_rows):
+            key = self.row_key(row)
+            if deleted[key] > 0:
+                deleted[key] -= 1
+            else:
+                scanned.append(row)
+        scanned.reverse()
+        merged, missing_keys, unplaced = restore_order(scanned, order, self.row_key)
+        self.scanned_keys = Counter(self.row_key(row) for row in new_rows)
+        self.rows = merged
+        self.history.clear()
+        self.update_undo_controls()
+        if current_key:
+            self.current_row = next(
+                (row for row in self.rows if not row.get("IsPause") and self.row_key(row) == current_key),
+                None,
+            )
+        self.update_queue_hint()
+        for row in unplaced:
+            self.log(f"Ny deltaker lagt til sist: {row.get('NavnFraIsonen') or row.get('NavnFraFsm', '')}")
+        if missing_keys:
+            self.log(f"{len(missing_keys)} deltakere finnes ikke lenger i kildene og er fjernet.")
+        self.log(f"Totalt deltakere: {len(self.rows)}")
+        self.count_label.config(text=f"Utøvere: {sum(1 for r in self.rows if not r.get('IsPause'))}")
+        self.recalc_times()
+        self.refresh_table()
+        self.apply_music_gains()
+        self.start_loudness_analysis()
+        self.write_journal_snapshot()
 
     def refresh_table(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        rows_values = []
-        display_idx = 1
-        for row in self.rows:
-            is_pause = bool(row.get("IsPause"))
-            missing = (not is_pause) and (not row.get("MusikkFil"))
-            mp3_text = "mangler musikk" if missing else row.get("MusikkFil", "")
-            if is_pause:
-                tags = ("pause_row",)
+        self.sync_table(0)
+
+    def table_row(self, row, display_idx):
+        is_pause = bool(row.get("IsPause"))
+        missing = (not is_pause) and (not row.get("MusikkFil"))
+        mp3_text = "mangler musikk" if missing else row.get("MusikkFil", "")
+        if is_pause:
+            tags = ("pause_row",)
+        else:
+            tags = ("missing_music",) if missing else ()
+        start_num = "" if is_pause else display_idx
+        values = (
+            start_num,
+            row.get("StartTid", ""),
+            row.get("SluttTid", ""),
+            row.get("NavnFraIsonen", ""),
+            row.get("NavnFraFsm", ""),
+            row.get("Organisation", ""),
+            row.get("Påmelding", ""),
+            mp3_text,
+            row.get("MusikkTid", ""),
+        )
+        return values, tags
+
+    def sync_table(self, from_index=0):
+        with diagnostics.stage("Tabell"):
+            self.sync_table_rows(from_index)
+        self.schedule_live_publish()
+
+    def sync_table_rows(self, from_index):
+        # Oppdaterer visningsradene fra første endrede indeks; tabellen
+        # tegner deretter bare vinduet som er synlig.
+        count = len(self.rows)
+        del self.table_values[count:]
+        from_index = max(0, min(from_index, len(self.table_values)))
+        display_idx = 1 + sum(1 for row in self.rows[:from_index] if not row.get("IsPause"))
+        changed_values = []
+        for idx in range(from_index, count):
+            row = self.rows[idx]
+            entry = self.table_row(row, display_idx)
+            if not row.get("IsPause"):
+                display_idx += 1
+            if idx < len(self.table_values):
+                if self.table_values[idx] != entry:
+                    self.table_values[idx] = entry
+                    changed_values.append(entry[0])
             else:
-                tags = ("missing_music",) if missing else ()
-            start_num = "" if is_pause else display_idx
-            values = (
-                start_num,
-                row.get("StartTid", ""),
-                row.get("SluttTid", ""),
-                row.get("NavnFraIsonen", ""),
-                row.get("NavnFraFsm", ""),
-                row.get("Organisation", ""),
-                row.get("Påmelding", ""),
-                mp3_text,
-                row.get("MusikkTid", ""),
+                self.table_values.append(entry)
+                changed_values.append(entry[0])
+        diagnostics.count("Tabellrader skrevet", len(changed_values))
+        self.update_search_index(from_index)
+        self.table.render()
+        if from_index == 0:
+            self.autosize_columns([values for values, _ in self.table_values])
+        elif changed_values:
+            self.autosize_columns(changed_values, grow_only=True)
+
+    def update_search_index(self, from_index):
+        # Indeksen følger tabellen: bare rader fra første endrede indeks
+        # sjekkes, og bare rader med endret tekst indekseres på nytt.
+        for idx in range(from_index, len(self.rows)):
+            row = self.rows[idx]
+            doc_id = id(row)
+            self.search_positions[doc_id] = idx
+            self.search_rows[doc_id] = row
+            text = row_search_text(row)
+            if self.search_texts.get(doc_id) != text:
+                self.search_texts[doc_id] = text
+                self.search_index.add(doc_id, text)
+        if len(self.search_rows) > len(self.rows):
+            live = {id(row) for row in self.rows}
+            for doc_id in [doc_id for doc_id in self.search_rows if doc_id not in live]:
+                self.search_index.remove(doc_id)
+                del self.search_rows[doc_id]
+                self.search_texts.pop(doc_id, None)
+                self.search_positions.pop(doc_id, None)
+        if self.search_var.get().strip():
+            self.run_search()
+
+    def run_search(self):
+        query = normalize_text(self.search_var.get())
+        hits = []
+        if query:
+            # Korte søk treffer begynnelsen av ord, lengre søk hvor som helst.
+            if len(query) >= 3:
+                candidates = self.search_index.containing(query)
+            else:
+                candidates = self.search_index.word_prefix(query)
+            for doc_id in candidates:
+                if len(query) >= 3 and query not in self.search_texts[doc_id]:
+                    continue
+                idx = self.search_positions.get(doc_id)
+                if idx is not None and idx < len(self.rows) and self.rows[idx] is self.search_rows[doc_id]:
+                    hits.append(idx)
+            hits.sort()
+        self.search_hits = hits
+        self.table.marked = set(hits)
+        if not query:
+            self.search_status_var.set("")
+        else:
+            self.search_status_var.set(f"{len(hits)} treff" if hits else "Ingen treff")
+        return hits
+
+    def on_search_change(self):
+        with diagnostics.stage("Søk"):
+            hits = self.run_search()
+        if hits:
+            self.table.see(hits[0])
+        self.table.render()
+
+    def goto_search_hit(self, step):
+        if not self.search_hits:
+            return "break"
+        current = self.selected_index()
+        if current is None:
+            target = self.search_hits[0] if step > 0 else self.search_hits[-1]
+        elif step > 0:
+            pos = bisect.bisect_right(self.search_hits, current)
+            target = self.search_hits[pos % len(self.search_hits)]
+        else:
+            pos = bisect.bisect_left(self.search_hits, current) - 1
+            target = self.search_hits[pos]
+        self.select_index(target)
+        return "break"
+
+    def selected_index(self):
+        return self.table.selected
+
+    def select_index(self, idx):
+        if not self.table_values:
+            return
+        self.table.select(max(0, min(idx, len(self.table_values) - 1)))
+
+    def apply_edit(self, op, select=None):
+        inverse, first = apply_order_op(self.rows, op)
+        self.history.record(inverse)
+        self.after_order_change(first, select)
+        self.record_journal(op)
+
+    def after_order_change(self, first, select=None):
+        self.update_queue_hint()
+        self.recalc_times()
+        self.sync_table(first)
+        self.update_undo_controls()
+        if select is not None and self.rows:
+            self.select_index(select)
+
+    def on_undo_key(self, event):
+        if not is_text_input(event.widget):
+            self.undo_edit()
+
+    def on_redo_key(self, event):
+        if not is_text_input(event.widget):
+            self.redo_edit()
+
+    def undo_edit(self):
+        if not self.history.can_undo():
+            return
+        op, first = self.history.undo(self.rows)
+        self.after_order_change(first, first)
+        self.record_journal(op)
+        self.log("Angret endring i rekkefølge.")
+
+    def redo_edit(self):
+        if not self.history.can_redo():
+            return
+        op, first = self.history.redo(self.rows)
+        self.after_order_change(first, first)
+        self.record_journal(op)
+        self.log("Gjorde om endring i rekkefølge.")
+
+    def autosave_paths(self):
+        out_dir = self.zip_path.parent / "output"
+        base = sanitize_filename(self.zip_path.stem)
+        return (
+            out_dir / f"{base}_autosave_rekkefolge.json",
+            out_dir / f"{base}_autosave.jsonl",
+        )
+
+    def open_journal(self):
+        self.close_journal()
+        if not self.zip_path or not self.rows:
+            return
+        self.scanned_keys = Counter(self.row_key(row) for row in self.rows if not row.get("IsPause"))
+        journal = OrderJournal(*self.autosave_paths())
+        snapshot, entries = journal.load()
+        order = snapshot.get("order") if isinstance(snapshot, dict) else None
+        if isinstance(order, list) and order:
+            created = snapshot.get("created", "")
+            prompt = (
+                f"Fant autolagret rekkefølge fra {created} "
+                f"({len(entries)} endringer etter siste lagring).\n\nGjenopprette?"
             )
-            rows_values.append(values)
-            self.tree.insert("", "end", values=values, tags=tags)
-            if not is_pause:
-                display_idx += 1
-        self.autosize_columns(rows_values)
+            if messagebox.askyesno("Autolagring", prompt):
+                started = time.perf_counter()
+                new_rows, missing_keys, unplaced, applied = restore_journal(
+                    self.rows, snapshot, entries, self.row_key
+                )
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.log(
+                    f"Gjenopprettet autolagret rekkefølge: {applied} av {len(entries)} "
+                    f"endringer ({elapsed_ms:.1f} ms)."
+                )
+                if missing_keys:
+                    self.log(f"Fant ikke {len(missing_keys)} autolagrede deltakere.")
+                if unplaced:
+                    self.log(f"{len(unplaced)} deltakere var ikke autolagret og er lagt til sist.")
+                self.journal = journal
+                self.apply_edit(("replace", new_rows))
+                return
+        self.journal = journal
+        self.write_journal_snapshot()
+
+    def write_journal_snapshot(self):
+        if not self.journal:
+            return
+        current = Counter(self.row_key(row) for row in self.rows if not row.get("IsPause"))
+        try:
+            self.journal.write_snapshot(
+                self.rows, self.row_key, removed=self.scanned_keys - current
+            )
+        except OSError as exc:
+            self.log(f"Autolagring feilet: {exc}")
+            self.close_journal()
+
+    def record_journal(self, op):
+        if not self.journal:
+            return
+        entry = journal_entry(op, self.row_key)
+        if entry is None or self.journal.needs_snapshot():
+            self.write_journal_snapshot()
+            return
+        try:
+            self.journal.append(entry)
+        except OSError as exc:
+            self.log(f"Autolagring feilet: {exc}")
+            self.close_journal()
+            return
+        if self.journal_sync_job is None:
+            self.journal_sync_job = self.root.after(2000, self.sync_journal)
 
-    def autosize_columns(self, rows_values):
+    def sync_journal(self):
+        self.journal_sync_job = None
+        if not self.journal:
+            return
+        try:
+            self.journal.sync()
+        except OSError as exc:
+            self.log(f"Autolagring feilet: {exc}")
+            self.close_journal()
+            return
+        if self.journal.needs_snapshot():
+            self.write_journal_snapshot()
+
+    def close_journal(self):
+        if self.journal_sync_job is not None:
+            self.root.after_cancel(self.journal_sync_job)
+            self.journal_sync_job = None
+        if self.journal:
+            try:
+                self.journal.close()
+            except OSError:
+                pass
+            self.journal = None
+
+    def on_close(self):
+        self.close_journal()
+        if self.live_server:
+            self.live_server.stop()
+        if self.store:
+            self.store.close()
+        self.root.destroy()
+
+    def autosize_columns(self, rows_values, grow_only=False):
         try:
             import tkinter.font as tkfont
         except Exception:
@@ -1492,52 +4877,62 @@ class App:
         for col in columns:
             heading = self.tree.heading(col).get("text", "")
             max_widths[col] = font.measure(str(heading)) + padding
-        for row in rows_values:
-            for col, value in zip(columns, row):
-                width = font.measure(str(value)) + padding
+            if grow_only:
+                max_widths[col] = max(max_widths[col], int(self.tree.column(col, "width")))
+        # Måler bare de lengste tekstene per kolonne; å måle alle cellene
+        # blir tregt med tusenvis av rader.
+        for col_index, col in enumerate(columns):
+            texts = {str(row[col_index]) for row in rows_values if col_index < len(row)}
+            for text in heapq.nlargest(8, texts, key=len):
+                width = font.measure(text) + padding
                 if width > max_widths.get(col, 0):
                     max_widths[col] = width
         for col in columns:
             self.tree.column(col, width=max_widths.get(col, 80), stretch=False)
 
     def update_clock(self):
-        self.clock_var.set(datetime.now().strftime("%H:%M:%S"))
-        self.root.after(500, self.update_clock)
-
-    def sort_by_given(self):
+        now = datetime.now()
+        self.clock_var.set(now.strftime("%H:%M:%S"))
+        self.root.after(1000 - now.microsecond // 1000, self.update_clock)
+
+    def sort_by_column(self, column):
+        # Klikk på samme overskrift snur retningen; tidligere kolonner blir
+        # sekundære nøkler.
+        if self.sort_order and self.sort_order[0][0] == column:
+            order = [(column, not self.sort_order[0][1])] + self.sort_order[1:]
+        else:
+            order = [(column, False)] + [item for item in self.sort_order if item[0] != column]
+        self.sort_order = order[:3]
+        self.apply_sort(self.sort_order)
+
+    def update_sort_headings(self):
+        primary = self.sort_order[0] if self.sort_order else (None, False)
+        for col, text in self.heading_texts.items():
+            if col == primary[0]:
+                text += " ▼" if primary[1] else " ▲"
+            self.tree.heading(col, text=text)
+
+    def apply_sort(self, order):
+        self.update_sort_headings()
         if not self.rows:
             return
-        self.rows.sort(
-            key=lambda r: (
-                normalize_text(r.get("GivenName")),
-                normalize_text(r.get("FamilyName")),
-            )
-        )
-        self.recalc_times()
-        self.refresh_table()
+        with diagnostics.stage("Sortering"):
+            perm = self.sort_keys.permutation(self.rows, order)
+        if all(new_idx == old_idx for new_idx, old_idx in enumerate(perm)):
+            return
+        self.apply_edit(("permute", perm))
+
+    def sort_by_given(self):
+        self.sort_order = []
+        self.apply_sort([("fornavn", False)])
 
     def sort_by_family(self):
-        if not self.rows:
-            return
-        self.rows.sort(
-            key=lambda r: (
-                normalize_text(r.get("FamilyName")),
-                normalize_text(r.get("GivenName")),
-            )
-        )
-        self.recalc_times()
-        self.refresh_table()
+        self.sort_order = []
+        self.apply_sort([("etternavn", False)])
 
     def sort_by_start_time(self):
-        if not self.rows:
-            return
-        def sort_key(row):
-            raw = (row.get("StartTid") or "").strip()
-            parsed = parse_time_hhmm(raw)
-            return (parsed is None, parsed or datetime.max, raw)
-        self.rows.sort(key=sort_key)
-        self.recalc_times()
-        self.refresh_table()
+        self.sort_order = []
+        self.apply_sort([("starttid", False)])
 
     def on_tree_double_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
@@ -1552,15 +4947,25 @@ class App:
             return
         if columns[col_index] != "musikknavn":
             return
-        item_id = self.tree.identify_row(event.y)
-        if not item_id:
+        idx = self.table.index_of(self.tree.identify_row(event.y))
+        if idx is None:
             return
-        values = self.tree.item(item_id, "values")
+        values = self.table_values[idx][0]
         if col_index >= len(values):
             return
         filename = values[col_index]
+        self.begin_play_trace("Dobbeltklikk")
         self.play_mp3_file(filename)
 
+    def ensure_music_cache_dir(self):
+        if not self.music_cache_dir:
+            base = Path(tempfile.gettempdir()) / "fms_gui_music_cache"
+            base.mkdir(parents=True, exist_ok=True)
+            safe_zip = sanitize_filename(self.music_zip.stem)
+            self.music_cache_dir = base / safe_zip
+            self.music_cache_dir.mkdir(parents=True, exist_ok=True)
+        return self.music_cache_dir
+
     def get_cached_mp3_path(self, filename):
         if not filename:
             messagebox.showinfo("Info", "Ingen MP3-fil registrert på denne raden.")
@@ -1568,62 +4973,159 @@ class App:
         if not self.music_zip:
             messagebox.showerror("Feil", "Fant ingen musikk-zip.")
             return None
+        cached = self.music_cache_paths.get(filename)
+        if cached and cached.exists():
+            self.mark_play_trace("MP3 i cache")
+            return cached
         try:
-            with zipfile.ZipFile(self.music_zip, "r") as mz:
-                try:
-                    data = mz.read(filename)
-                except KeyError:
-                    messagebox.showerror("Feil", f"Fant ikke MP3 i zip: {filename}")
-                    return None
+            out_path = extract_music_member(
+                self.music_zip, filename, self.ensure_music_cache_dir()
+            )
+            self.mark_play_trace("Utpakking fra zip")
+        except KeyError:
+            messagebox.showerror("Feil", f"Fant ikke MP3 i zip: {filename}")
+            return None
+        except OSError as exc:
+            messagebox.showerror("Feil", f"Kunne ikke skrive MP3: {exc}")
+            return None
         except Exception as exc:
             messagebox.showerror("Feil", f"Kunne ikke lese musikk-zip: {exc}")
             return None
+        self.music_cache_paths[filename] = out_path
+        return out_path
 
-        if not self.music_cache_dir:
-            base = Path(tempfile.gettempdir()) / "fms_gui_music_cache"
-            base.mkdir(parents=True, exist_ok=True)
-            safe_zip = sanitize_filename(self.music_zip.stem)
-            self.music_cache_dir = base / safe_zip
-            self.music_cache_dir.mkdir(parents=True, exist_ok=True)
+    def begin_play_trace(self, source):
+        self.play_trace = LatencyTrace(source)
 
-        safe_name = sanitize_filename(filename)
-        out_path = self.music_cache_dir / safe_name
-        try:
-            out_path.write_bytes(data)
-        except Exception as exc:
-            messagebox.showerror("Feil", f"Kunne ikke skrive MP3: {exc}")
-            return None
-        return out_path
+    def mark_play_trace(self, name):
+        if self.play_trace:
+            self.play_trace.mark(name)
+
+    def watch_first_audio(self):
+        # Regner lyden som startet når mixeren har spilt noen millisekunder.
+        trace = self.play_trace
+        if not trace:
+            return
+
+        def check():
+            if self.play_trace is not trace:
+                return
+            try:
+                position = self.audio_backend.mixer.music.get_pos()
+            except Exception:
+                position = -1
+            if position > 0:
+                trace.mark("Første lyd")
+                self.finish_play_trace(trace)
+            elif trace.elapsed() > 3.0:
+                self.play_trace = None
+            else:
+                self.root.after(5, check)
+
+        self.root.after(1, check)
+
+    def finish_play_trace(self, trace):
+        self.play_trace = None
+        total = sum(seconds for _, seconds in trace.phases)
+        self.play_latency.add(trace, total)
+        diagnostics.record("Tid til lyd", total)
+        if total >= 1.0:
+            details = ", ".join(f"{name.lower()} {seconds * 1000:.0f}" for name, seconds in trace.phases)
+            self.log(f"Treg oppstart av musikk: {total * 1000:.0f} ms ({details} ms)")
+        self.refresh_diagnostics()
+
+    def prefetch_track(self, filename):
+        if not filename or not self.music_zip or filename in self.music_cache_paths:
+            return
+        music_zip = self.music_zip
+        cache_dir = self.ensure_music_cache_dir()
+
+        def work(log):
+            return extract_music_member(music_zip, filename, cache_dir)
+
+        def done(path):
+            # Kjører i Tk-tråden; bare UI-tråden endrer music_cache_paths.
+            if path and music_zip == self.music_zip:
+                self.music_cache_paths[filename] = path
+
+        self.run_in_background(work, done, lambda exc: None)
+
+    def preinit_audio(self):
+        # Importerer pygame og starter mixeren i bakgrunnen når intern spiller
+        # er valgt, slik at første avspilling ikke betaler for det. Med ekstern
+        # spiller åpnes ikke lydenheten. Hendelseskøen settes opp i UI-tråden
+        # når mixeren er klar.
+        if self.audio_ready:
+            return
+
+        def work(log):
+            with self.audio_init_lock:
+                try:
+                    import pygame
+
+                    pygame.mixer.init()
+                except Exception:
+                    return False
+            return True
+
+        def done(ready):
+            if ready and not self.audio_ready:
+                self.ensure_audio_backend()
+
+        self.run_in_background(work, done)
 
     def ensure_audio_backend(self):
         if self.audio_ready:
             return True
+        with self.audio_init_lock:
+            try:
+                import pygame
+            except Exception:
+                messagebox.showerror(
+                    "Feil",
+                    "For play/pause trengs pygame. Installer med: pip install pygame",
+                )
+                return False
+            try:
+                pygame.mixer.init()
+            except Exception as exc:
+                messagebox.showerror("Feil", f"Kunne ikke starte lyd: {exc}")
+                return False
         try:
-            import pygame
+            # Slutt-på-spor kommer som pygame-hendelse; krever event-køen.
+            pygame.display.init()
+            self.music_end_event = pygame.USEREVENT + 1
+            pygame.mixer.music.set_endevent(self.music_end_event)
         except Exception:
-            messagebox.showerror(
-                "Feil",
-                "For play/pause trengs pygame. Installer med: pip install pygame",
-            )
-            return False
-        try:
-            pygame.mixer.init()
-        except Exception as exc:
-            messagebox.showerror("Feil", f"Kunne ikke starte lyd: {exc}")
-            return False
+            self.music_end_event = None
         self.audio_backend = pygame
         self.audio_ready = True
         return True
 
-    def start_playback(self, path, filename):
+    def start_playback(self, path, filename, start=0.0, row=None):
         if not self.ensure_audio_backend():
+            self.play_trace = None
             return False
-        row = self.find_row_by_mp3(filename)
+        self.mark_play_trace("Lydoppstart")
+        self.cancel_advance()
+        self.remember_position()
+        if row is None:
+            row = self.find_row_by_mp3(filename)
+        self.current_row = row
         self.current_duration = safe_int(row.get("MusikkSek")) if row else 0
+        self.update_queue_hint()
         try:
-            self.audio_backend.mixer.music.load(str(path))
-            self.audio_backend.mixer.music.play()
+            with diagnostics.stage("Avspilling start"):
+                self.audio_backend.mixer.music.load(str(path))
+                self.mark_play_trace("Lasting")
+                self.audio_backend.mixer.music.set_volume(self.track_volume(row))
+                self.audio_backend.mixer.music.play(start=start)
+                self.mark_play_trace("Start")
+            self.clear_music_end_events()
+            self.play_offset = start
+            self.play_started = time.monotonic()
         except Exception as exc:
+            self.play_trace = None
             self.log(f"Kunne ikke spille av med intern avspiller: {exc}")
             try:
                 try:
@@ -1634,6 +5136,7 @@ class App:
                 self.external_playback = True
                 self.is_paused = False
                 self.play_pause_text.set("Spill")
+                self.set_player_state("external")
                 if row:
                     title = row.get("NavnFraIsonen") or row.get("PrintName") or ""
                     self.player_track_var.set(f"{title} - {filename}".strip(" -"))
@@ -1649,9 +5152,16 @@ class App:
         self.is_paused = False
         self.external_playback = False
         self.play_pause_text.set("Pause")
+        self.set_player_state("playing")
+        self.watch_first_audio()
         if row:
             title = row.get("NavnFraIsonen") or row.get("PrintName") or ""
             self.player_track_var.set(f"{title} - {filename}".strip(" -"))
+            upcoming = self.next_queue_row(row)
+            while upcoming is not None and upcoming.get("IsPause"):
+                upcoming = self.next_queue_row(upcoming)
+            if upcoming is not None:
+                self.prefetch_track(upcoming.get("MusikkFil"))
         else:
             self.player_track_var.set(filename)
         self.log(f"Spiller: {filename}")
@@ -1660,13 +5170,16 @@ class App:
     def play_mp3_file(self, filename):
         path = self.get_cached_mp3_path(filename)
         if not path:
+            self.play_trace = None
             return
         if self.use_external_player_var.get():
+            self.play_trace = None
             try:
                 os.startfile(str(path))
                 self.external_playback = True
                 self.is_paused = False
                 self.play_pause_text.set("Spill")
+                self.set_player_state("external")
                 row = self.find_row_by_mp3(filename)
                 if row:
                     title = row.get("NavnFraIsonen") or row.get("PrintName") or ""
@@ -1681,6 +5194,7 @@ class App:
         if self.ensure_audio_backend():
             self.start_playback(path, filename)
             return
+        self.play_trace = None
         try:
             os.startfile(str(path))
             self.log(f"Spiller: {filename}")
@@ -1688,10 +5202,10 @@ class App:
             messagebox.showerror("Feil", f"Kunne ikke starte avspilling: {exc}")
 
     def get_selected_mp3_filename(self):
-        selected = self.tree.selection()
-        if not selected:
+        idx = self.selected_index()
+        if idx is None:
             return ""
-        values = self.tree.item(selected[0], "values")
+        values = self.table_values[idx][0]
         columns = list(self.tree["columns"])
         try:
             col_index = columns.index("musikknavn")
@@ -1716,24 +5230,31 @@ class App:
                 "Spiller i ekstern avspiller. Pause/fortsett er ikke tilgjengelig.",
             )
             return
-        if self.audio_backend.mixer.music.get_busy():
-            if self.is_paused:
-                self.audio_backend.mixer.music.unpause()
-                self.is_paused = False
-                self.play_pause_text.set("Pause")
-                self.log("Fortsetter avspilling.")
-            else:
-                self.audio_backend.mixer.music.pause()
-                self.is_paused = True
-                self.play_pause_text.set("Spill")
-                self.log("Pause.")
+        if self.player_state == "paused":
+            self.audio_backend.mixer.music.unpause()
+            self.play_started = time.monotonic()
+            self.is_paused = False
+            self.play_pause_text.set("Pause")
+            self.set_player_state("playing")
+            self.log("Fortsetter avspilling.")
+            return
+        if self.player_state == "playing":
+            self.audio_backend.mixer.music.pause()
+            self.play_offset = self.playback_elapsed()
+            self.remember_position()
+            self.is_paused = True
+            self.play_pause_text.set("Spill")
+            self.set_player_state("paused")
+            self.log("Pause.")
             return
         filename = self.get_selected_mp3_filename()
         if not filename:
             messagebox.showinfo("Info", "Velg en rad med MP3-fil først.")
             return
+        self.begin_play_trace("Spill-knapp")
         path = self.get_cached_mp3_path(filename)
         if not path:
+            self.play_trace = None
             return
         self.start_playback(path, filename)
 
@@ -1743,10 +5264,13 @@ class App:
             return
         if not self.ensure_audio_backend():
             return
+        self.cancel_advance()
+        self.remember_position()
         self.audio_backend.mixer.music.stop()
         self.is_paused = False
         self.external_playback = False
         self.play_pause_text.set("Spill")
+        self.set_player_state("stopped")
         self.log("Stoppet avspilling.")
 
     def find_row_by_mp3(self, filename):
@@ -1755,75 +5279,282 @@ class App:
                 return row
         return None
 
-    def update_player_ui(self):
-        if self.external_playback:
+    def set_player_state(self, state):
+        self.player_state = state
+        self.schedule_live_publish()
+        if self.player_tick_job is not None:
+            self.root.after_cancel(self.player_tick_job)
+            self.player_tick_job = None
+        if state != "paused":
+            self.player_shown = None
+        if state == "playing":
+            self.update_player_ui()
+        elif state == "stopped":
+            self.render_player_progress(0)
+        elif state == "external":
             self.player_progress.config(maximum=1, value=0)
-            self.root.after(500, self.update_player_ui)
+
+    def playback_elapsed(self):
+        # get_pos() nullstilles ved play(start=...) og teller ikke spoling,
+        # så tiden holdes som monoton klokke pluss posisjon ved siste start.
+        if self.player_state == "playing":
+            elapsed = self.play_offset + (time.monotonic() - self.play_started)
+        elif self.player_state == "paused":
+            elapsed = self.play_offset
+        else:
+            return 0.0
+        if self.current_duration:
+            elapsed = min(elapsed, self.current_duration)
+        return elapsed
+
+    def track_volume(self, row):
+        # Mikseren kan bare dempe, så sterke spor tas ned mot målnivået.
+        gain = row.get("MusikkGainDb") if row else ""
+        if gain == "" or gain is None:
+            return 1.0
+        return min(1.0, 10 ** (float(gain) / 20))
+
+    def remember_position(self):
+        if self.current_track and self.player_state in ("playing", "paused"):
+            self.last_positions[self.current_track] = self.playback_elapsed()
+
+    def seek_to(self, seconds):
+        if self.player_state not in ("playing", "paused") or not self.current_track:
             return
-        elapsed = 0
-        if self.audio_ready:
-            pos_ms = self.audio_backend.mixer.music.get_pos()
-            if pos_ms and pos_ms > 0:
-                elapsed = pos_ms / 1000.0
+        seconds = max(0.0, seconds)
+        if self.current_duration:
+            seconds = min(seconds, max(0.0, self.current_duration - 1))
+        paused = self.player_state == "paused"
+        try:
+            self.audio_backend.mixer.music.play(start=seconds)
+            if paused:
+                self.audio_backend.mixer.music.pause()
+        except Exception as exc:
+            self.log(f"Kunne ikke spole: {exc}")
+            return
+        self.clear_music_end_events()
+        self.play_offset = seconds
+        self.play_started = time.monotonic()
+        self.last_positions[self.current_track] = seconds
+        self.set_player_state("paused" if paused else "playing")
+        self.player_shown = None
+        self.render_player_progress(seconds)
+
+    def on_progress_click(self, event):
+        width = self.player_progress.winfo_width()
+        if width <= 0 or not self.current_duration:
+            return
+        self.seek_to(self.current_duration * min(1.0, max(0.0, event.x / width)))
+
+    def resume_selected(self):
+        if self.use_external_player_var.get():
+            messagebox.showinfo("Info", "Bruker ekstern avspiller. Fortsett er ikke tilgjengelig.")
+            return
+        filename = self.get_selected_mp3_filename()
+        if not filename or filename == "mangler musikk":
+            messagebox.showinfo("Info", "Velg en rad med MP3-fil først.")
+            return
+        if filename == self.current_track and self.player_state in ("playing", "paused"):
+            position = self.playback_elapsed()
+        else:
+            position = self.last_positions.get(filename, 0.0)
+        self.begin_play_trace("Fortsett fra sist")
+        path = self.get_cached_mp3_path(filename)
+        if not path:
+            self.play_trace = None
+            return
+        if self.start_playback(path, filename, start=position) and not self.external_playback:
+            self.log(f"Fortsetter fra {format_duration(int(position))}: {filename}")
+
+    def clear_music_end_events(self):
+        if self.music_end_event is None:
+            return
+        try:
+            self.audio_backend.event.clear(self.music_end_event)
+        except Exception:
+            pass
+
+    def music_ended(self):
+        if self.music_end_event is not None:
+            try:
+                return bool(self.audio_backend.event.get(self.music_end_event))
+            except Exception:
+                pass
+        return not self.audio_backend.mixer.music.get_busy()
+
+    def render_player_progress(self, elapsed):
         duration = self.current_duration or 0
+        shown = (int(elapsed), duration)
+        if shown == self.player_shown:
+            return
+        self.player_shown = shown
         if duration > 0:
             self.player_progress.config(maximum=duration, value=min(elapsed, duration))
-            elapsed_text = format_duration(elapsed)
+            elapsed_text = format_duration(int(elapsed))
             total_text = format_duration(duration)
             self.player_time_var.set(f"{elapsed_text} / {total_text}")
         else:
             self.player_progress.config(maximum=1, value=0)
             self.player_time_var.set("0:00 / 0:00")
-        self.root.after(500, self.update_player_ui)
+
+    def update_player_ui(self):
+        # Tikker bare mens et spor spiller, og vekker seg ved neste hele sekund.
+        self.player_tick_job = None
+        if self.player_state != "playing" or not self.audio_ready:
+            return
+        if self.music_ended():
+            self.on_track_end()
+            return
+        elapsed = self.playback_elapsed()
+        self.last_positions[self.current_track] = elapsed
+        self.render_player_progress(elapsed)
+        delay = 1000 - int(elapsed * 1000) % 1000
+        if self.auto_advance_var.get() and self.current_duration - elapsed < 1.5:
+            # Tettere sjekk mot slutten så neste spor starter uten hull.
+            delay = 90
+        self.player_tick_job = self.root.after(delay + 10, self.update_player_ui)
+
+    def on_track_end(self):
+        self.last_positions.pop(self.current_track, None)
+        self.is_paused = False
+        self.play_pause_text.set("Spill")
+        self.set_player_state("stopped")
+        if self.current_track:
+            self.log(f"Ferdig avspilt: {self.current_track}")
+        if self.auto_advance_var.get() and self.current_row is not None:
+            self.begin_advance(self.current_row)
+
+    def update_queue_hint(self):
+        # Husker hvor ankerraden sist stod. Slettes den, står raden etter
+        # den nå på samme indeks.
+        anchor = self.advance_anchor if self.advance_anchor is not None else self.current_row
+        idx = next((i for i, row in enumerate(self.rows) if row is anchor), None)
+        if idx is not None:
+            self.queue_hint = idx
+
+    def next_queue_row(self, after_row, hint=None):
+        # Neste rad følger self.rows slik den ser ut nå, så flytting i
+        # listen under avspilling slår direkte inn. Finnes ikke raden lenger,
+        # fortsetter vi fra nærmeste følgende indeks (hint).
+        idx = next((i for i, row in enumerate(self.rows) if row is after_row), None)
+        if idx is None:
+            if hint is None:
+                return None
+            start = hint
+        else:
+            start = idx + 1
+        for row in self.rows[start:]:
+            if row.get("IsPause") or row.get("MusikkFil"):
+                return row
+        return None
+
+    def on_auto_advance_toggle(self):
+        if not self.auto_advance_var.get():
+            self.cancel_advance()
+
+    def cancel_advance(self):
+        if self.advance_job is not None:
+            self.root.after_cancel(self.advance_job)
+            self.advance_job = None
+        self.advance_anchor = None
+        self.advance_target = None
+
+    def begin_advance(self, anchor):
+        self.cancel_advance()
+        self.advance_anchor = anchor
+        self.update_queue_hint()
+        self.advance_tick()
+
+    def advance_tick(self):
+        self.advance_job = None
+        target = self.next_queue_row(self.advance_anchor, self.queue_hint)
+        if target is None:
+            self.advance_anchor = None
+            self.advance_target = None
+            self.player_track_var.set("Slutt på startlisten")
+            self.log("Auto neste: slutt på startlisten.")
+            return
+        if target is not self.advance_target:
+            self.advance_target = target
+            if target.get("IsPause"):
+                self.advance_remaining = safe_int(target.get("PauseSek"))
+            else:
+                self.advance_remaining = max(0, safe_int(self.countdown_var.get().strip()))
+                self.prefetch_track(target.get("MusikkFil"))
+        if self.advance_remaining <= 0:
+            if target.get("IsPause"):
+                self.advance_anchor = target
+                self.advance_target = None
+                self.update_queue_hint()
+                self.advance_tick()
+                return
+            self.advance_anchor = None
+            self.advance_target = None
+            self.play_queue_row(target)
+            return
+        name = target.get("NavnFraIsonen") or target.get("PrintName") or ""
+        remaining = format_duration(self.advance_remaining)
+        if target.get("IsPause"):
+            self.player_track_var.set(f"Pause: {name}")
+            self.player_time_var.set(f"{remaining} igjen")
+        else:
+            self.player_track_var.set(f"Neste: {name}")
+            self.player_time_var.set(f"Starter om {remaining}")
+        self.advance_remaining -= 1
+        self.advance_job = self.root.after(1000, self.advance_tick)
+
+    def play_queue_row(self, row):
+        filename = row.get("MusikkFil", "")
+        self.begin_play_trace("Neste i køen")
+        path = self.get_cached_mp3_path(filename)
+        if not path:
+            self.play_trace = None
+            return
+        if self.start_playback(path, filename, row=row):
+            idx = next((i for i, r in enumerate(self.rows) if r is row), None)
+            if idx is not None:
+                self.select_index(idx)
 
     def on_use_external_player_toggle(self):
         if self.use_external_player_var.get():
             self.external_playback = True
+            self.set_player_state("external")
             self.player_time_var.set("Ekstern avspiller")
+            self.log("Lydnivåjustering gjelder bare den innebygde spilleren.")
             self.btn_player_play_pause.config(state="disabled")
             self.btn_player_stop.config(state="disabled")
+            self.btn_player_resume.config(state="disabled")
         else:
             self.external_playback = False
-            self.player_time_var.set("0:00 / 0:00")
+            self.set_player_state("stopped")
+            self.preinit_audio()
             if self.rows:
                 self.btn_player_play_pause.config(state="normal")
                 self.btn_player_stop.config(state="normal")
+                self.btn_player_resume.config(state="normal")
     
     def row_key(self, row):
-        code = (row.get("ParticipantCode") or "").strip()
-        if code:
-            return f"code:{code}"
-        given = (row.get("GivenName") or "").strip()
-        family = (row.get("FamilyName") or "").strip()
-        event = (row.get("Event") or "").strip()
-        return f"name:{given}|{family}|{event}"
+        return order_row_key(row)
 
     def move_selected(self, delta):
-        selected = self.tree.selection()
-        if not selected:
+        idx = self.selected_index()
+        if idx is None:
             messagebox.showinfo("Info", "Velg en linje i tabellen først.")
             return
         if len(self.rows) < 2:
             return
-        idx = self.tree.index(selected[0])
         new_idx = idx + delta
         if new_idx < 0 or new_idx >= len(self.rows):
             return
-        self.rows[idx], self.rows[new_idx] = self.rows[new_idx], self.rows[idx]
-        self.recalc_times()
-        self.refresh_table()
-        new_item = self.tree.get_children()[new_idx]
-        self.tree.selection_set(new_item)
-        self.tree.see(new_item)
+        self.apply_edit(("swap", idx, new_idx), select=new_idx)
 
     def delete_selected(self):
-        selected = self.tree.selection()
-        if not selected:
+        idx = self.selected_index()
+        if idx is None:
             messagebox.showinfo("Info", "Velg en linje i tabellen først.")
             return
         if not self.rows:
             return
-        idx = self.tree.index(selected[0])
         if idx < 0 or idx >= len(self.rows):
             return
         row = self.rows[idx]
@@ -1834,18 +5565,11 @@ class App:
             prompt = "Slette valgt deltaker?"
         if not messagebox.askyesno("Bekreft sletting", prompt):
             return
-        del self.rows[idx]
+        self.apply_edit(("remove", idx, row), select=idx)
         if navn:
             self.log(f"Slettet deltaker: {navn}")
         else:
             self.log("Slettet deltaker.")
-        self.recalc_times()
-        self.refresh_table()
-        if self.rows:
-            new_idx = min(idx, len(self.rows) - 1)
-            new_item = self.tree.get_children()[new_idx]
-            self.tree.selection_set(new_item)
-            self.tree.see(new_item)
 
     def add_pause(self):
         if not self.rows:
@@ -1868,64 +5592,19 @@ class App:
         if not pause_seconds:
             messagebox.showerror("Feil", "Ugyldig pause-varighet. Bruk M:SS eller H:MM:SS.")
             return
-        row = {
-            "StartTid": "",
-            "SluttTid": "",
-            "NavnFraIsonen": pause_type,
-            "NavnFraFsm": pause_type,
-            "Organisation": "",
-            "Påmelding": "",
-            "MusikkFil": "",
-            "MusikkTid": "",
-            "PrintName": pause_type,
-            "GivenName": "",
-            "FamilyName": "",
-            "Gender": "",
-            "ParticipantCode": "",
-            "Event": "",
-            "EntryOrder": "",
-            "Music1": "",
-            "Music2": "",
-            "Club1": "",
-            "Club2": "",
-            "ElementsFree": [],
-            "ElementsShort": [],
-            "Musikk": "",
-            "MusikkSek": "",
-            "Manglende i zip": "",
-            "IsPause": True,
-            "PauseSek": pause_seconds,
-        }
-        self.rows.insert(0, row)
+        row = make_pause_row(pause_type, pause_seconds)
+        self.apply_edit(("insert", 0, row), select=0)
         self.log(f"La til pause: {pause_type}")
-        self.recalc_times()
-        self.refresh_table()
-        if self.rows:
-            new_item = self.tree.get_children()[0]
-            self.tree.selection_set(new_item)
-            self.tree.see(new_item)
 
     def on_delete_key(self, event):
         self.delete_selected()
 
     def recalc_times(self):
-        if not self.rows:
-            return
-        start_dt = parse_time_hhmm(self.start_time_var.get())
-        if not start_dt:
-            return
-        interval_seconds = parse_duration_mmss(self.interval_var.get())
-        if not interval_seconds:
-            return
-        current_dt = start_dt
-        for row in self.rows:
-            row["StartTid"] = current_dt.strftime("%H:%M:%S")
-            if row.get("IsPause"):
-                pause_seconds = row.get("PauseSek") or 0
-                current_dt = current_dt + timedelta(seconds=pause_seconds)
-            else:
-                current_dt = current_dt + timedelta(seconds=interval_seconds)
-            row["SluttTid"] = current_dt.strftime("%H:%M:%S")
+        with diagnostics.stage("Tider"):
+            self.recalc_row_times()
+
+    def recalc_row_times(self):
+        assign_row_times(self.rows, self.start_time_var.get(), self.interval_var.get())
 
     def on_time_settings_change(self, *args):
         if not self.rows:
@@ -1942,9 +5621,9 @@ class App:
     def shuffle_rows(self):
         if not self.rows:
             return
-        random.shuffle(self.rows)
-        self.recalc_times()
-        self.refresh_table()
+        perm = array("I", range(len(self.rows)))
+        random.shuffle(perm)
+        self.apply_edit(("permute", perm))
 
     def save_order(self):
         if not self.rows:
@@ -1966,21 +5645,7 @@ class App:
         )
         if not path:
             return
-        order = []
-        for row in self.rows:
-            if row.get("IsPause"):
-                label = row.get("NavnFraIsonen") or row.get("NavnFraFsm") or "Pause"
-                order.append(
-                    {
-                        "type": "pause",
-                        "label": label,
-                        "seconds": row.get("PauseSek") or 0,
-                        "start": row.get("StartTid", ""),
-                        "end": row.get("SluttTid", ""),
-                    }
-                )
-            else:
-                order.append({"type": "row", "key": self.row_key(row)})
+        order = build_order(self.rows, self.row_key)
         data = {
             "version": 2,
             "created": datetime.now().isoformat(timespec="seconds"),
@@ -1992,6 +5657,12 @@ class App:
             self.log(f"Lagret rekkefølge: {path}")
         except Exception as exc:
             messagebox.showerror("Feil", f"Kunne ikke lagre rekkefølge: {exc}")
+            return
+        if self.store and self.zip_path:
+            try:
+                self.store.save_order(self.zip_path, order, path)
+            except sqlite3.Error as exc:
+                self.log(f"Kunne ikke lagre rekkefølge i lokalt lager: {exc}")
 
     def load_order(self):
         if not self.rows:
@@ -2012,96 +5683,26 @@ class App:
         if not order or not isinstance(order, list):
             messagebox.showerror("Feil", "Ugyldig rekkefølge-fil.")
             return
-        buckets = {}
-        for row in self.rows:
-            if row.get("IsPause"):
-                continue
-            key = self.row_key(row)
-            buckets.setdefault(key, []).append(row)
-        new_rows = []
-        for item in order:
-            if isinstance(item, dict) and item.get("type") == "pause":
-                label = (item.get("label") or "Pause").strip()
-                pause_seconds = item.get("seconds") or 0
-                pause_row = {
-                    "StartTid": "",
-                    "SluttTid": "",
-                    "NavnFraIsonen": label,
-                    "NavnFraFsm": label,
-                    "Organisation": "",
-                    "Påmelding": "",
-                    "MusikkFil": "",
-                    "MusikkTid": "",
-                    "PrintName": label,
-                    "GivenName": "",
-                    "FamilyName": "",
-                    "Gender": "",
-                    "ParticipantCode": "",
-                    "Event": "",
-                    "EntryOrder": "",
-                    "Music1": "",
-                    "Music2": "",
-                    "Club1": "",
-                    "Club2": "",
-                    "ElementsFree": [],
-                    "ElementsShort": [],
-                    "Musikk": "",
-                    "MusikkSek": "",
-                    "Manglende i zip": "",
-                    "IsPause": True,
-                    "PauseSek": pause_seconds,
-                }
-                new_rows.append(pause_row)
-                continue
-            if isinstance(item, dict) and item.get("type") == "row":
-                key = item.get("key")
-            else:
-                key = item
-            bucket = buckets.get(key)
-            if bucket:
-                new_rows.append(bucket.pop(0))
-        for bucket in buckets.values():
-            new_rows.extend(bucket)
-        self.rows = new_rows
-        self.recalc_times()
-        self.refresh_table()
+        new_rows, missing_keys, unplaced = restore_order(self.rows, order, self.row_key)
+        self.apply_edit(("replace", new_rows))
         self.log(f"Lastet rekkefølge: {path}")
-
-    def match_music_file(self, row, music_files, used_files):
-        given = row.get("GivenName")
-        family = row.get("FamilyName")
-        given_tokens = tokenize_name(given)
-        family_tokens = tokenize_name(family)
-        if not family_tokens:
-            return ""
-
-        def family_match(fname):
-            hay = normalize_text(fname)
-            return all(token in hay for token in family_tokens) or family_tokens[0] in hay
-
-        def given_match(fname):
-            if not given_tokens:
-                return False
-            hay = normalize_text(fname)
-            return given_tokens[0] in hay
-
-        # Pass 1: require both family + given (if given exists), prefer unused.
-        if given_tokens:
-            for fname in music_files:
-                if fname in used_files:
-                    continue
-                if family_match(fname) and given_match(fname):
-                    used_files.add(fname)
-                    return fname
-
-        # Pass 2: family-only fallback, prefer unused.
-        for fname in music_files:
-            if fname in used_files:
-                continue
-            if family_match(fname):
-                used_files.add(fname)
-                return fname
-        return ""
+        if missing_keys:
+            self.log(f"Fant ikke {len(missing_keys)} lagrede deltakere:")
+            for key in missing_keys:
+                self.log(f"- {key}")
+        if unplaced:
+            self.log(f"{len(unplaced)} deltakere var ikke i filen og er lagt til sist:")
+            for row in unplaced:
+                self.log(f"- {row.get('NavnFraIsonen') or row.get('NavnFraFsm') or row.get('PrintName', '')}")
+
+    def get_fuzzy_threshold(self):
+        raw = self.fuzzy_threshold_var.get().strip().replace(",", ".")
+        try:
+            value = float(raw)
+        except ValueError:
+            self.log(f"Ugyldig navnelikhet '{raw}', bruker 0.85.")
+            return 0.85
+        return min(1.0, max(0.5, value))
 
     def generate_files(self):
         if not self.rows or not self.zip_path:
@@ -2112,15 +5713,25 @@ class App:
         out_dir.mkdir(parents=True, exist_ok=True)
         base_name = self.zip_path.stem
 
-        if self.var_excel.get():
-            generate_excel(self.rows, str(out_dir / f"{base_name}.xlsx"), self.log)
-        if self.var_html.get():
-            generate_html(
-                self.rows, str(out_dir / f"{base_name}.html"), base_name, self.log
-            )
-        if self.var_pdf.get():
-            generate_pdf(self.rows, str(out_dir / f"{base_name}.pdf"), base_name, self.log)
+        def write():
+            if self.var_excel.get():
+                with diagnostics.stage("Rapport Excel"):
+                    generate_excel(self.rows, str(out_dir / f"{base_name}.xlsx"), self.log)
+            if self.var_html.get():
+                with diagnostics.stage("Rapport HTML"):
+                    generate_html(
+                        self.rows,
+                        str(out_dir / f"{base_name}.html"),
+                        base_name,
+                        self.log,
+                        compact=self.var_html_compact.get(),
+                    )
+            if self.var_pdf.get():
+                with diagnostics.stage("Rapport PDF"):
+                    generate_pdf(self.rows, str(out_dir / f"{base_name}.pdf"), base_name, self.log)
 
+        with diagnostics.run("Rapporter"):
+            self.run_profiled("rapporter", write)
         self.log("Ferdig.")
 
     def generate_startliste(self):
@@ -2209,14 +5820,38 @@ class App:
         out_dir = self.zip_path.parent / "output"
         out_dir.mkdir(parents=True, exist_ok=True)
         base_name = self.zip_path.stem
-        generate_startliste_excel(
-            entries, str(out_dir / f"Startliste_{base_name}.xlsx"), title, self.log
-        )
-        generate_startliste_pdf(
-            entries, str(out_dir / f"Startliste_{base_name}.pdf"), title, self.log
-        )
-        if self.playlist_var.get():
-            generate_vlc_playlist(filtered, out_dir, base_name, self.music_zip, self.log)
+
+        sections = split_startliste(entries) if self.split_startliste_var.get() else None
+
+        def write():
+            with diagnostics.stage("Startliste Excel"):
+                generate_startliste_excel(
+                    entries,
+                    str(out_dir / f"Startliste_{base_name}.xlsx"),
+                    title,
+                    self.log,
+                    sections=sections,
+                )
+            with diagnostics.stage("Startliste PDF"):
+                generate_startliste_pdf(
+                    entries, str(out_dir / f"Startliste_{base_name}.pdf"), title, self.log
+                )
+            if sections:
+                with diagnostics.stage("Startliste PDF per seksjon"):
+                    written = generate_startliste_pdfs(
+                        sections,
+                        out_dir / f"Startliste_{base_name}",
+                        title,
+                        self.log,
+                        max_workers=max(1, min(4, os.cpu_count() or 1)),
+                    )
+                self.log(f"Skrev {written} av {len(sections)} PDF-er per klasse og gruppe.")
+            if self.playlist_var.get():
+                with diagnostics.stage("Spilleliste"):
+                    generate_vlc_playlist(filtered, out_dir, base_name, self.music_zip, self.log)
+
+        with diagnostics.run("Startliste"):
+            self.run_profiled("startliste", write)
         self.log("Startliste ferdig.")
 
     def generate_playlist_only(self):
@@ -2237,16 +5872,89 @@ class App:
         out_dir = self.zip_path.parent / "output"
         out_dir.mkdir(parents=True, exist_ok=True)
         base_name = self.zip_path.stem
-        generate_vlc_playlist(filtered, out_dir, base_name, self.music_zip, self.log)
+        with diagnostics.run("Spilleliste"), diagnostics.stage("Spilleliste"):
+            self.run_profiled(
+                "spilleliste",
+                lambda: generate_vlc_playlist(filtered, out_dir, base_name, self.music_zip, self.log),
+            )
         self.show_folder_link(out_dir, "Spilleliste ferdig")
 
-    def show_folder_link(self, folder_path, title):
+    def show_participant_history(self):
+        idx = self.selected_index()
+        if idx is None or self.rows[idx].get("IsPause"):
+            messagebox.showinfo("Info", "Velg en utøver i tabellen først.")
+            return
+        if not self.store:
+            messagebox.showerror("Feil", "Lokalt lager er ikke tilgjengelig.")
+            return
+        row = self.rows[idx]
+        name = row.get("NavnFraIsonen") or row.get("NavnFraFsm") or row.get("PrintName", "")
+        try:
+            history = self.store.participant_history(row, exclude_zip=self.zip_path)
+        except sqlite3.Error as exc:
+            messagebox.showerror("Feil", f"Kunne ikke lese lokalt lager: {exc}")
+            return
+        if not history:
+            self.log(f"Fant ingen tidligere stevner for {name}.")
+            return
+        self.log(f"Tidligere stevner for {name}:")
+        for comp, scanned_at, event, club, music_file, duration, lufs in history:
+            details = [scanned_at[:10], event or "-", club or "-"]
+            if music_file:
+                details.append(music_file)
+            if duration:
+                details.append(format_duration(duration))
+            if lufs is not None:
+                details.append(f"{lufs:.1f} LUFS")
+            self.log(f"- {comp}: " + ", ".join(details))
+
+    def run_batch_dialog(self):
+        path = filedialog.askdirectory(
+            initialdir=self.folder_var.get(), title="Velg rotmappe med stevner"
+        )
+        if not path:
+            return
+        outputs = set()
+        if self.var_excel.get():
+            outputs.add("excel")
+        if self.var_html.get():
+            outputs.add("html")
+            if self.var_html_compact.get():
+                outputs.add("html_compact")
+        if self.var_pdf.get():
+            outputs.add("pdf")
+        threshold = self.get_fuzzy_threshold()
+        times = (self.start_time_var.get(), self.interval_var.get())
+        workers = max(1, min(4, os.cpu_count() or 1))
+        self.log(f"Starter batch i {path}.")
+
+        def done(result):
+            summaries, report_path = result
+            if report_path:
+                failed = sum(1 for item in summaries if item["status"] != "ok")
+                self.log(f"Batch ferdig: {len(summaries)} stevner, {failed} med feil.")
+                self.show_folder_link(report_path.parent, "Batch ferdig", "Batchresultat lagret i:")
+
+        self.run_in_background(
+            lambda log: run_batch(
+                path,
+                outputs,
+                log,
+                times,
+                max_workers=workers,
+                music_info=self.music_info,
+                fuzzy_threshold=threshold,
+            ),
+            done,
+        )
+
+    def show_folder_link(self, folder_path, title, label="Spilleliste lagret i:"):
         win = tk.Toplevel(self.root)
         win.title(title)
         win.resizable(False, False)
         frame = ttk.Frame(win, padding=12)
         frame.pack(fill="both", expand=True)
-        ttk.Label(frame, text="Spilleliste lagret i:").pack(anchor="w")
+        ttk.Label(frame, text=label).pack(anchor="w")
         path_text = str(folder_path)
         link = ttk.Label(frame, text=path_text, foreground="#005a9e", cursor="hand2")
         link.pack(anchor="w", pady=(4, 8))
@@ -2263,6 +5971,126 @@ class App:
         ttk.Button(btns, text="Åpne mappe", command=open_folder).pack(side="right")
         ttk.Button(btns, text="Lukk", command=win.destroy).pack(side="right", padx=(0, 6))
 
+    def show_diagnostics(self):
+        if self.diagnostics_window and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            self.refresh_diagnostics()
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Diagnostikk")
+        win.geometry("640x720")
+        self.diagnostics_window = win
+
+        runs_frame = ttk.Labelframe(win, text="Siste kjøring")
+        runs_frame.pack(fill="both", expand=True, padx=8, pady=(8, 4))
+        self.diag_runs = ttk.Treeview(runs_frame, columns=("tid", "andel"), show="tree headings", height=10)
+        self.diag_runs.heading("#0", text="Steg")
+        self.diag_runs.heading("tid", text="Tid (ms)")
+        self.diag_runs.heading("andel", text="Andel")
+        self.diag_runs.column("#0", width=300)
+        self.diag_runs.column("tid", width=100, anchor="e")
+        self.diag_runs.column("andel", width=80, anchor="e")
+        self.diag_runs.pack(fill="both", expand=True, padx=4, pady=4)
+
+        totals_frame = ttk.Labelframe(win, text="Alle målinger i økten")
+        totals_frame.pack(fill="both", expand=True, padx=8, pady=4)
+        columns = ("antall", "siste", "snitt", "maks")
+        self.diag_totals = ttk.Treeview(totals_frame, columns=columns, show="tree headings", height=8)
+        self.diag_totals.heading("#0", text="Steg / teller")
+        self.diag_totals.column("#0", width=220)
+        for col, label in zip(columns, ("Antall", "Siste (ms)", "Snitt (ms)", "Maks (ms)")):
+            self.diag_totals.heading(col, text=label)
+            self.diag_totals.column(col, width=90, anchor="e")
+        self.diag_totals.pack(fill="both", expand=True, padx=4, pady=4)
+
+        latency_frame = ttk.Labelframe(win, text="Tid til lyd i økten")
+        latency_frame.pack(fill="both", expand=True, padx=8, pady=4)
+        self.diag_latency_var = tk.StringVar(value="")
+        ttk.Label(latency_frame, textvariable=self.diag_latency_var, justify="left").pack(
+            anchor="w", padx=4, pady=(4, 0)
+        )
+        self.diag_latency = ttk.Treeview(
+            latency_frame, columns=("antall", "fordeling"), show="tree headings", height=7
+        )
+        self.diag_latency.heading("#0", text="Intervall")
+        self.diag_latency.heading("antall", text="Antall")
+        self.diag_latency.heading("fordeling", text="Fordeling")
+        self.diag_latency.column("#0", width=120)
+        self.diag_latency.column("antall", width=70, anchor="e")
+        self.diag_latency.column("fordeling", width=360)
+        self.diag_latency.pack(fill="both", expand=True, padx=4, pady=4)
+
+        buttons = ttk.Frame(win)
+        buttons.pack(fill="x", padx=8, pady=(4, 8))
+        ttk.Checkbutton(
+            buttons,
+            text="Profiler neste skann/rapport (cProfile + tracemalloc til output)",
+            variable=self.profile_next_var,
+        ).pack(side="left")
+        ttk.Button(buttons, text="Nullstill", command=self.reset_diagnostics).pack(side="right")
+        ttk.Button(buttons, text="Oppdater", command=self.refresh_diagnostics).pack(side="right", padx=4)
+        self.refresh_diagnostics()
+
+    def reset_diagnostics(self):
+        diagnostics.reset()
+        self.play_latency = LatencyHistogram()
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        if not self.diagnostics_window or not self.diagnostics_window.winfo_exists():
+            return
+        stats, counters, runs = diagnostics.snapshot()
+        self.diag_runs.delete(*self.diag_runs.get_children())
+        for run in sorted(runs.values(), key=lambda r: r["started"], reverse=True):
+            total = run["total"]
+            parent = self.diag_runs.insert(
+                "",
+                "end",
+                text=f"{run['name']} ({run['started'].strftime('%H:%M:%S')})",
+                values=(f"{total * 1000:.1f}", "100 %"),
+                open=True,
+            )
+            for name, seconds in run["stages"]:
+                share = f"{seconds / total * 100:.0f} %" if total else ""
+                self.diag_runs.insert(parent, "end", text=name, values=(f"{seconds * 1000:.1f}", share))
+            for name, value in sorted(run["counters"].items()):
+                self.diag_runs.insert(parent, "end", text=f"{name}: {value}", values=("", ""))
+        self.diag_totals.delete(*self.diag_totals.get_children())
+        for name, (calls, total, longest, last) in sorted(stats.items()):
+            self.diag_totals.insert(
+                "",
+                "end",
+                text=name,
+                values=(
+                    calls,
+                    f"{last * 1000:.1f}",
+                    f"{total / calls * 1000:.1f}",
+                    f"{longest * 1000:.1f}",
+                ),
+            )
+        for name, value in sorted(counters.items()):
+            self.diag_totals.insert("", "end", text=name, values=(value, "", "", ""))
+
+        latency = self.play_latency
+        self.diag_latency.delete(*self.diag_latency.get_children())
+        if not latency.samples:
+            self.diag_latency_var.set("Ingen avspillinger målt ennå.")
+            return
+        count = len(latency.samples)
+        summary = (
+            f"{count} avspillinger. Median {latency.percentile(0.5):.0f} ms, "
+            f"95-persentil {latency.percentile(0.95):.0f} ms, maks {max(latency.samples):.0f} ms."
+        )
+        averages = ", ".join(
+            f"{name.lower()} {total / count * 1000:.0f}" for name, total in latency.phase_totals.items()
+        )
+        source, last_ms, _ = latency.last
+        self.diag_latency_var.set(f"{summary}\nSnitt per steg (ms): {averages}\nSiste: {source}, {last_ms:.0f} ms")
+        widest = max(latency.counts)
+        for label, bucket in zip(latency.bucket_labels(), latency.counts):
+            bar = "#" * round(bucket / widest * 40) if widest else ""
+            self.diag_latency.insert("", "end", text=label, values=(bucket, bar))
+
     def show_about(self):
         version = get_version()
 
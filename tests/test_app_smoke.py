@@ -0,0 +1,42 @@
+from unittest import mock
+
+import fsm_gui as fsm
+
+
+def make_app():
+    with mock.patch.multiple(
+        fsm,
+        tk=mock.MagicMock(),
+        ttk=mock.MagicMock(),
+        ScrolledText=mock.MagicMock(),
+        messagebox=mock.MagicMock(),
+        filedialog=mock.MagicMock(),
+        CompetitionStore=mock.MagicMock(),
+    ):
+        return fsm.App(mock.MagicMock())
+
+
+def widget(class_name):
+    item = mock.MagicMock()
+    item.winfo_class.return_value = class_name
+    return item
+
+
+def test_app_builds_with_mocked_tk():
+    app = make_app()
+    assert app.live_var is not None
+    assert app.rows == []
+
+
+def test_undo_keys_are_ignored_in_text_inputs():
+    app = make_app()
+    app.undo_edit = mock.MagicMock()
+    app.redo_edit = mock.MagicMock()
+    app.on_undo_key(mock.MagicMock(widget=widget("TEntry")))
+    app.on_redo_key(mock.MagicMock(widget=widget("TSpinbox")))
+    assert not app.undo_edit.called
+    assert not app.redo_edit.called
+    app.on_undo_key(mock.MagicMock(widget=widget("Treeview")))
+    app.on_redo_key(mock.MagicMock(widget=widget("Treeview")))
+    assert app.undo_edit.called
+    assert app.redo_edit.called
@@ -0,0 +1,43 @@
+import fsm_gui as fsm
+
+
+def test_middle_name_or_double_surname_matches():
+    assert fsm.name_similarity("anna berg", "anna hansen berg") >= 0.95
+    assert fsm.name_similarity("anna berg", "anna marie berg") >= 0.95
+
+
+def test_different_last_surname_does_not_get_subset_boost():
+    assert fsm.name_similarity("anna hansen", "anna hansen berg") < 0.85
+
+
+def test_single_token_does_not_get_subset_boost():
+    assert fsm.name_similarity("anna", "anna hansen") < 0.85
+
+
+def test_fuzzy_match_people_prefers_same_club():
+    rows = [{"GivenName": "Anna", "FamilyName": "Berg", "Organisation": "OSK"}]
+    candidates = {
+        "a": {"GivenName": "Anna", "FamilyName": "Hansen Berg", "Organisation": "BSK"},
+        "b": {"GivenName": "Anna", "FamilyName": "Hansen-Berg", "Organisation": "OSK"},
+    }
+    matches = fsm.fuzzy_match_people(rows, candidates)
+    assert [(key, club) for _, key, _, club in matches] == [("b", True)]
+
+
+def test_fuzzy_match_people_rejects_extra_surname():
+    rows = [{"GivenName": "Anna", "FamilyName": "Hansen"}]
+    candidates = {"a": {"GivenName": "Anna", "FamilyName": "Hansen Berg"}}
+    assert fsm.fuzzy_match_people(rows, candidates) == []
+
+
+def test_title_match_assigns_strong_and_suggests_weak():
+    rows = [
+        {"Music1": "Swan Lake", "Music2": ""},
+        {"Music1": "Bolero Ravel", "Music2": ""},
+    ]
+    files = ["01_swan_lake.mp3", "02_bolo.mp3"]
+    used = set()
+    matches, suggestions = fsm.match_music_by_titles(rows, files, used, {})
+    assert [(row["Music1"], fname) for row, fname, _ in matches] == [("Swan Lake", "01_swan_lake.mp3")]
+    assert used == {"01_swan_lake.mp3"}
+    assert all(score < 0.7 for _, _, score in suggestions)
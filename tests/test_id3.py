@@ -0,0 +1,50 @@
+from io import BytesIO
+
+import fsm_gui as fsm
+
+
+def syncsafe(value):
+    return bytes([(value >> shift) & 0x7F for shift in (21, 14, 7, 0)])
+
+
+def id3(major, frames):
+    body = b""
+    for frame_id, text, encoding in frames:
+        payload = bytes([encoding]) + text
+        if major == 2:
+            body += frame_id + len(payload).to_bytes(3, "big") + payload
+        else:
+            size = syncsafe(len(payload)) if major == 4 else len(payload).to_bytes(4, "big")
+            body += frame_id + size + b"\x00\x00" + payload
+    return BytesIO(b"ID3" + bytes([major, 0, 0]) + syncsafe(len(body)) + body + b"\xff\xfb audio")
+
+
+def test_id3v23_latin1_and_utf16():
+    data = id3(3, [(b"TIT2", "Svanesjøen".encode("latin-1"), 0), (b"TPE1", "Tsjajkovskij".encode("utf-16"), 1)])
+    assert fsm.read_id3_tags(data) == {"title": "Svanesjøen", "artist": "Tsjajkovskij"}
+
+
+def test_id3v24_syncsafe_utf8():
+    data = id3(4, [(b"TPE1", "Ravel".encode("utf-8"), 3), (b"TIT2", ("Boléro" * 30).encode("utf-8"), 3)])
+    tags = fsm.read_id3_tags(data)
+    assert tags["artist"] == "Ravel"
+    assert tags["title"] == "Boléro" * 30
+
+
+def test_id3v22_short_frames():
+    data = id3(2, [(b"TT2", b"Carmen", 0)])
+    assert fsm.read_id3_tags(data) == {"title": "Carmen"}
+
+
+def test_no_tag_or_truncated_header():
+    assert fsm.read_id3_tags(BytesIO(b"\xff\xfb\x90\x00")) == {}
+    assert fsm.read_id3_tags(BytesIO(b"ID3\x03")) == {}
+
+
+def test_padding_stops_parsing():
+    data = id3(3, [(b"TIT2", b"Tango", 0)])
+    raw = data.getvalue()
+    header, rest = raw[:10], raw[10:]
+    body = rest[: rest.index(b"\xff\xfb")] + b"\x00" * 20
+    padded = BytesIO(header[:6] + syncsafe(len(body)) + body)
+    assert fsm.read_id3_tags(padded) == {"title": "Tango"}
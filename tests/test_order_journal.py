@@ -0,0 +1,117 @@
+from collections import Counter
+
+import fsm_gui as fsm
+
+
+def person(code, name=""):
+    return {"ParticipantCode": code, "NavnFraIsonen": name or code}
+
+
+def codes(rows):
+    return [row["ParticipantCode"] for row in rows]
+
+
+def make_journal(tmp_path):
+    return fsm.OrderJournal(tmp_path / "order.json", tmp_path / "order.jsonl")
+
+
+def write_entry(journal, op):
+    journal.append(fsm.journal_entry(op))
+    journal.sync()
+
+
+def test_journal_entry_round_trip(tmp_path):
+    rows = [person("A"), person("B"), person("C")]
+    journal = make_journal(tmp_path)
+    journal.write_snapshot(rows)
+    live = rows[:]
+    for op in (("swap", 0, 2), ("remove", 1, live[1])):
+        fsm.apply_order_op(live, op)
+        write_entry(journal, op)
+    journal.close()
+
+    snapshot, entries = make_journal(tmp_path).load()
+    new_rows, missing, unplaced, applied = fsm.restore_journal(rows, snapshot, entries)
+    assert applied == 2
+    assert codes(new_rows) == ["C", "A"]
+    assert unplaced == []
+    assert missing == []
+
+
+def test_undo_delete_after_snapshot(tmp_path):
+    rows = [person("A"), person("B"), person("C")]
+    history = fsm.OrderHistory()
+    journal = make_journal(tmp_path)
+    live = rows[:]
+    journal.write_snapshot(live)
+    op = ("remove", 1, live[1])
+    history.record(fsm.apply_order_op(live, op)[0])
+    write_entry(journal, op)
+    removed = Counter(map(fsm.order_row_key, rows)) - Counter(map(fsm.order_row_key, live))
+    journal.write_snapshot(live, removed=removed)
+    undo, _ = history.undo(live)
+    write_entry(journal, undo)
+    journal.close()
+
+    snapshot, entries = make_journal(tmp_path).load()
+    scanned = [dict(row) for row in rows]
+    new_rows, missing, unplaced, applied = fsm.restore_journal(scanned, snapshot, entries)
+    assert applied == len(entries) == 1
+    assert codes(new_rows) == ["A", "B", "C"]
+    assert unplaced == []
+
+
+def test_removed_counts_duplicate_keys(tmp_path):
+    rows = [person("A", "first"), person("B"), person("A", "second")]
+    journal = make_journal(tmp_path)
+    live = rows[:]
+    fsm.apply_order_op(live, ("remove", 2, live[2]))
+    removed = Counter(map(fsm.order_row_key, rows)) - Counter(map(fsm.order_row_key, live))
+    journal.write_snapshot(live, removed=removed)
+    journal.close()
+
+    snapshot, entries = make_journal(tmp_path).load()
+    assert snapshot["removed"] == {"code:A": 1}
+    new_rows, missing, unplaced, applied = fsm.restore_journal(rows, snapshot, entries)
+    assert [row["NavnFraIsonen"] for row in new_rows] == ["first", "B"]
+    assert unplaced == []
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    rows = [person("A"), person("B")]
+    journal = make_journal(tmp_path)
+    journal.write_snapshot(rows)
+    write_entry(journal, ("swap", 0, 1))
+    journal.close()
+    with open(tmp_path / "order.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"op":"swap","i":0,')
+    snapshot, entries = make_journal(tmp_path).load()
+    assert len(entries) == 1
+    new_rows, _, _, applied = fsm.restore_journal(rows, snapshot, entries)
+    assert applied == 1
+    assert codes(new_rows) == ["B", "A"]
+
+
+def test_stale_generation_entries_are_skipped(tmp_path):
+    rows = [person("A"), person("B")]
+    journal = make_journal(tmp_path)
+    journal.write_snapshot(rows)
+    write_entry(journal, ("swap", 0, 1))
+    stale = (tmp_path / "order.jsonl").read_text(encoding="utf-8")
+    live = rows[::-1]
+    journal.write_snapshot(live)
+    journal.close()
+    # Crash between the new snapshot and truncating the journal.
+    (tmp_path / "order.jsonl").write_text(stale, encoding="utf-8")
+    loader = make_journal(tmp_path)
+    snapshot, entries = loader.load()
+    assert snapshot["generation"] == 2
+    assert loader.generation == 2
+    assert entries == []
+
+
+def test_replay_rejects_non_integer_swap():
+    rows = [person("A"), person("B")]
+    entries = [{"op": "swap", "i": 0, "j": "1"}, {"op": "swap", "i": None, "j": 1}]
+    assert fsm.replay_journal(rows, entries) == 0
+    assert codes(rows) == ["A", "B"]
@@ -0,0 +1,101 @@
+from array import array
+
+import pytest
+
+import fsm_gui as fsm
+
+
+def person(code):
+    return {"ParticipantCode": code}
+
+
+def codes(rows):
+    return [row.get("ParticipantCode") for row in rows]
+
+
+@pytest.mark.parametrize(
+    "make_op",
+    [
+        lambda rows: ("swap", 0, 3),
+        lambda rows: ("insert", 2, person("X")),
+        lambda rows: ("remove", 1, rows[1]),
+        lambda rows: ("permute", array("I", [3, 0, 2, 1])),
+        lambda rows: ("replace", [rows[0], person("Y")]),
+    ],
+)
+def test_inverse_restores_rows(make_op):
+    rows = [person(code) for code in "ABCD"]
+    before = rows[:]
+    inverse, first = fsm.apply_order_op(rows, make_op(rows))
+    assert rows != before
+    assert 0 <= first <= len(before)
+    fsm.apply_order_op(rows, inverse)
+    assert all(a is b for a, b in zip(rows, before)) and len(rows) == len(before)
+
+
+def test_first_changed_index():
+    rows = [person(code) for code in "ABCD"]
+    assert fsm.apply_order_op(rows, ("swap", 3, 1))[1] == 1
+    assert fsm.apply_order_op(rows, ("permute", array("I", [0, 1, 3, 2])))[1] == 2
+    assert fsm.apply_order_op(rows, ("replace", rows[:2] + [person("Z")]))[1] == 2
+
+
+def test_unknown_op_raises():
+    with pytest.raises(ValueError):
+        fsm.apply_order_op([], ("shuffle",))
+
+
+def test_history_undo_redo():
+    rows = [person(code) for code in "ABC"]
+    history = fsm.OrderHistory()
+    assert history.undo(rows) == (None, None)
+    history.record(fsm.apply_order_op(rows, ("swap", 0, 2))[0])
+    history.record(fsm.apply_order_op(rows, ("remove", 0, rows[0]))[0])
+    assert codes(rows) == ["B", "A"]
+    history.undo(rows)
+    assert codes(rows) == ["C", "B", "A"]
+    history.undo(rows)
+    assert codes(rows) == ["A", "B", "C"]
+    assert not history.can_undo() and history.can_redo()
+    history.redo(rows)
+    assert codes(rows) == ["C", "B", "A"]
+    history.record(fsm.apply_order_op(rows, ("swap", 0, 1))[0])
+    assert not history.can_redo()
+
+
+def test_history_limit_drops_oldest():
+    rows = [person(code) for code in "AB"]
+    history = fsm.OrderHistory(limit=2)
+    for _ in range(3):
+        history.record(fsm.apply_order_op(rows, ("swap", 0, 1))[0])
+    history.undo(rows)
+    history.undo(rows)
+    assert not history.can_undo()
+    assert codes(rows) == ["B", "A"]
+
+
+def test_restore_order_places_duplicates_and_pauses():
+    first, second = {"ParticipantCode": "A", "n": 1}, {"ParticipantCode": "A", "n": 2}
+    rows = [first, person("B"), second, person("C")]
+    order = [
+        {"type": "row", "key": "code:B"},
+        {"type": "pause", "label": "Vanning", "seconds": 300},
+        "code:A",
+        {"type": "row", "key": "code:A"},
+        {"type": "row", "key": "code:GONE"},
+    ]
+    new_rows, missing, unplaced = fsm.restore_order(rows, order)
+    assert codes(new_rows[:1]) == ["B"]
+    assert new_rows[1]["IsPause"] and new_rows[1]["PauseSek"] == 300
+    assert new_rows[2] is first and new_rows[3] is second
+    assert missing == ["code:GONE"]
+    assert codes(unplaced) == ["C"]
+    assert new_rows[-1] is unplaced[0]
+
+
+def test_restore_order_round_trips_build_order():
+    rows = [person(code) for code in "ABC"]
+    rows.insert(1, fsm.make_pause_row("Pause", 60))
+    new_rows, missing, unplaced = fsm.restore_order(rows, fsm.build_order(rows))
+    assert [row.get("ParticipantCode") or row["NavnFraIsonen"] for row in new_rows] == ["A", "Pause", "B", "C"]
+    assert missing == [] and unplaced == []
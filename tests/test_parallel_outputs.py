@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import fsm_gui as fsm
+
+
+def test_startliste_pdfs_isolate_failing_section(tmp_path, monkeypatch):
+    def fake_pdf(entries, out_path, title, log):
+        if entries == ["bad"]:
+            raise RuntimeError("boom")
+        log(f"skrev {Path(out_path).name}")
+        return True
+
+    monkeypatch.setattr(fsm, "generate_startliste_pdf", fake_pdf)
+    sections = [("A", ["ok"]), ("B", ["bad"]), ("C", ["ok"])]
+    messages = []
+    written = fsm.generate_startliste_pdfs(sections, tmp_path, "Stevne", messages.append, max_workers=3)
+    assert written == 2
+    assert messages[0] == "skrev 01_A.pdf"
+    assert "B" in messages[1] and "boom" in messages[1]
+    assert messages[2] == "skrev 03_C.pdf"
+
+
+def test_run_batch_isolates_failing_competition(tmp_path, monkeypatch):
+    sets = [{"name": name, "folder": tmp_path / name} for name in ("A", "B", "C")]
+
+    def fake_process(comp, out_root, outputs, music_info, fuzzy_threshold, times, log):
+        if comp["name"] == "B":
+            raise RuntimeError("boom")
+        return {
+            "name": comp["name"],
+            "folder": str(comp["folder"]),
+            "status": "ok",
+            "participants": 1,
+            "missing_fsm": 0,
+            "missing_music": 0,
+            "seconds": 0.0,
+            "output": "",
+        }
+
+    monkeypatch.setattr(fsm, "discover_competition_sets", lambda root: sets)
+    monkeypatch.setattr(fsm, "process_competition_set", fake_process)
+    summaries, report_path = fsm.run_batch(tmp_path, set(), lambda message: None, ("18:00", "03:00"), max_workers=2)
+    assert [item["name"] for item in summaries] == ["A", "B", "C"]
+    assert [item["status"] for item in summaries] == ["ok", "feil: boom", "ok"]
+    assert report_path.exists()
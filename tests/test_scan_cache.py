@@ -0,0 +1,54 @@
+import os
+import zipfile
+
+import fsm_gui as fsm
+
+
+def member(tmp_path, name, payload):
+    zip_path = tmp_path / f"{name}.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("DT_PARTIC.xml", payload)
+    with zipfile.ZipFile(zip_path) as zf:
+        return zip_path, zf.infolist()[0]
+
+
+def test_member_rows_survive_restart(tmp_path):
+    zip_path, entry = member(tmp_path, "a", b"<OdfBody/>")
+    rows = [{"ParticipantCode": "P1", "Event": "JUN"}, {"ParticipantCode": "P2", "Event": "SEN"}]
+    fsm.ScanCache(tmp_path / "cache").store_member_rows(zip_path, entry, rows)
+    reopened = fsm.ScanCache(tmp_path / "cache")
+    assert reopened.member_rows(zip_path, entry) == rows
+
+
+def test_changed_member_or_version_is_a_miss(tmp_path, monkeypatch):
+    zip_path, entry = member(tmp_path, "a", b"<OdfBody/>")
+    cache = fsm.ScanCache(tmp_path / "cache")
+    cache.store_member_rows(zip_path, entry, [{"ParticipantCode": "P1"}])
+    _, changed = member(tmp_path, "b", b"<OdfBody></OdfBody>")
+    assert cache.member_rows(zip_path, changed) is None
+    monkeypatch.setattr(fsm.ScanCache, "version", fsm.ScanCache.version + 1)
+    assert fsm.ScanCache(tmp_path / "cache").member_rows(zip_path, entry) is None
+
+
+def test_corrupt_cache_file_is_ignored(tmp_path):
+    zip_path, entry = member(tmp_path, "a", b"<OdfBody/>")
+    cache = fsm.ScanCache(tmp_path / "cache")
+    cache.store_member_rows(zip_path, entry, [{"ParticipantCode": "P1"}])
+    cache.member_path(entry).write_bytes(b"not a pickle")
+    assert fsm.ScanCache(tmp_path / "cache").member_rows(zip_path, entry) is None
+
+
+def test_prune_keeps_most_recently_used(tmp_path):
+    cache = fsm.ScanCache(tmp_path / "cache", max_files=3)
+    entries = []
+    for n in range(4):
+        entries.append(member(tmp_path, f"z{n}", f"<OdfBody n='{n}'/>".encode()))
+    for n, (zip_path, entry) in enumerate(entries[:3]):
+        cache.store_member_rows(zip_path, entry, [{"n": str(n)}])
+        os.utime(cache.member_path(entry), ns=(n * 10**9, n * 10**9))
+    # Reading the oldest file from disk marks it as recently used.
+    first_zip, first_entry = entries[0]
+    assert fsm.ScanCache(tmp_path / "cache").member_rows(first_zip, first_entry) == [{"n": "0"}]
+    cache.store_member_rows(*entries[3], [{"n": "3"}])
+    remaining = {path.name for path in (tmp_path / "cache").glob("*.pkl")}
+    assert remaining == {cache.member_path(entry).name for _, entry in (entries[0], entries[2], entries[3])}
@@ -0,0 +1,41 @@
+import fsm_gui as fsm
+
+
+def make_index():
+    index = fsm.TrigramIndex()
+    index.add(1, "Anna Berg Oslo Skøiteklub")
+    index.add(2, "Ola Nordmann Bergen")
+    index.add(3, "Kari Olsen Trondheim")
+    return index
+
+
+def test_search_ranks_closest_first():
+    index = make_index()
+    hits = index.search("ana berg", min_score=0.1)
+    assert hits[0][1] == 1
+    assert index.search("") == []
+
+
+def test_containing_is_substring_candidates():
+    index = make_index()
+    assert index.containing("berg") == {1, 2}
+    assert index.containing("zzz") == set()
+
+
+def test_word_prefix_for_short_queries():
+    index = make_index()
+    assert index.word_prefix("o") == {1, 2, 3}
+    assert index.word_prefix("ol") == {2, 3}
+    assert index.word_prefix("k") == {3}
+    # "n" only starts a word in "Nordmann", not inside "Anna" or "Olsen".
+    assert index.word_prefix("n") == {2}
+
+
+def test_readd_and_remove_update_postings():
+    index = make_index()
+    index.add(2, "Per Hansen")
+    assert index.word_prefix("ol") == {3}
+    index.remove(3)
+    assert index.word_prefix("o") == {1}
+    assert all(3 not in docs for docs in index.postings.values())
+    assert all(3 not in docs for docs in index.initials.values())
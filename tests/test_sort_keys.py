@@ -0,0 +1,45 @@
+import fsm_gui as fsm
+
+
+def row(name, start="", club=""):
+    return {"NavnFraIsonen": name, "StartTid": start, "Organisation": club}
+
+
+def ordered(rows, perm):
+    return [rows[i]["NavnFraIsonen"] for i in perm]
+
+
+def test_permutation_sorts_times_with_blanks_last():
+    rows = [row("A", "10:15"), row("B", ""), row("C", "09:30"), row("D", "10:00")]
+    cache = fsm.SortKeyCache()
+    assert ordered(rows, cache.permutation(rows, [("starttid", False)])) == ["C", "D", "A", "B"]
+
+
+def test_permutation_multi_column_and_stable():
+    rows = [row("Bo", club="OSK"), row("Al", club="BSK"), row("Cy", club="OSK"), row("Al", club="OSK")]
+    cache = fsm.SortKeyCache()
+    perm = cache.permutation(rows, [("klubb", True), ("navn_isonen", False)])
+    assert [(rows[i]["Organisation"], rows[i]["NavnFraIsonen"]) for i in perm] == [
+        ("OSK", "Al"),
+        ("OSK", "Bo"),
+        ("OSK", "Cy"),
+        ("BSK", "Al"),
+    ]
+    assert list(cache.permutation(rows, [("startnummer", False)])) == [0, 1, 2, 3]
+
+
+def test_key_is_recomputed_only_when_fields_change():
+    item = row("Anna")
+    cache = fsm.SortKeyCache()
+    first = cache.key(item, "navn_isonen")
+    assert cache.key(item, "navn_isonen") is first
+    item["NavnFraIsonen"] = "Berit"
+    assert cache.key(item, "navn_isonen") != first
+
+
+def test_entries_for_dropped_rows_are_pruned():
+    cache = fsm.SortKeyCache()
+    for _ in range(5):
+        rows = [row(str(n)) for n in range(40)]
+        cache.permutation(rows, [("navn_isonen", False)])
+    assert len(cache.entries) <= 2 * len(rows) + 64
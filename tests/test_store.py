@@ -0,0 +1,61 @@
+import fsm_gui as fsm
+
+
+def scan_result():
+    return {
+        "rows": [
+            {
+                "ParticipantCode": "P1",
+                "GivenName": "Anna",
+                "FamilyName": "Berg",
+                "NavnFraIsonen": "Anna Berg",
+                "Organisation": "OSK",
+                "Event": "JUN",
+                "MusikkFil": "anna.mp3",
+            }
+        ],
+        "officials": [{"name": "Kari Dommer", "role": "JDG", "nation": "NOR"}],
+        "music_files": ["anna.mp3"],
+        "music_keys": {"anna.mp3": "k1"},
+    }
+
+
+def test_save_and_load_keeps_rows_and_officials(tmp_path):
+    store = fsm.CompetitionStore(tmp_path / "store.sqlite3")
+    try:
+        data_zip = tmp_path / "FMSData_a.zip"
+        store.save_competition(data_zip, "sig", scan_result())
+        loaded = store.load_competition(data_zip, "sig")
+        assert loaded["rows"][0]["NavnFraIsonen"] == "Anna Berg"
+        assert loaded["officials"] == scan_result()["officials"]
+        assert loaded["music_keys"] == {"anna.mp3": "k1"}
+    finally:
+        store.close()
+
+
+def test_changed_signature_is_a_miss(tmp_path):
+    store = fsm.CompetitionStore(tmp_path / "store.sqlite3")
+    try:
+        data_zip = tmp_path / "FMSData_a.zip"
+        store.save_competition(data_zip, "sig", scan_result())
+        assert store.load_competition(data_zip, "other") is None
+        assert store.load_competition(tmp_path / "FMSData_b.zip", "sig") is None
+    finally:
+        store.close()
+
+
+def test_participant_history_and_orders(tmp_path):
+    store = fsm.CompetitionStore(tmp_path / "store.sqlite3")
+    try:
+        first, second = tmp_path / "FMSData_a.zip", tmp_path / "FMSData_b.zip"
+        store.save_competition(first, "sig", scan_result())
+        store.save_competition(second, "sig", scan_result())
+        row = scan_result()["rows"][0]
+        history = store.participant_history(row, exclude_zip=second)
+        assert [item[0] for item in history] == ["FMSData_a"]
+        by_name = dict(row, ParticipantCode="")
+        assert len(store.participant_history(by_name)) == 2
+        assert store.save_order(first, [{"type": "row", "key": "code:P1"}], "test")
+        assert not store.save_order(tmp_path / "FMSData_c.zip", [], "test")
+    finally:
+        store.close()
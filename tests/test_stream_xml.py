@@ -0,0 +1,67 @@
+import zipfile
+from io import BytesIO
+from xml.parsers import expat
+
+import pytest
+
+import fsm_gui as fsm
+
+
+def odf_body(code, size):
+    head = f'<OdfBody><Competition><Participant Code="{code}" PrintName="{code}"><Discipline><RegisteredEvent Event="EV">'
+    tail = "</RegisteredEvent></Discipline></Participant></Competition></OdfBody>"
+    filler = f'<EventEntry Code="NOTE" Pos="1" Value="{{}}"/>'
+    padding = size - len(head) - len(tail) - len(filler.format(""))
+    assert padding >= 0
+    return (head + filler.format("x" * padding) + tail).encode("utf-8")
+
+
+def test_document_boundary_around_chunk_edge():
+    chunk = fsm.XML_CHUNK_SIZE
+    for size in range(chunk - 40, chunk + 8):
+        data = odf_body("P1", size) + b"\n" + odf_body("P2", 500)
+        assert len(odf_body("P1", size)) == size
+        rows = fsm.parse_competition(BytesIO(data), lambda message: None)
+        assert [row["ParticipantCode"] for row in rows] == ["P1", "P2"], size
+
+
+def test_broken_later_document_is_skipped_and_logged():
+    broken = odf_body("P2", 500).replace(b"</Participant>", b"</Participant></Oops>", 1)
+    data = odf_body("P1", 500) + b"\n" + broken + b"\n" + odf_body("P3", 500)
+    messages = []
+    rows = fsm.parse_competition(BytesIO(data), messages.append)
+    assert [row["ParticipantCode"] for row in rows] == ["P1", "P3"]
+    assert any("Hopper over" in message for message in messages)
+
+
+def test_truncated_last_document_is_dropped():
+    data = odf_body("P1", 500) + b"\n" + odf_body("P2", 500)[:-30]
+    messages = []
+    rows = fsm.parse_competition(BytesIO(data), messages.append)
+    assert [row["ParticipantCode"] for row in rows] == ["P1"]
+    assert any("Hopper over" in message for message in messages)
+
+
+def test_broken_first_document_raises():
+    broken = odf_body("P1", 500).replace(b"</Participant>", b"</Oops>", 1)
+    with pytest.raises(expat.ExpatError):
+        fsm.parse_competition(BytesIO(broken), lambda message: None)
+
+
+def test_officials_are_returned_and_cached(tmp_path):
+    judges = (
+        '<OdfBody><Competition><Official PrintName="Kari Dommer" Function="JDG" Organisation="NOR"/>'
+        "</Competition></OdfBody>"
+    ).encode("utf-8")
+    zip_path = tmp_path / "FMSData.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("DT_PARTIC.xml", odf_body("P1", 500))
+        zf.writestr("DT_JUDGES.xml", judges)
+    cache = fsm.ScanCache(tmp_path / "cache")
+    for _ in range(2):
+        messages = []
+        rows, officials = fsm.read_fsm_zip(zip_path, messages.append, cache)
+        assert [row["ParticipantCode"] for row in rows] == ["P1"]
+        assert officials == [{"name": "Kari Dommer", "role": "JDG", "nation": "NOR"}]
+        assert any("1 officials" in message for message in messages)
+    assert any("Gjenbrukte 2" in message for message in messages)